@@ -0,0 +1,63 @@
+-- Durable outbox for post-signup side work (audit events; later emails/analytics).
+-- Rows are written in the same transaction as the profile by create_profile_with_tasks()
+-- and processed asynchronously by server/python_service/outbox.py.
+CREATE TABLE IF NOT EXISTS public.signup_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    task TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'done', 'dead')),
+    attempts INT NOT NULL DEFAULT 0,
+    available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    processed_at TIMESTAMPTZ
+);
+
+-- Only pending rows are ever scanned by the worker
+CREATE INDEX IF NOT EXISTS signup_outbox_ready_idx
+    ON public.signup_outbox (available_at) WHERE status = 'pending';
+
+-- Service role only
+ALTER TABLE public.signup_outbox ENABLE ROW LEVEL SECURITY;
+
+-- Profile row + its outbox tasks in one transaction (one PostgREST round trip)
+CREATE OR REPLACE FUNCTION public.create_profile_with_tasks(p_profile JSONB, p_tasks JSONB DEFAULT '[]'::jsonb)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO public.users (id, name, email, role, extra, password_hash)
+    VALUES ((p_profile->>'id')::uuid, p_profile->>'name', p_profile->>'email', p_profile->>'role',
+            p_profile->'extra', p_profile->>'password_hash');
+
+    INSERT INTO public.signup_outbox (task, payload)
+    SELECT t->>'task', COALESCE(t->'payload', '{}'::jsonb)
+    FROM jsonb_array_elements(p_tasks) AS t;
+
+    RETURN p_profile;
+END;
+$$;
+
+-- Claim a batch: leased rows are pushed into the future so concurrent workers skip them;
+-- a row whose worker died becomes visible again when the lease expires.
+CREATE OR REPLACE FUNCTION public.claim_signup_outbox(p_limit INT DEFAULT 50, p_lease_seconds INT DEFAULT 60)
+RETURNS SETOF public.signup_outbox
+LANGUAGE sql
+AS $$
+    UPDATE public.signup_outbox o
+    SET attempts = o.attempts + 1,
+        available_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE o.id IN (
+        SELECT id FROM public.signup_outbox
+        WHERE status = 'pending' AND available_at <= NOW()
+        ORDER BY available_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.*;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.create_profile_with_tasks(JSONB, JSONB) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.claim_signup_outbox(INT, INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.create_profile_with_tasks(JSONB, JSONB) TO service_role;
+GRANT EXECUTE ON FUNCTION public.claim_signup_outbox(INT, INT) TO service_role;
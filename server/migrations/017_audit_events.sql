@@ -0,0 +1,69 @@
+-- Append-only audit/event log, range-partitioned by month on occurred_at.
+-- Rows are buffered and written in multi-row inserts by server/python_service/audit.py.
+-- Old months are retired by detaching/dropping their partition, never by DELETE.
+CREATE TABLE IF NOT EXISTS public.audit_events (
+    id UUID NOT NULL,
+    occurred_at TIMESTAMPTZ NOT NULL,
+    action TEXT NOT NULL,
+    actor_id TEXT,
+    subject_id TEXT,
+    institute_id TEXT,
+    trace_id TEXT,
+    details JSONB NOT NULL DEFAULT '{}'::jsonb,
+    -- the partition key must be part of the primary key
+    PRIMARY KEY (occurred_at, id)
+) PARTITION BY RANGE (occurred_at);
+
+-- Catches rows outside the created months instead of failing the batch
+CREATE TABLE IF NOT EXISTS public.audit_events_default PARTITION OF public.audit_events DEFAULT;
+
+-- Time-range pagination walks (occurred_at DESC, id DESC); the PK index serves it.
+CREATE INDEX IF NOT EXISTS audit_events_action_idx ON public.audit_events (action, occurred_at DESC);
+CREATE INDEX IF NOT EXISTS audit_events_actor_idx ON public.audit_events (actor_id, occurred_at DESC) WHERE actor_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS audit_events_subject_idx ON public.audit_events (subject_id, occurred_at DESC) WHERE subject_id IS NOT NULL;
+
+-- Monthly partitions from the current month to p_months_ahead months ahead.
+-- Called here and daily by the service's audit flusher.
+CREATE OR REPLACE FUNCTION public.ensure_audit_partitions(p_months_ahead INT DEFAULT 2)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    month_start DATE;
+    created INT := 0;
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        month_start := (date_trunc('month', NOW() AT TIME ZONE 'UTC') + make_interval(months => i))::date;
+        IF to_regclass(format('public.audit_events_%s', to_char(month_start, 'YYYYMM'))) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE public.audit_events_%s PARTITION OF public.audit_events FOR VALUES FROM (%L) TO (%L)',
+                to_char(month_start, 'YYYYMM'), month_start, (month_start + INTERVAL '1 month')::date);
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+SELECT public.ensure_audit_partitions(2);
+
+-- Append-only: updates and deletes are rejected for everyone, including service_role
+CREATE OR REPLACE FUNCTION public.audit_events_append_only()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RAISE EXCEPTION 'audit_events is append-only';
+END;
+$$;
+
+DROP TRIGGER IF EXISTS audit_events_append_only ON public.audit_events;
+CREATE TRIGGER audit_events_append_only
+    BEFORE UPDATE OR DELETE ON public.audit_events
+    FOR EACH ROW EXECUTE FUNCTION public.audit_events_append_only();
+
+-- Service role only
+ALTER TABLE public.audit_events ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON public.audit_events FROM anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.ensure_audit_partitions(INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.ensure_audit_partitions(INT) TO service_role;
@@ -0,0 +1,125 @@
+-- Per-institute member totals by role and status, kept current by statement-level
+-- triggers on teachers/students/parents so dashboards never run count(*) over the
+-- role tables. institute_id '' = no institute; status 'none' = table has no status.
+-- Drift (manual SQL with triggers disabled, restores) is repaired by
+-- reconcile_institute_role_counts(), run here and periodically by the service (counters.py).
+CREATE TABLE IF NOT EXISTS public.institute_role_counts (
+    institute_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (institute_id, role, status)
+);
+
+ALTER TABLE public.institute_role_counts ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON public.institute_role_counts FROM anon, authenticated;
+
+-- One upsert per (institute, status) touched by the statement, in key order so
+-- concurrent statements lock counter rows in the same order.
+-- to_jsonb(row) keeps it independent of which optional columns a role table has.
+CREATE OR REPLACE FUNCTION public.bump_institute_role_counts()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.institute_role_counts AS c (institute_id, role, status, total)
+        SELECT COALESCE(to_jsonb(n)->>'institute_id', ''), TG_ARGV[0], COALESCE(to_jsonb(n)->>'status', 'none'), COUNT(*)
+        FROM new_rows n GROUP BY 1, 3 ORDER BY 1, 3
+        ON CONFLICT (institute_id, role, status)
+        DO UPDATE SET total = c.total + EXCLUDED.total, updated_at = NOW();
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO public.institute_role_counts AS c (institute_id, role, status, total)
+        SELECT COALESCE(to_jsonb(o)->>'institute_id', ''), TG_ARGV[0], COALESCE(to_jsonb(o)->>'status', 'none'), -COUNT(*)
+        FROM old_rows o GROUP BY 1, 3 ORDER BY 1, 3
+        ON CONFLICT (institute_id, role, status)
+        DO UPDATE SET total = c.total + EXCLUDED.total, updated_at = NOW();
+    ELSE
+        INSERT INTO public.institute_role_counts AS c (institute_id, role, status, total)
+        SELECT institute_id, TG_ARGV[0], status, SUM(delta)
+        FROM (
+            SELECT COALESCE(to_jsonb(n)->>'institute_id', ''), COALESCE(to_jsonb(n)->>'status', 'none'), 1 FROM new_rows n
+            UNION ALL
+            SELECT COALESCE(to_jsonb(o)->>'institute_id', ''), COALESCE(to_jsonb(o)->>'status', 'none'), -1 FROM old_rows o
+        ) d (institute_id, status, delta)
+        GROUP BY 1, 3 HAVING SUM(delta) <> 0 ORDER BY 1, 3
+        ON CONFLICT (institute_id, role, status)
+        DO UPDATE SET total = c.total + EXCLUDED.total, updated_at = NOW();
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Transition tables allow only one event per trigger, hence three per table.
+DO $$
+DECLARE
+    t RECORD;
+BEGIN
+    FOR t IN SELECT * FROM (VALUES ('teachers', 'Teacher'), ('students', 'Student'), ('parents', 'Parent')) v (tbl, role) LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON public.%I', t.tbl || '_counts_ins', t.tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON public.%I', t.tbl || '_counts_upd', t.tbl);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON public.%I', t.tbl || '_counts_del', t.tbl);
+        EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON public.%I REFERENCING NEW TABLE AS new_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION public.bump_institute_role_counts(%L)',
+                       t.tbl || '_counts_ins', t.tbl, t.role);
+        EXECUTE format('CREATE TRIGGER %I AFTER UPDATE ON public.%I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION public.bump_institute_role_counts(%L)',
+                       t.tbl || '_counts_upd', t.tbl, t.role);
+        EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON public.%I REFERENCING OLD TABLE AS old_rows '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION public.bump_institute_role_counts(%L)',
+                       t.tbl || '_counts_del', t.tbl, t.role);
+    END LOOP;
+END;
+$$;
+
+-- Recompute from the role tables and fix any counter that drifted.
+-- Returns the number of corrected counters, or -1 if another reconcile is running.
+CREATE OR REPLACE FUNCTION public.reconcile_institute_role_counts()
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    fixed INT;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('reconcile_institute_role_counts')) THEN
+        RETURN -1;
+    END IF;
+    -- Blocks trigger upserts until commit, so no concurrent delta is overwritten
+    -- with a total computed from an older snapshot.
+    LOCK TABLE public.institute_role_counts IN SHARE ROW EXCLUSIVE MODE;
+
+    WITH actual AS (
+        SELECT COALESCE(to_jsonb(t)->>'institute_id', '') AS institute_id, 'Teacher' AS role,
+               COALESCE(to_jsonb(t)->>'status', 'none') AS status, COUNT(*) AS total
+        FROM public.teachers t GROUP BY 1, 3
+        UNION ALL
+        SELECT COALESCE(to_jsonb(s)->>'institute_id', ''), 'Student', COALESCE(to_jsonb(s)->>'status', 'none'), COUNT(*)
+        FROM public.students s GROUP BY 1, 3
+        UNION ALL
+        SELECT COALESCE(to_jsonb(p)->>'institute_id', ''), 'Parent', COALESCE(to_jsonb(p)->>'status', 'none'), COUNT(*)
+        FROM public.parents p GROUP BY 1, 3
+    ),
+    drift AS (
+        SELECT COALESCE(a.institute_id, c.institute_id) AS institute_id, COALESCE(a.role, c.role) AS role,
+               COALESCE(a.status, c.status) AS status, COALESCE(a.total, 0) AS total
+        FROM actual a
+        FULL JOIN public.institute_role_counts c USING (institute_id, role, status)
+        WHERE c.total IS DISTINCT FROM a.total AND NOT (a.total IS NULL AND c.total = 0)
+    ),
+    upserted AS (
+        INSERT INTO public.institute_role_counts AS c (institute_id, role, status, total)
+        SELECT institute_id, role, status, total FROM drift
+        ON CONFLICT (institute_id, role, status)
+        DO UPDATE SET total = EXCLUDED.total, updated_at = NOW()
+        RETURNING 1
+    )
+    SELECT COUNT(*) INTO fixed FROM upserted;
+    RETURN fixed;
+END;
+$$;
+
+SELECT public.reconcile_institute_role_counts();
+
+REVOKE EXECUTE ON FUNCTION public.reconcile_institute_role_counts() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.reconcile_institute_role_counts() TO service_role;
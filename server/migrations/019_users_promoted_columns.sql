@@ -0,0 +1,30 @@
+-- Promote the users.extra fields read on every signup/signin and used to scope
+-- user listings (institute_id, org_type/type, title) to plain columns.
+--
+-- Plain nullable columns kept in sync by a trigger rather than GENERATED ... STORED:
+-- adding a stored generated column rewrites the whole table under an ACCESS
+-- EXCLUSIVE lock, while ADD COLUMN without a default is a catalog-only change.
+-- Existing rows are filled by server/python_service/backfill_user_columns.py in
+-- small batches; the indexes are built concurrently by 020.
+-- extra stays the source of truth; the service writes it exactly as before.
+ALTER TABLE public.users ADD COLUMN IF NOT EXISTS institute_id TEXT;
+ALTER TABLE public.users ADD COLUMN IF NOT EXISTS org_type TEXT;
+ALTER TABLE public.users ADD COLUMN IF NOT EXISTS title TEXT;
+
+CREATE OR REPLACE FUNCTION public.users_sync_promoted_columns()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.institute_id := NEW.extra->>'institute_id';
+    -- same precedence as python_signin: org_type, then the legacy type key
+    NEW.org_type := COALESCE(NEW.extra->>'org_type', NEW.extra->>'type');
+    NEW.title := NEW.extra->>'title';
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS users_sync_promoted_columns ON public.users;
+CREATE TRIGGER users_sync_promoted_columns
+    BEFORE INSERT OR UPDATE OF extra ON public.users
+    FOR EACH ROW EXECUTE FUNCTION public.users_sync_promoted_columns();
@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Indexes for the columns added by 019. CONCURRENTLY keeps writes flowing while
+-- they build, so each statement must run on its own, outside a transaction
+-- (backfill_user_columns.py runs them after its backfill).
+-- Institute-scoped user listings: WHERE institute_id = $1 [AND role = $2] ORDER BY id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_institute_id_idx ON public.users (institute_id, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_institute_role_idx ON public.users (institute_id, role, id);
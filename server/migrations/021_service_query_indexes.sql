@@ -0,0 +1,22 @@
+-- migrate: no-transaction
+-- Indexes for the query shapes in server/python_service/index_advisor.py that
+-- sequential-scan without them. Generated by `python index_advisor.py migration`.
+-- CONCURRENTLY: each statement runs on its own, outside a transaction.
+-- org_codes.active_code
+CREATE INDEX CONCURRENTLY IF NOT EXISTS org_codes_active_code_idx ON public.org_codes (code) WHERE is_active;
+-- teachers.pending_by_institute
+CREATE INDEX CONCURRENTLY IF NOT EXISTS teachers_pending_institute_idx ON public.teachers (institute_id) WHERE status = 'pending';
+-- teachers.pending
+CREATE INDEX CONCURRENTLY IF NOT EXISTS teachers_pending_created_idx ON public.teachers (created_at) WHERE status = 'pending';
+-- teachers.by_user, teachers.approve
+CREATE INDEX CONCURRENTLY IF NOT EXISTS teachers_user_id_idx ON public.teachers (user_id);
+-- students.by_user
+CREATE INDEX CONCURRENTLY IF NOT EXISTS students_user_id_idx ON public.students (user_id);
+-- students.by_class
+CREATE INDEX CONCURRENTLY IF NOT EXISTS students_institute_class_idx ON public.students (institute_id, class_id);
+-- parents.by_user
+CREATE INDEX CONCURRENTLY IF NOT EXISTS parents_user_id_idx ON public.parents (user_id);
+-- parents.by_child
+CREATE INDEX CONCURRENTLY IF NOT EXISTS parents_child_ids_idx ON public.parents USING gin (child_ids);
+-- management_managers.by_user
+CREATE INDEX CONCURRENTLY IF NOT EXISTS management_managers_user_id_idx ON public.management_managers (user_id);
@@ -0,0 +1,42 @@
+-- The role row (teachers / students / parents / management_managers) is part of the
+-- account, not side work: a Teacher without a teachers row skipped the approval check at
+-- signin, and approve/reject updated nothing until the outbox worker caught up.
+-- create_profile_with_tasks() now writes it in the same transaction as the profile;
+-- the outbox keeps only asynchronous side work.
+DROP FUNCTION IF EXISTS public.create_profile_with_tasks(JSONB, JSONB);
+
+CREATE OR REPLACE FUNCTION public.create_profile_with_tasks(p_profile JSONB, p_tasks JSONB DEFAULT '[]'::jsonb,
+                                                            p_role_row JSONB DEFAULT NULL)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_table TEXT := p_role_row->>'table';
+    v_row JSONB := p_role_row->'row';
+    v_columns TEXT;
+BEGIN
+    INSERT INTO public.users (id, name, email, role, extra, password_hash)
+    VALUES ((p_profile->>'id')::uuid, p_profile->>'name', p_profile->>'email', p_profile->>'role',
+            p_profile->'extra', p_profile->>'password_hash');
+
+    IF p_role_row IS NOT NULL THEN
+        IF v_table NOT IN ('teachers', 'students', 'parents', 'management_managers') THEN
+            RAISE EXCEPTION 'unsupported role table %', v_table;
+        END IF;
+        -- only the supplied columns, so the table's defaults (id, created_at) still apply
+        SELECT string_agg(quote_ident(k), ', ') INTO v_columns FROM jsonb_object_keys(v_row) AS k;
+        EXECUTE format('INSERT INTO public.%I (%s) SELECT %s FROM jsonb_populate_record(NULL::public.%I, $1)',
+                       v_table, v_columns, v_columns, v_table)
+        USING v_row;
+    END IF;
+
+    INSERT INTO public.signup_outbox (task, payload)
+    SELECT t->>'task', COALESCE(t->'payload', '{}'::jsonb)
+    FROM jsonb_array_elements(p_tasks) AS t;
+
+    RETURN p_profile;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.create_profile_with_tasks(JSONB, JSONB, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.create_profile_with_tasks(JSONB, JSONB, JSONB) TO service_role;
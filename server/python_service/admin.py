@@ -0,0 +1,24 @@
+"""
+Admin guard for operational endpoints, mirroring checkAdminAuth in server/index.js:
+the key comes from the `x-admin-key` header (or `adminKey` query param) and must
+match ADMIN_API_KEY.
+"""
+
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException, Query
+
+
+def admin_key() -> Optional[str]:
+    return os.environ.get("ADMIN_API_KEY")
+
+
+def require_admin(x_admin_key: Optional[str] = Header(None), adminKey: Optional[str] = Query(None)):
+    expected = admin_key()
+    if not expected:
+        raise HTTPException(status_code=403, detail="admin api key not configured")
+    supplied = x_admin_key or adminKey
+    if not supplied or not hmac.compare_digest(str(supplied), str(expected)):
+        raise HTTPException(status_code=401, detail="unauthorized")
@@ -1,11 +1,4 @@
-import os
-from dotenv import load_dotenv
-import psycopg2
-
-
-def load_env():
-    here = os.path.dirname(__file__)
-    load_dotenv(os.path.join(here, '..', '..', '.env'))
+import db
 
 
 SQL = """
@@ -41,18 +34,9 @@ GRANT SELECT, INSERT, UPDATE, DELETE ON public.org_codes TO service_role;
 
 
 def apply():
-    load_env()
-    conn_str = os.environ.get('DATABASE_URL')
-    if not conn_str:
-        raise RuntimeError('DATABASE_URL must be set in .env to apply migration')
-    conn = psycopg2.connect(conn_str)
-    try:
-        with conn:
-            with conn.cursor() as cur:
-                cur.execute(SQL)
-                print('Applied org_codes policies/grants successfully')
-    finally:
-        conn.close()
+    with db.transaction() as cur:
+        cur.execute(SQL)
+        print('Applied org_codes policies/grants successfully')
 
 
 if __name__ == '__main__':
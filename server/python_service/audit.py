@@ -0,0 +1,281 @@
+"""
+Batched, asynchronous audit/event log (migration 017_audit_events.sql).
+
+`record()` only appends to an in-memory buffer, so an audited request pays no
+extra round trip. A background thread flushes the buffer as one multi-row
+insert when AUDIT_BATCH events are waiting or AUDIT_FLUSH_MS has passed since
+the oldest one, whichever comes first, and on shutdown.
+
+If a flush fails the batch goes back to the front of the buffer and is retried
+on the next round. The buffer is bounded (AUDIT_BUFFER): when Supabase is down
+for long enough, the newest events are dropped and counted in
+edunexus_audit_events_total{outcome="dropped"} rather than growing memory.
+
+Events that must survive a crash go through the signup outbox instead
+(`outbox_tasks()`, passed to outbox.create_profile): they are committed with
+the profile and written by the outbox worker with its retries.
+
+Events are read back with GET /api/py/admin/audit-events (admin key), newest
+first, paginated by an opaque (occurred_at, id) cursor.
+
+AUDIT_LOG        "0" disables recording
+AUDIT_BATCH      events per insert (default 200)
+AUDIT_FLUSH_MS   max time an event waits in the buffer (default 1000)
+AUDIT_BUFFER     max buffered events (default 10000)
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import Depends, HTTPException
+
+import admin
+import logs
+import metrics
+import outbox
+import resilience
+import tracing
+
+log = logs.get_logger("audit")
+
+ENABLED = os.environ.get("AUDIT_LOG", "1").lower() not in ("0", "false", "no")
+BATCH = int(os.environ.get("AUDIT_BATCH", "200"))
+FLUSH_S = float(os.environ.get("AUDIT_FLUSH_MS", "1000")) / 1000.0
+MAX_BUFFER = int(os.environ.get("AUDIT_BUFFER", "10000"))
+PARTITION_CHECK_S = 24 * 3600
+MAX_PAGE = 500
+
+events_total = metrics.counter("edunexus_audit_events_total", "Audit events by outcome (written, dropped).",
+                               ("outcome",))
+flush_seconds = metrics.histogram("edunexus_audit_flush_duration_seconds", "Time to write one batch of audit events.")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _event(action: str, actor_id: Optional[str], subject_id: Optional[str], institute_id: Optional[str],
+           details: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "occurred_at": _now().isoformat(),
+        "action": action,
+        "actor_id": actor_id,
+        "subject_id": subject_id,
+        "institute_id": institute_id,
+        "trace_id": tracing.current_trace_id(),
+        "details": details,
+    }
+
+
+class AuditLog:
+    def __init__(self):
+        self._buffer: "deque[Dict[str, Any]]" = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._oldest: Optional[float] = None  # monotonic time of the oldest buffered event
+        self._partitions_at = 0.0
+        self.client_getter: Optional[Callable[[], object]] = None
+
+    def record(self, action: str, actor_id: Optional[str] = None, subject_id: Optional[str] = None,
+               institute_id: Optional[str] = None, **details) -> None:
+        if not ENABLED:
+            return
+        event = _event(action, actor_id, subject_id, institute_id, details)
+        with self._lock:
+            if len(self._buffer) >= MAX_BUFFER:
+                events_total.inc("dropped")
+                return
+            self._buffer.append(event)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._buffer) >= BATCH
+        if full:
+            self._wake.set()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    # --- flushing ---
+
+    def start(self, client_getter: Callable[[], object]) -> None:
+        self.client_getter = client_getter
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                waited = time.monotonic() - self._oldest if self._oldest is not None else 0.0
+                ready = len(self._buffer) >= BATCH or (self._buffer and waited >= FLUSH_S)
+            if not ready:
+                self._wake.wait(max(0.01, FLUSH_S - waited))
+                self._wake.clear()
+                continue
+            if not self.flush():
+                self._stop.wait(FLUSH_S)  # Supabase failing: back off instead of spinning
+        while len(self) and self.flush():  # drain on shutdown
+            pass
+
+    def flush(self) -> bool:
+        """Write one batch. Returns False if it failed (the batch is put back)."""
+        with self._lock:
+            batch = [self._buffer.popleft() for _ in range(min(BATCH, len(self._buffer)))]
+            self._oldest = time.monotonic() if self._buffer else None
+        if not batch:
+            return True
+        client = self.client_getter() if self.client_getter else None
+        started = time.perf_counter()
+        try:
+            if client is None:
+                raise RuntimeError("Supabase not configured")
+            self._ensure_partitions(client)
+            resilience.call("audit_events.insert",
+                            client.table("audit_events").insert(batch, returning="minimal").execute,
+                            idempotent=False)
+        except Exception as e:
+            with self._lock:
+                room = MAX_BUFFER - len(self._buffer)
+                self._buffer.extendleft(reversed(batch[:max(0, room)]))
+                self._oldest = time.monotonic()
+            if room < len(batch):
+                events_total.inc("dropped", amount=len(batch) - max(0, room))
+            log.warning("audit flush failed", extra={"events": len(batch), "error": str(e)})
+            return False
+        flush_seconds.observe(time.perf_counter() - started)
+        events_total.inc("written", amount=len(batch))
+        return True
+
+    def _ensure_partitions(self, client) -> None:
+        if self._partitions_at and time.monotonic() - self._partitions_at < PARTITION_CHECK_S:
+            return
+        self._partitions_at = time.monotonic()
+        try:
+            resilience.call("audit_events.ensure_partitions",
+                            client.rpc("ensure_audit_partitions", {"p_months_ahead": 2}).execute)
+        except Exception as e:
+            # rows still land in the default partition
+            log.warning("audit partition check failed", extra={"error": str(e)})
+
+
+audit_log = AuditLog()
+record = audit_log.record
+
+
+# --- Durable events (outbox) ---
+
+def outbox_tasks(action: str, actor_id: Optional[str] = None, subject_id: Optional[str] = None,
+                 institute_id: Optional[str] = None, **details) -> List[Dict[str, Any]]:
+    """The event as outbox tasks, for a caller that must not lose it (committed with its transaction).
+
+    Same fields as record(); [] when recording is disabled.
+    """
+    if not ENABLED:
+        return []
+    return [outbox.task("audit_event", **_event(action, actor_id, subject_id, institute_id, details))]
+
+
+@outbox.handler("audit_event")
+def write_events(client, rows: List[Dict]) -> Dict[int, str]:
+    """payload: one audit_events row; rows a dead worker already wrote are skipped by id."""
+    # occurred_at leads the primary key and prunes partitions; id alone would scan them all
+    q = (client.table("audit_events").select("id")
+         .in_("occurred_at", list({r["payload"]["occurred_at"] for r in rows}))
+         .in_("id", [r["payload"]["id"] for r in rows]))
+    res = resilience.call("audit_events.select", q.execute, idempotent=True)
+    existing = {r["id"] for r in res.data or []}
+    todo = [r["payload"] for r in rows if r["payload"]["id"] not in existing]
+    if todo:
+        resilience.call("audit_events.insert",
+                        client.table("audit_events").insert(todo, returning="minimal").execute, idempotent=False)
+        events_total.inc("written", amount=len(todo))
+    return {}
+
+
+# --- Query ---
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps([row["occurred_at"], row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[str]:
+    try:
+        occurred_at, event_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return [_timestamp(occurred_at, "cursor"), str(uuid.UUID(event_id))]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _timestamp(value: str, field: str) -> str:
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (ValueError, AttributeError):
+        raise HTTPException(status_code=400, detail=f"Invalid {field} timestamp")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def query(client, since: Optional[str] = None, until: Optional[str] = None, action: Optional[str] = None,
+          actor_id: Optional[str] = None, subject_id: Optional[str] = None, institute_id: Optional[str] = None,
+          limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Newest first within [since, until); `next_cursor` continues after the last row returned."""
+    limit = max(1, min(limit, MAX_PAGE))
+    q = client.table("audit_events").select("*")
+    if since:
+        q = q.gte("occurred_at", _timestamp(since, "since"))
+    if until:
+        q = q.lt("occurred_at", _timestamp(until, "until"))
+    for column, value in (("action", action), ("actor_id", actor_id), ("subject_id", subject_id),
+                          ("institute_id", institute_id)):
+        if value:
+            q = q.eq(column, value)
+    if cursor:
+        # keyset: strictly after (occurred_at, id) in descending order
+        occurred_at, event_id = decode_cursor(cursor)
+        q = q.or_(f"occurred_at.lt.{occurred_at},and(occurred_at.eq.{occurred_at},id.lt.{event_id})")
+    q = q.order("occurred_at", desc=True).order("id", desc=True).limit(limit + 1)
+    rows = resilience.call("audit_events.select", q.execute, idempotent=True).data or []
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {"events": rows, "next_cursor": encode_cursor(rows[-1]) if more else None}
+
+
+def install(app, client_getter: Callable[[], object]) -> None:
+    metrics.register_gauges(lambda: metrics.gauge_lines(
+        "edunexus_audit_buffered_events", "Audit events waiting to be written.", {"": len(audit_log)}))
+
+    @app.on_event("startup")
+    def start_audit_flusher():
+        if ENABLED:
+            audit_log.start(client_getter)
+
+    @app.on_event("shutdown")
+    def stop_audit_flusher():
+        audit_log.stop()
+
+    @app.get("/api/py/admin/audit-events", dependencies=[Depends(admin.require_admin)])
+    def audit_events(since: Optional[str] = None, until: Optional[str] = None, action: Optional[str] = None,
+                     actor_id: Optional[str] = None, subject_id: Optional[str] = None,
+                     institute_id: Optional[str] = None, limit: int = 100, cursor: Optional[str] = None):
+        client = client_getter()
+        if client is None:
+            raise HTTPException(status_code=500, detail="Supabase not configured")
+        return query(client, since, until, action, actor_id, subject_id, institute_id, limit, cursor)
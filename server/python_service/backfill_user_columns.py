@@ -0,0 +1,112 @@
+"""
+Backfill users.institute_id / org_type / title from users.extra (migration 019),
+then build the indexes of migration 020 concurrently.
+
+    python backfill_user_columns.py [--batch 1000] [--sleep-ms 50] [--skip-indexes] [--dry-run]
+
+Rows are walked in primary-key order, one short transaction per batch, so no
+lock is held for longer than one batch update; rows that are already in sync
+are skipped, so the tool can be stopped and re-run at any time. Each batch sets
+a lock_timeout and is retried after a pause instead of queueing behind a long
+lock held by someone else.
+"""
+
+import argparse
+import os
+import re
+import time
+
+from psycopg2 import errors
+
+import db
+import migrate
+
+INDEX_MIGRATION = os.path.join(os.path.dirname(__file__), '..', 'migrations', '020_users_promoted_indexes.sql')
+
+PROMOTED = """
+    institute_id = u.extra->>'institute_id',
+    org_type = COALESCE(u.extra->>'org_type', u.extra->>'type'),
+    title = u.extra->>'title'
+"""
+
+OUT_OF_SYNC = """(
+    u.institute_id IS DISTINCT FROM u.extra->>'institute_id'
+    OR u.org_type IS DISTINCT FROM COALESCE(u.extra->>'org_type', u.extra->>'type')
+    OR u.title IS DISTINCT FROM u.extra->>'title'
+)"""
+
+BATCH_SQL = f"""
+WITH batch AS (
+    SELECT id FROM public.users WHERE id > %(after)s ORDER BY id LIMIT %(limit)s
+), updated AS (
+    UPDATE public.users u SET {PROMOTED}
+    FROM batch WHERE u.id = batch.id AND {OUT_OF_SYNC}
+    RETURNING 1
+)
+SELECT (SELECT id FROM batch ORDER BY id DESC LIMIT 1), (SELECT count(*) FROM batch), (SELECT count(*) FROM updated)
+"""
+
+
+def backfill(conn, batch: int, sleep_s: float, dry_run: bool) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM public.users u WHERE {OUT_OF_SYNC}")
+        pending = cur.fetchone()[0]
+    conn.commit()
+    print(f'{pending} users need backfilling')
+    if dry_run or not pending:
+        return
+
+    after = '00000000-0000-0000-0000-000000000000'
+    scanned = changed = 0
+    started = time.monotonic()
+    while True:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL lock_timeout = '2s'")
+                cur.execute(BATCH_SQL, {'after': after, 'limit': batch})
+                last_id, batch_rows, batch_changed = cur.fetchone()
+            conn.commit()
+        except (errors.LockNotAvailable, errors.DeadlockDetected) as e:
+            conn.rollback()
+            print(f'  batch after {after} blocked ({e.pgcode}), retrying')
+            time.sleep(1)
+            continue
+        if not batch_rows:
+            break
+        after = str(last_id)
+        scanned += batch_rows
+        changed += batch_changed
+        print(f'  {scanned} scanned, {changed} updated, at {after}')
+        time.sleep(sleep_s)
+    print(f'backfill done: {changed} rows updated in {time.monotonic() - started:.1f}s')
+
+
+def build_indexes(conn) -> None:
+    with open(INDEX_MIGRATION, encoding='utf-8') as f:
+        sql = f.read()
+    conn.autocommit = True  # CREATE INDEX CONCURRENTLY cannot run in a transaction block
+    with conn.cursor() as cur:
+        for statement in migrate.statements(sql):
+            name = re.search(r'EXISTS\s+(\w+)', statement).group(1)
+            migrate.drop_invalid_index(cur, statement)
+            print(f'  building {name}')
+            cur.execute(statement)
+    print('indexes ready')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Backfill promoted users columns in batches')
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--sleep-ms', type=float, default=50, help='pause between batches')
+    parser.add_argument('--skip-indexes', action='store_true')
+    parser.add_argument('--dry-run', action='store_true', help='only report how many rows are out of sync')
+    args = parser.parse_args()
+
+    with db.connection() as conn:
+        backfill(conn, args.batch, args.sleep_ms / 1000, args.dry_run)
+        if not args.skip_indexes and not args.dry_run:
+            build_indexes(conn)
+
+
+if __name__ == '__main__':
+    main()
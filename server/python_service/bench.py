@@ -0,0 +1,294 @@
+"""
+Microbenchmarks for the Python auth service hot paths.
+
+    python bench.py run                         # print results
+    python bench.py run --save baseline         # store as .benchmarks/baseline.json
+    python bench.py compare baseline            # run now, compare against the baseline
+    python bench.py compare baseline --against candidate
+    python bench.py run -k state                # only cases whose name contains "state"
+
+Each case is timed in `--samples` independent samples (loop count calibrated
+so one sample takes at least `--min-time`). `compare` runs a two-sided
+Mann-Whitney U test per case and reports a regression only when the slowdown
+is both statistically significant (p < --alpha) and larger than --threshold,
+so run-to-run noise does not fail the gate. Exit status 1 means regression.
+
+Baselines are machine specific: compare runs taken on the same host.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "bench")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".benchmarks")
+
+CASES: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def case(name: str):
+    """Register a benchmark: the decorated factory does setup and returns the timed callable."""
+    def register(factory):
+        CASES[name] = factory
+        return factory
+    return register
+
+
+def _dashboard_state(kb: int) -> dict:
+    rng = random.Random(kb)
+    widgets = [{"id": i, "type": rng.choice(["chart", "table", "note"]), "x": rng.randint(0, 12),
+                "y": rng.randint(0, 40), "title": f"Widget {i}", "config": {"color": "#%06x" % rng.randrange(1 << 24),
+                                                                          "series": [rng.random() for _ in range(8)]}}
+               for i in range(max(1, kb * 1024 // 260))]
+    return {"layout": "grid", "theme": "light", "widgets": widgets}
+
+
+SIGNUP_PAYLOAD = {"name": "Bench User", "email": "bench@example.com", "password": "Password123!", "role": "Student",
+                  "extra": {"uniqueId": "AB12CD34", "orgType": "institute", "instituteName": "Bench Institute"}}
+
+
+# --- Cases ---
+
+@case("signup_request.validate")
+def _signup_validate():
+    import main
+    return lambda: main.SignupRequest.model_validate(SIGNUP_PAYLOAD)
+
+
+@case("signup_request.validate_json")
+def _signup_validate_json():
+    import main
+    raw = json.dumps(SIGNUP_PAYLOAD).encode()
+    return lambda: main.SignupRequest.model_validate_json(raw)
+
+
+@case("signup_request.dump_json")
+def _signup_dump():
+    import main
+    req = main.SignupRequest.model_validate(SIGNUP_PAYLOAD)
+    return req.model_dump_json
+
+
+@case("state_request.validate_json_256kb")
+def _state_validate_json():
+    import main
+    raw = json.dumps({"user_id": "00000000-0000-0000-0000-000000000000", "state": _dashboard_state(256)}).encode()
+    return lambda: main.StateRequest.model_validate_json(raw)
+
+
+@case("dashboard_state.json_dumps_256kb")
+def _state_dumps():
+    state = _dashboard_state(256)
+    return lambda: json.dumps(state)
+
+
+@case("dashboard_state.json_loads_256kb")
+def _state_loads():
+    raw = json.dumps(_dashboard_state(256))
+    return lambda: json.loads(raw)
+
+
+@case("signin.check_account_ok")
+def _signin_ok():
+    import main
+    req = main.SigninRequest(email="a@b.c", password="x", role="Student", extra={"orgType": "Institute"})
+    return lambda: main.check_signin_account(req, "Student", "institute")
+
+
+@case("signin.check_account_denied")
+def _signin_denied():
+    import main
+    from fastapi import HTTPException
+    req = main.SigninRequest(email="a@b.c", password="x", role="Student", extra={"orgType": "school"})
+
+    def run():
+        try:
+            main.check_signin_account(req, "Student", "institute")
+        except HTTPException:
+            pass
+    return run
+
+
+@case("org_code.generate")
+def _org_code():
+    import main
+    return main.generate_code
+
+
+@case("postgrest.build_query")
+def _build_query():
+    # query construction only (no network): what every run_query() call pays up front
+    import main
+    client = main.new_client()
+    return lambda: client.table("users").select("*").eq("email", "bench@example.com")
+
+
+PROFILE_ROW = {"id": "00000000-0000-0000-0000-000000000000", "email": "bench@example.com", "role": "Student",
+               "org_type": "institute", "extra": {"uniqueId": "AB12CD34", "instituteName": "Bench Institute"}}
+
+
+def _bench_cache(l1_items: int):
+    import tempfile
+    import cache
+    c = cache.open_cache("local", os.path.join(tempfile.mkdtemp(prefix="bench_cache_"), "cache.sqlite"), l1_items)
+    c.get("profiles", PROFILE_ROW["id"], 60, lambda: PROFILE_ROW)
+    return lambda: c.get("profiles", PROFILE_ROW["id"], 60, lambda: PROFILE_ROW)
+
+
+@case("cache.l1_hit")
+def _cache_l1_hit():
+    return _bench_cache(l1_items=2048)
+
+
+@case("cache.l2_hit")
+def _cache_l2_hit():
+    # what another worker pays for a key this one loaded
+    return _bench_cache(l1_items=0)
+
+
+# --- Runner ---
+
+def measure(fn: Callable[[], object], samples: int, min_time: float) -> Dict:
+    timer = timeit.Timer(fn)
+    loops = 1
+    while True:
+        if timer.timeit(loops) >= min_time:
+            break
+        loops *= 2
+    values = [timer.timeit(loops) / loops for _ in range(samples)]
+    return {"loops": loops, "samples": values, "median": statistics.median(values),
+            "stdev": statistics.stdev(values) if len(values) > 1 else 0.0}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run(pattern: Optional[str], samples: int, min_time: float) -> Dict:
+    results = {}
+    for name, factory in CASES.items():
+        if pattern and pattern not in name:
+            continue
+        results[name] = measure(factory(), samples, min_time)
+        print(f"  {name:40s} {_fmt(results[name]['median']):>10s}  ±{_fmt(results[name]['stdev'])}", file=sys.stderr)
+    return {
+        "meta": {"revision": git_revision(), "python": platform.python_version(), "machine": platform.node(),
+                 "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "samples": samples,
+                 "min_time": min_time},
+        "cases": results,
+    }
+
+
+def _fmt(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def mann_whitney_p(a: List[float], b: List[float]) -> float:
+    """Two-sided Mann-Whitney U p-value (normal approximation with tie correction)."""
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        return 1.0
+    pooled = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    ranks = [0.0] * len(pooled)
+    ties = 0.0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        t = j - i + 1
+        ties += t ** 3 - t
+        i = j + 1
+    r1 = sum(r for r, (_, group) in zip(ranks, pooled) if group == 0)
+    u1 = r1 - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = (abs(u1 - n1 * n2 / 2) - 0.5) / sigma
+    return max(0.0, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2))))
+
+
+def compare(base: Dict, new: Dict, alpha: float, threshold: float) -> bool:
+    regressed = False
+    print(f"{'case':40s} {'baseline':>10s} {'current':>10s} {'change':>8s} {'p':>8s}")
+    for name, b in base["cases"].items():
+        n = new["cases"].get(name)
+        if n is None:
+            continue
+        ratio = n["median"] / b["median"] if b["median"] else 1.0
+        p = mann_whitney_p(b["samples"], n["samples"])
+        verdict = ""
+        if p < alpha and ratio > 1 + threshold:
+            verdict, regressed = "REGRESSION", True
+        elif p < alpha and ratio < 1 - threshold:
+            verdict = "faster"
+        print(f"{name:40s} {_fmt(b['median']):>10s} {_fmt(n['median']):>10s} {(ratio - 1) * 100:+7.1f}% {p:8.4f}  {verdict}")
+    for name in sorted(set(new["cases"]) - set(base["cases"])):
+        print(f"{name:40s} {'-':>10s} {_fmt(new['cases'][name]['median']):>10s}  (new)")
+    return regressed
+
+
+def _path(name: str) -> str:
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def main() -> None:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Python service microbenchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for cmd in ("run", "compare"):
+        p = sub.add_parser(cmd)
+        p.add_argument("-k", dest="pattern", help="only run cases containing this substring")
+        p.add_argument("--samples", type=int, default=20)
+        p.add_argument("--min-time", type=float, default=0.02, help="seconds per sample")
+        if cmd == "run":
+            p.add_argument("--save", help="baseline name (or .json path) to write")
+        else:
+            p.add_argument("baseline")
+            p.add_argument("--against", help="compare to this stored result instead of a fresh run")
+            p.add_argument("--alpha", type=float, default=0.01)
+            p.add_argument("--threshold", type=float, default=0.05, help="minimum relative slowdown to flag")
+    args = parser.parse_args()
+
+    if args.cmd == "run":
+        result = run(args.pattern, args.samples, args.min_time)
+        if args.save:
+            os.makedirs(BASELINE_DIR, exist_ok=True)
+            with open(_path(args.save), "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=1)
+            print(f"saved {_path(args.save)}", file=sys.stderr)
+        return
+
+    with open(_path(args.baseline), encoding="utf-8") as f:
+        base = json.load(f)
+    if args.against:
+        with open(_path(args.against), encoding="utf-8") as f:
+            new = json.load(f)
+    else:
+        new = run(args.pattern, args.samples, args.min_time)
+    sys.exit(1 if compare(base, new, args.alpha, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Two-tier read cache for hot lookups that rarely change (org codes, org names, profiles).
+
+  L1  per process: one LRU of CACHE_L1_ITEMS entries (default 2048)
+  L2  per host: a SQLite file shared by every uvicorn worker (CACHE_DB, default
+      <tmpdir>/edunexus-cache.sqlite), read through a memory map of up to
+      CACHE_L2_MMAP_MB (default 64) and capped at CACHE_L2_ITEMS rows (default 100000)
+
+    org_codes = cache.namespace("org_codes")
+    row = org_codes.get(code, lambda: load_org_code(code))
+
+get() tries L1, then L2, then the loader, and fills both tiers on the way back,
+so after a deploy each key is loaded from Supabase once per host rather than
+once per worker. Entries live CACHE_TTL_S (default 60) unless the namespace
+sets its own TTL. A loader result of None is never stored, so a row created
+after a miss is seen at once. Values go through JSON: callers always get their
+own copy. preload(load_all) stores a whole {key: value} dict at once (warmup.py).
+
+invalidate(key) deletes the L2 row and bumps the namespace's generation in a
+small shared memory map (<CACHE_DB>.gen). Every L1 entry remembers the
+generation it was filled under and is ignored once that changes, so all
+workers stop serving the old value on their next read; the namespace's other
+keys fall through to L2 once. A value loaded before an invalidation never
+reaches L2 after it: the L2 write re-checks the generation under the same
+SQLite write lock that invalidate() holds while it deletes and bumps.
+Invalidation does not reach other hosts, and writes that bypass the service
+(admin scripts, SQL) are only bounded by the TTL.
+
+CACHE_BACKEND=memory (or a platform without fcntl) keeps L1 only, with
+per-process generations; CACHE_BACKEND=off disables caching. If L2 fails,
+reads go to the loader.
+
+Per tier: edunexus_cache_requests_total{cache,tier,outcome} (hit rate),
+edunexus_cache_entries{tier} and edunexus_cache_bytes{tier} (memory use).
+POST /api/py/admin/cache/invalidate?cache=org_codes[&key=...] drops one key
+or the whole namespace.
+"""
+
+import json
+import mmap
+import os
+import random
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Depends, HTTPException
+
+import admin
+import logs
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, L1 only
+    fcntl = None
+
+log = logs.get_logger("cache")
+
+BACKEND = os.environ.get("CACHE_BACKEND", "local").lower()
+DB_PATH = os.environ.get("CACHE_DB") or os.path.join(tempfile.gettempdir(), "edunexus-cache.sqlite")
+TTL_S = float(os.environ.get("CACHE_TTL_S", "60"))
+L1_ITEMS = int(os.environ.get("CACHE_L1_ITEMS", "2048"))
+L2_ITEMS = int(os.environ.get("CACHE_L2_ITEMS", "100000"))
+L2_MMAP_MB = int(os.environ.get("CACHE_L2_MMAP_MB", "64"))
+
+GEN_SLOTS = 256
+_GEN = struct.Struct("<Q")
+
+requests_total = metrics.counter("edunexus_cache_requests_total",
+                                 "Cache lookups by namespace, tier and outcome.", ("cache", "tier", "outcome"))
+store_errors_total = metrics.counter("edunexus_cache_store_errors_total",
+                                     "Shared (L2) cache failures; the lookup went to the loader.")
+
+
+class MemoryGenerations:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._gens: Dict[str, int] = {}
+
+    def get(self, ns: str) -> int:
+        return self._gens.get(ns, 0)
+
+    def bump(self, ns: str) -> None:
+        with self._lock:
+            self._gens[ns] = self._gens.get(ns, 0) + 1
+
+
+class MmapGenerations:
+    """Generation counters in a shared memory-mapped file, one 8-byte slot per namespace hash.
+
+    Reads are a plain memory load; a collision between namespaces only costs extra L1 misses.
+    """
+
+    def __init__(self, path: str):
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = GEN_SLOTS * _GEN.size
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._mm = mmap.mmap(self._fd, size)
+        # flock() does not exclude threads sharing one descriptor
+        self._lock = threading.Lock()
+
+    def _offset(self, ns: str) -> int:
+        return (zlib.crc32(ns.encode()) % GEN_SLOTS) * _GEN.size
+
+    def get(self, ns: str) -> int:
+        return _GEN.unpack_from(self._mm, self._offset(ns))[0]
+
+    def bump(self, ns: str) -> None:
+        offset = self._offset(ns)
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                _GEN.pack_into(self._mm, offset, _GEN.unpack_from(self._mm, offset)[0] + 1)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class SqliteStore:
+    """The L2 tier: rows shared by every process that opens the same file."""
+
+    def __init__(self, path: str, max_items: int = L2_ITEMS):
+        self.path = path
+        self.max_items = max_items
+        self._local = threading.local()
+        self._conn()  # create the table up front
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # a connection must not cross fork() (gunicorn --preload)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=0.2, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(f"PRAGMA mmap_size={L2_MMAP_MB * 1024 * 1024}")
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (ns TEXT, key TEXT, value TEXT, expires REAL, "
+                         "PRIMARY KEY (ns, key)) WITHOUT ROWID")
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, ns: str, key: str, now: float) -> Optional[Tuple[str, float]]:
+        row = self._conn().execute("SELECT value, expires FROM entries WHERE ns = ? AND key = ?",
+                                   (ns, key)).fetchone()
+        return row if row and row[1] > now else None
+
+    def _write(self, fn: Callable[[sqlite3.Connection], None]) -> None:
+        """Run fn in a write transaction; writers (sets and invalidations) are serialized by the file lock."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fn(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def set_many(self, ns: str, items: List[Tuple[str, str]], expires: float, current: Callable[[], bool]) -> bool:
+        """Store items unless current() says the namespace was invalidated since they were loaded.
+
+        current() runs under the write lock that invalidate also takes, so a stale value can
+        never land after the invalidation that should have removed it.
+        """
+        stored = []
+
+        def write(conn):
+            if current():
+                conn.executemany("INSERT OR REPLACE INTO entries (ns, key, value, expires) VALUES (?, ?, ?, ?)",
+                                 [(ns, key, raw, expires) for key, raw in items])
+                stored.append(True)
+
+        self._write(write)
+        if random.random() < 0.002 * len(items):
+            self.prune(time.time())
+        return bool(stored)
+
+    def prune(self, now: float) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+        extra = conn.execute("SELECT count(*) FROM entries").fetchone()[0] - self.max_items
+        if extra > 0:
+            conn.execute("DELETE FROM entries WHERE (ns, key) IN "
+                         "(SELECT ns, key FROM entries ORDER BY expires LIMIT ?)", (extra,))
+
+    def delete(self, ns: str, key: Optional[str], bump: Callable[[], None]) -> None:
+        """Delete the row(s) and call bump() before the write lock is released."""
+        def write(conn):
+            if key is None:
+                conn.execute("DELETE FROM entries WHERE ns = ?", (ns,))
+            else:
+                conn.execute("DELETE FROM entries WHERE ns = ? AND key = ?", (ns, key))
+            bump()
+
+        self._write(write)
+
+    def stats(self) -> Tuple[int, int]:
+        """(rows, bytes on disk)."""
+        conn = self._conn()
+        rows = conn.execute("SELECT count(*) FROM entries").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        return rows, pages * conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+class L1:
+    """Per-process LRU of (raw JSON, expires, generation), bounded by entry count."""
+
+    def __init__(self, max_items: int = L1_ITEMS):
+        self.max_items = max_items
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float, int]]" = OrderedDict()
+
+    def get(self, ns: str, key: str, now: float, gen: int) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get((ns, key))
+            if entry is None:
+                return None
+            if entry[1] <= now or entry[2] != gen:
+                self._drop((ns, key))
+                return None
+            self._entries.move_to_end((ns, key))
+            return entry[0]
+
+    def set(self, ns: str, key: str, raw: str, expires: float, gen: int) -> None:
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._drop((ns, key))
+            self._entries[(ns, key)] = (raw, expires, gen)
+            self.bytes += len(raw)
+            while len(self._entries) > self.max_items:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, k: Tuple[str, str]) -> None:
+        entry = self._entries.pop(k, None)
+        if entry is not None:
+            self.bytes -= len(entry[0])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class Cache:
+    def __init__(self, l1: L1, l2: Optional[SqliteStore], gens, enabled: bool = True):
+        self.l1, self.l2, self.gens, self.enabled = l1, l2, gens, enabled
+        self.namespaces: Dict[str, "Namespace"] = {}
+
+    def _l2(self, op: str, fn: Callable[[], Any]) -> Any:
+        try:
+            return fn()
+        except sqlite3.Error as e:
+            store_errors_total.inc()
+            log.warning("shared cache error", extra={"op": op, "error": str(e)})
+            return None
+
+    def get(self, ns: str, key: str, ttl_s: float, loader: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return loader()
+        now = time.time()
+        gen = self.gens.get(ns)
+        raw = self.l1.get(ns, key, now, gen)
+        if raw is not None:
+            requests_total.inc(ns, "l1", "hit")
+            return json.loads(raw)
+        requests_total.inc(ns, "l1", "miss")
+        if self.l2 is not None:
+            row = self._l2("get", lambda: self.l2.get(ns, key, now))
+            requests_total.inc(ns, "l2", "hit" if row else "miss")
+            if row:
+                self.l1.set(ns, key, row[0], row[1], gen)
+                return json.loads(row[0])
+        value = loader()
+        # an invalidation while the loader ran may mean `value` is already stale: hand it out, keep it out
+        if value is None or self.gens.get(ns) != gen:
+            return value
+        raw, expires = json.dumps(value, default=str), now + ttl_s
+        # tagged with `gen`: ignored by L1 if an invalidation lands from here on
+        self.l1.set(ns, key, raw, expires, gen)
+        if self.l2 is not None:
+            self._l2("set", lambda: self.l2.set_many(ns, [(key, raw)], expires, lambda: self.gens.get(ns) == gen))
+        return value
+
+    def preload(self, ns: str, ttl_s: float, load_all: Callable[[], Dict[str, Any]]) -> int:
+        """Store every {key: value} from load_all() in both tiers; returns the number stored."""
+        if not self.enabled:
+            return 0
+        gen = self.gens.get(ns)
+        values = load_all()
+        if self.gens.get(ns) != gen:
+            return 0
+        expires = time.time() + ttl_s
+        items = [(key, json.dumps(value, default=str)) for key, value in values.items() if value is not None]
+        for key, raw in items:
+            self.l1.set(ns, key, raw, expires, gen)
+        if self.l2 is not None and items:
+            self._l2("set_many", lambda: self.l2.set_many(ns, items, expires, lambda: self.gens.get(ns) == gen))
+        return len(items)
+
+    def invalidate(self, ns: str, key: Optional[str] = None) -> None:
+        # delete and bump under one L2 write lock: a concurrent set either lands first (and is
+        # deleted here) or sees the new generation and skips its write
+        bumped = []
+
+        def bump():
+            self.gens.bump(ns)
+            bumped.append(True)
+
+        if self.l2 is not None:
+            self._l2("delete", lambda: self.l2.delete(ns, key, bump))
+        if not bumped:
+            self.gens.bump(ns)
+
+
+class Namespace:
+    def __init__(self, cache: Cache, name: str, ttl_s: float):
+        self.cache, self.name, self.ttl_s = cache, name, ttl_s
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        return self.cache.get(self.name, key, self.ttl_s, loader)
+
+    def preload(self, load_all: Callable[[], Dict[str, Any]]) -> int:
+        return self.cache.preload(self.name, self.ttl_s, load_all)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        self.cache.invalidate(self.name, key)
+
+
+def open_cache(backend: str = BACKEND, path: str = DB_PATH, l1_items: int = L1_ITEMS) -> Cache:
+    if backend == "off":
+        return Cache(L1(0), None, MemoryGenerations(), enabled=False)
+    if backend == "local" and fcntl is not None:
+        try:
+            return Cache(L1(l1_items), SqliteStore(path), MmapGenerations(path + ".gen"))
+        except (OSError, sqlite3.Error) as e:
+            log.warning("shared cache unavailable, caching per process", extra={"path": path, "error": str(e)})
+    return Cache(L1(l1_items), None, MemoryGenerations())
+
+
+shared = open_cache()
+
+
+def namespace(name: str, ttl_s: float = TTL_S) -> Namespace:
+    ns = shared.namespaces.get(name)
+    if ns is None:
+        ns = shared.namespaces[name] = Namespace(shared, name, ttl_s)
+    return ns
+
+
+def _gauges() -> List[str]:
+    entries = {'{tier="l1"}': len(shared.l1)}
+    size = {'{tier="l1"}': shared.l1.bytes}
+    if shared.l2 is not None:
+        stats = shared._l2("stats", shared.l2.stats)
+        if stats:
+            entries['{tier="l2"}'], size['{tier="l2"}'] = stats
+    return (metrics.gauge_lines("edunexus_cache_entries", "Cached entries per tier (L2 is shared by the host).", entries)
+            + metrics.gauge_lines("edunexus_cache_bytes",
+                                  "Cache memory per tier: L1 value bytes in this process, L2 file size.", size))
+
+
+def install(app) -> None:
+    metrics.register_gauges(_gauges)
+
+    @app.post("/api/py/admin/cache/invalidate", dependencies=[Depends(admin.require_admin)])
+    def invalidate_cache(cache: str, key: Optional[str] = None):
+        if cache not in shared.namespaces:
+            raise HTTPException(status_code=404, detail=f"unknown cache {cache!r}")
+        shared.namespaces[cache].invalidate(key)
+        return {"invalidated": cache, "key": key}
@@ -0,0 +1,249 @@
+"""
+Opt-in traffic capture for replaying production-like load (see replay.py).
+
+Enabled by setting TRAFFIC_CAPTURE_FILE. Every request becomes one JSON line:
+
+    {"t": 1760860800.123, "method": "POST", "path": "/api/py/signin", "route": "/api/py/signin",
+     "status": 200, "duration_ms": 412.3, "user": "u-1f9c...", "body": {...}, "query": {...},
+     "binds": "3f1c..."}
+
+Bodies are anonymised before they are written:
+  - secrets (password, tokens, admin keys) are replaced with "<redacted>",
+  - identities (email, user ids, names, org codes, institute names/ids) become
+    stable keyed pseudonyms, so one user's signin and state saves still line up,
+  - enumerations (role, orgType, type, status, title) are kept verbatim,
+  - every other value is reduced to its shape (same keys, string lengths,
+    list sizes; numbers zeroed), e.g. dashboard state contents.
+
+`user` groups the requests of one person (replay preserves their order);
+`binds` is the pseudonymous user id returned by signup/signin.
+
+TRAFFIC_CAPTURE_FILE      JSON-lines output (rotated)
+TRAFFIC_CAPTURE_MAX_MB    rotate at this size (default 50)
+TRAFFIC_CAPTURE_BACKUPS   rotated files to keep (default 5)
+TRAFFIC_CAPTURE_SAMPLE    fraction of users captured, 0..1 (default 1); whole users are kept or dropped
+TRAFFIC_CAPTURE_KEY       pseudonym key; set it to keep pseudonyms stable across restarts
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl
+
+import logs
+
+CAPTURE_FILE = os.environ.get("TRAFFIC_CAPTURE_FILE")
+MAX_BYTES = int(float(os.environ.get("TRAFFIC_CAPTURE_MAX_MB", "50")) * 1024 * 1024)
+BACKUPS = int(os.environ.get("TRAFFIC_CAPTURE_BACKUPS", "5"))
+SAMPLE = float(os.environ.get("TRAFFIC_CAPTURE_SAMPLE", "1"))
+KEY = (os.environ.get("TRAFFIC_CAPTURE_KEY") or secrets.token_hex(16)).encode()
+
+MAX_BODY_BYTES = 1024 * 1024
+# responses of these routes carry the user id we bind a pseudonym to
+BIND_ROUTES = {"/api/py/signup", "/api/py/signin"}
+SKIP_PATHS = {"/", "/metrics", "/api/py/pool-stats", "/ready"}
+
+SECRET_FIELDS = {"password", "token", "access_token", "refresh_token", "authorization", "adminkey", "admin_key"}
+KEEP_FIELDS = {"role", "orgtype", "type", "status", "title"}
+PSEUDONYMS = {
+    "email": lambda h: f"user-{h[:12]}@capture.invalid",
+    "user_id": lambda h: str(uuid.UUID(h[:32])),
+    "id": lambda h: str(uuid.UUID(h[:32])),
+    "name": lambda h: f"User {h[:6]}",
+    "uniqueid": lambda h: "C" + h[:7].upper(),
+    "code": lambda h: "C" + h[:7].upper(),
+    # institute names and ids are compared case-insensitively against each other
+    "institutename": lambda h: f"org-{h[:10]}",
+    "orgname": lambda h: f"org-{h[:10]}",
+    "schoolname": lambda h: f"org-{h[:10]}",
+    "institute_id": lambda h: f"org-{h[:10]}",
+    "instituteid": lambda h: f"org-{h[:10]}",
+}
+
+
+def _digest(value: str) -> str:
+    return hmac.new(KEY, value.strip().lower().encode(), hashlib.sha256).hexdigest()
+
+
+def pseudonym(field: str, value: Any) -> Any:
+    make = PSEUDONYMS.get(field.lower())
+    if make is None or not isinstance(value, str) or not value:
+        return value
+    return make(_digest(value))
+
+
+def shape(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [shape(v) for v in value]
+    if isinstance(value, str):
+        return "x" * len(value)
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return 0
+    return None
+
+
+def anonymize(value: Any) -> Any:
+    if not isinstance(value, dict):
+        return shape(value)
+    out = {}
+    for k, v in value.items():
+        field = k.lower()
+        if field in SECRET_FIELDS:
+            out[k] = "<redacted>"
+        elif field in PSEUDONYMS:
+            out[k] = pseudonym(field, v) if isinstance(v, str) else shape(v)
+        elif v is None or (field in KEEP_FIELDS and isinstance(v, (str, bool))):
+            out[k] = v
+        elif isinstance(v, dict):
+            out[k] = anonymize(v)
+        else:
+            out[k] = shape(v)
+    return out
+
+
+class Recorder:
+    """Owns the rotating file; request threads only enqueue (see logs.DroppingQueueHandler)."""
+
+    def __init__(self, path: str):
+        self.logger = logging.getLogger(f"{logs.ROOT_NAME}.capture.stream")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=MAX_BYTES, backupCount=BACKUPS, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        q = queue.Queue(maxsize=logs.QUEUE_SIZE)
+        self.queue_handler = logs.DroppingQueueHandler(q)
+        self.logger.addHandler(self.queue_handler)
+        self.listener = logging.handlers.QueueListener(q, handler)
+        self.listener.start()
+        # user id pseudonym -> user key, so state saves group with the signin that returned the id
+        self._owners: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def owner(self, user_id: Optional[str]) -> Optional[str]:
+        if not user_id:
+            return None
+        with self._lock:
+            return self._owners.get(user_id)
+
+    def bind(self, user_id: str, user_key: str) -> None:
+        with self._lock:
+            self._owners[user_id] = user_key
+            self._owners.move_to_end(user_id)
+            while len(self._owners) > 100_000:
+                self._owners.popitem(last=False)
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        self.logger.info(json.dumps(entry, separators=(",", ":")))
+
+
+def _sampled(user_key: Optional[str]) -> bool:
+    if SAMPLE >= 1:
+        return True
+    # hash-based so a user's whole stream is kept or dropped together
+    basis = user_key or secrets.token_hex(4)
+    return int(hashlib.sha1(basis.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF < SAMPLE
+
+
+class CaptureMiddleware:
+    """Plain ASGI: tees request bodies (and bind-route responses) into the capture stream."""
+
+    def __init__(self, app, recorder: Recorder):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in SKIP_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.time()
+        started = time.perf_counter()
+        request_body = bytearray()
+        response_body = bytearray()
+        status = {"code": 0, "bind": False}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request" and len(request_body) < MAX_BODY_BYTES:
+                request_body.extend(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                route = scope.get("route")
+                status["bind"] = getattr(route, "path", None) in BIND_ROUTES and message["status"] == 200
+            elif message["type"] == "http.response.body" and status["bind"] and len(response_body) < MAX_BODY_BYTES:
+                response_body.extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            try:
+                self._record(scope, arrived, time.perf_counter() - started, status, bytes(request_body),
+                             bytes(response_body))
+            except Exception as e:  # capture must never break a request
+                logs.get_logger("capture").warning("capture failed", extra={"error": str(e)})
+
+    def _record(self, scope, arrived: float, duration: float, status: Dict, request_body: bytes,
+                response_body: bytes) -> None:
+        try:
+            body = json.loads(request_body) if request_body else None
+        except ValueError:
+            body = None
+        query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        anon_body = anonymize(body) if body is not None else None
+        anon_query = anonymize(query) if query else None
+
+        user_key = None
+        if isinstance(body, dict) and isinstance(body.get("email"), str):
+            user_key = "u-" + _digest(body["email"])[:16]
+        elif isinstance(anon_body, dict):
+            user_key = self.recorder.owner(anon_body.get("user_id"))
+        if not _sampled(user_key):
+            return
+
+        entry = {
+            "t": round(arrived, 6),
+            "method": scope.get("method"),
+            "path": scope.get("path"),
+            "route": getattr(scope.get("route"), "path", None),
+            "status": status["code"],
+            "duration_ms": round(duration * 1000, 2),
+            "user": user_key,
+            "body": anon_body,
+        }
+        if anon_query:
+            entry["query"] = anon_query
+        if status["bind"] and response_body:
+            try:
+                user_id = (json.loads(response_body).get("user") or {}).get("id")
+            except (ValueError, AttributeError):
+                user_id = None
+            if user_id:
+                entry["binds"] = pseudonym("user_id", user_id)
+                if user_key:
+                    self.recorder.bind(entry["binds"], user_key)
+        self.recorder.write(entry)
+
+
+def install(app) -> None:
+    if not CAPTURE_FILE:
+        return
+    app.add_middleware(CaptureMiddleware, recorder=Recorder(CAPTURE_FILE))
+    logs.get_logger("capture").info("traffic capture enabled", extra={"file": CAPTURE_FILE, "sample": SAMPLE})
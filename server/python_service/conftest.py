@@ -0,0 +1,15 @@
+"""
+pytest setup for the service modules: python -m pytest -q (from server/python_service).
+
+Tests never reach a real Supabase: the URL points at a closed port unless a
+test starts supabase_standin.py itself.
+"""
+
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+# an end-to-end script against a live project, not a pytest module
+collect_ignore = ["test_signups.py"]
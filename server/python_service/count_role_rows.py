@@ -1,13 +1,16 @@
-import os
-from dotenv import load_dotenv
-load_dotenv('.env')
-import psycopg2
+import sys
 
-conn_str = os.environ.get('DATABASE_URL')
-if not conn_str:
-    raise SystemExit('DATABASE_URL missing')
-with psycopg2.connect(conn_str) as conn:
-    with conn.cursor() as cur:
-        for t in ['teachers','students','parents']:
+import db
+
+# Totals come from institute_role_counts (migration 018); --exact also runs the full count(*) scans
+exact = '--exact' in sys.argv[1:]
+
+with db.transaction() as cur:
+    cur.execute("SELECT role, COALESCE(SUM(total), 0) FROM public.institute_role_counts GROUP BY role;")
+    counted = dict(cur.fetchall())
+    for t, role in [('teachers', 'Teacher'), ('students', 'Student'), ('parents', 'Parent')]:
+        line = f"{t} {counted.get(role, 0)}"
+        if exact:
             cur.execute(f"SELECT count(*) FROM {t};")
-            print(t, cur.fetchone()[0])
+            line += f" (exact {cur.fetchone()[0]})"
+        print(line)
@@ -0,0 +1,112 @@
+"""
+Per-institute member counts (migration 018_institute_role_counts.sql).
+
+institute_role_counts holds one row per (institute, role, status), kept current
+by triggers on teachers/students/parents, so dashboards read a handful of rows
+instead of running count(*) over the role tables:
+
+    GET /api/py/management/institute-counts?institute_id=...
+    -> {"institutes": {"Inst A": {"Teacher": {"pending": 3, "approved": 12, "total": 15}, ...}}}
+
+A background thread calls reconcile_institute_role_counts() every
+COUNTERS_RECONCILE_S (default 3600, 0 disables) to repair drift from writes
+that bypassed the triggers; corrections are logged and counted in
+edunexus_counter_corrections_total. POST /api/py/admin/counters/reconcile runs
+one immediately.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Depends, HTTPException
+
+import admin
+import logs
+import metrics
+import resilience
+
+log = logs.get_logger("counters")
+
+RECONCILE_S = float(os.environ.get("COUNTERS_RECONCILE_S", "3600"))
+
+corrections_total = metrics.counter("edunexus_counter_corrections_total",
+                                    "Institute counters corrected by reconciliation.")
+
+
+def summary(client, institute_id: Optional[str] = None) -> Dict[str, Any]:
+    q = client.table("institute_role_counts").select("institute_id, role, status, total")
+    if institute_id:
+        q = q.eq("institute_id", institute_id)
+    res = resilience.call("institute_role_counts.select", q.execute, idempotent=True)
+    institutes: Dict[str, Dict[str, Dict[str, int]]] = {}
+    for row in res.data or []:
+        if not row["total"]:
+            continue
+        role = institutes.setdefault(row["institute_id"], {}).setdefault(row["role"], {"total": 0})
+        role[row["status"]] = role.get(row["status"], 0) + row["total"]
+        role["total"] += row["total"]
+    return {"institutes": institutes}
+
+
+def reconcile(client) -> int:
+    """Corrected counter rows, or -1 if another instance is reconciling."""
+    res = resilience.call("institute_role_counts.reconcile",
+                          client.rpc("reconcile_institute_role_counts", {}).execute, idempotent=True)
+    fixed = int(res.data or 0)
+    if fixed > 0:
+        corrections_total.inc(amount=fixed)
+        log.warning("institute counters drifted, corrected", extra={"rows": fixed})
+    return fixed
+
+
+class Reconciler:
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, client_getter: Callable[[], object]) -> None:
+        if self._thread is None and RECONCILE_S > 0:
+            self._thread = threading.Thread(target=self._run, args=(client_getter,), name="counters-reconcile",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, client_getter: Callable[[], object]) -> None:
+        while not self._stop.wait(RECONCILE_S):
+            client = client_getter()
+            if client is None:
+                continue
+            try:
+                reconcile(client)
+            except Exception as e:
+                log.warning("counter reconcile failed", extra={"error": str(e)})
+
+
+reconciler = Reconciler()
+
+
+def install(app, client_getter: Callable[[], object]) -> None:
+    @app.on_event("startup")
+    def start_counter_reconciler():
+        reconciler.start(client_getter)
+
+    @app.on_event("shutdown")
+    def stop_counter_reconciler():
+        reconciler.stop()
+
+    @app.get("/api/py/management/institute-counts")
+    def institute_counts(institute_id: Optional[str] = None):
+        client = client_getter()
+        if client is None:
+            raise HTTPException(status_code=500, detail="Supabase not configured")
+        return summary(client, institute_id)
+
+    @app.post("/api/py/admin/counters/reconcile", dependencies=[Depends(admin.require_admin)])
+    def reconcile_counters():
+        client = client_getter()
+        if client is None:
+            raise HTTPException(status_code=500, detail="Supabase not configured")
+        return {"corrected": reconcile(client)}
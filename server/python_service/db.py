@@ -0,0 +1,135 @@
+"""
+Shared direct-Postgres access for the admin scripts and the direct-DB fallbacks.
+
+    import db
+
+    with db.transaction() as cur:          # commit on success, rollback on error
+        cur.execute('SELECT 1')
+    with db.connection() as conn:          # manage commits yourself (COPY, batched backfills)
+        ...
+    with db.connection(autocommit=True) as conn:   # CREATE INDEX CONCURRENTLY, VACUUM
+        ...
+    db.execute_values('INSERT INTO t (a, b) VALUES %s', rows)
+
+Connections come from one lazily created ThreadedConnectionPool per process
+(DB_POOL_MIN / DB_POOL_MAX, default 1 / 4) on DATABASE_URL, or DIRECT_URL, so
+a script issuing dozens of statements pays for connect + TLS + auth once and
+keeps reusing the same warm connection. A connection goes back to the pool
+rolled back and with autocommit off; one that broke is discarded instead. The
+pool is closed at exit.
+
+psycopg2 has no pipeline mode, so batching means fewer round trips instead:
+execute_values folds many rows into one multi-row statement per page, and
+execute_batch sends a page of statements joined into one round trip.
+"""
+
+import atexit
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional, Sequence
+
+import psycopg2
+from psycopg2 import extensions, extras, pool
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
+
+DSN = os.environ.get('DATABASE_URL') or os.environ.get('DIRECT_URL')
+POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+POOL_MAX = int(os.environ.get('DB_POOL_MAX', '4'))
+
+_pool: Optional[pool.ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> pool.ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if not DSN:
+                    raise RuntimeError('DATABASE_URL (or DIRECT_URL) must be set in .env')
+                _pool = pool.ThreadedConnectionPool(POOL_MIN, max(POOL_MIN, POOL_MAX), DSN)
+    return _pool
+
+
+def close_all() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+
+
+atexit.register(close_all)
+
+
+@contextmanager
+def connection(autocommit: bool = False) -> Iterator[extensions.connection]:
+    p = get_pool()
+    conn = p.getconn()
+    if conn.closed:  # server closed it while it sat idle in the pool
+        p.putconn(conn, close=True)
+        conn = p.getconn()
+    broken = False
+    try:
+        conn.autocommit = autocommit
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        broken = broken or bool(conn.closed)
+        if not broken:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                conn.autocommit = False
+            except psycopg2.Error:
+                broken = True
+        p.putconn(conn, close=broken)
+
+
+@contextmanager
+def transaction(cursor_factory=None) -> Iterator[extensions.cursor]:
+    with connection() as conn:
+        cur = conn.cursor(cursor_factory=cursor_factory)
+        try:
+            yield cur
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
+def run_sql(sql: str, params: Optional[Sequence] = None) -> None:
+    """Run one statement (or a ;-separated script) in its own transaction."""
+    with transaction() as cur:
+        cur.execute(sql, params)
+
+
+def execute_values(sql: str, rows: Iterable[Sequence], template: Optional[str] = None,
+                   page_size: int = 1000, cur=None) -> None:
+    """Multi-row statement with a single VALUES %s placeholder, page_size rows per round trip.
+
+    Runs on `cur` when given (the caller owns the transaction), otherwise in a
+    transaction of its own.
+    """
+    if cur is not None:
+        extras.execute_values(cur, sql, rows, template=template, page_size=page_size)
+        return
+    with transaction() as own:
+        extras.execute_values(own, sql, rows, template=template, page_size=page_size)
+
+
+def execute_batch(sql: str, rows: Iterable[Sequence], page_size: int = 100, cur=None) -> None:
+    """Same statement once per row, page_size statements per round trip."""
+    if cur is not None:
+        extras.execute_batch(cur, sql, rows, page_size=page_size)
+        return
+    with transaction() as own:
+        extras.execute_batch(own, sql, rows, page_size=page_size)
@@ -1,26 +1,15 @@
 
-import os
-import psycopg2
-from dotenv import load_dotenv
+import db
 
-# Load env from parent of parent (root)
-load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env'))
-
-DB_URL = os.environ.get("DATABASE_URL") or os.environ.get("DIRECT_URL")
-
-if not DB_URL:
+if not db.DSN:
     print("Error: DATABASE_URL not found in .env")
     # try constructing it if we have credentials? No, we rely on env.
     exit(1)
 
 def run_sql(sql):
+    # every statement runs in its own transaction on the same pooled connection
     try:
-        conn = psycopg2.connect(DB_URL)
-        cur = conn.cursor()
-        cur.execute(sql)
-        conn.commit()
-        cur.close()
-        conn.close()
+        db.run_sql(sql)
         return True
     except Exception as e:
         print(f"SQL Error: {e}")
@@ -0,0 +1,183 @@
+"""
+Idempotency-Key support for retried writes (signup, state).
+
+A client that retries with the same `Idempotency-Key` header gets the stored
+response of the first attempt back (marked `Idempotent-Replayed: true`)
+without the handler running again, so a retried signup no longer trips the
+duplicate-email check and costs no Auth or table calls.
+
+  - same key, same body, first attempt finished   -> stored response replayed
+  - same key, first attempt still running          -> 409 + Retry-After
+  - same key, different body                       -> 422
+  - 5xx answers are not stored, so a retry after an upstream failure runs again
+
+Keys are scoped per route and kept for IDEMPOTENCY_TTL_S (default 24h), at
+most IDEMPOTENCY_MAX_KEYS (default 10000, oldest evicted first). The store is
+per process.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+import metrics
+
+TTL_S = float(os.environ.get("IDEMPOTENCY_TTL_S", str(24 * 3600)))
+MAX_KEYS = int(os.environ.get("IDEMPOTENCY_MAX_KEYS", "10000"))
+ROUTES = {"/api/py/signup", "/api/py/state"}
+HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+# generated per response by outer middleware; never replay them
+_SKIP_HEADERS = {b"x-trace-id", b"x-profile-id"}
+
+idempotency_total = metrics.counter(
+    "edunexus_idempotency_requests_total", "Requests carrying an Idempotency-Key, by outcome.", ("route", "outcome"))
+
+
+class Entry:
+    __slots__ = ("fingerprint", "expires", "status", "headers", "body")
+
+    def __init__(self, fingerprint: str, expires: float):
+        self.fingerprint = fingerprint
+        self.expires = expires
+        self.status: Optional[int] = None  # None while the first attempt is running
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.body = b""
+
+
+class Store:
+    def __init__(self, ttl: float = TTL_S, max_keys: int = MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[Tuple[str, str], Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: Tuple[str, str], fingerprint: str) -> Tuple[str, Optional[Entry]]:
+        """Claim `key`: ("new", entry) for the first attempt, else ("replay" | "in_flight" | "mismatch", entry)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                entry = Entry(fingerprint, now + self.ttl)
+                self._entries[key] = entry
+                while len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+                return "new", entry
+            if entry.fingerprint != fingerprint:
+                return "mismatch", entry
+            return ("in_flight" if entry.status is None else "replay"), entry
+
+    def complete(self, key: Tuple[str, str], entry: Entry, status: int, headers, body: bytes) -> None:
+        with self._lock:
+            if status >= 500:
+                # transient failure: let the retry run for real
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                return
+            entry.status = status
+            entry.headers = [(k, v) for k, v in headers if k.lower() not in _SKIP_HEADERS]
+            entry.body = body
+
+    def abandon(self, key: Tuple[str, str], entry: Entry) -> None:
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+store = Store()
+
+
+def _error(status: int, detail: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"detail": detail}, headers=headers)
+
+
+class IdempotencyMiddleware:
+    """Plain ASGI: short-circuits retries of ROUTES that carry a known Idempotency-Key."""
+
+    def __init__(self, app, store: Store = store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path")
+        if scope["type"] != "http" or scope.get("method") != "POST" or path not in ROUTES:
+            await self.app(scope, receive, send)
+            return
+        raw_key = dict(scope.get("headers") or []).get(HEADER)
+        if raw_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not raw_key or len(raw_key) > MAX_KEY_LENGTH:
+            await _error(400, "Invalid Idempotency-Key")(scope, receive, send)
+            return
+
+        # Buffer the body: it is fingerprinted, then handed to the app unchanged
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                await self.app(scope, receive, send)  # client went away; let the app see it
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        key = (path, raw_key.decode("latin-1"))
+        outcome, entry = self.store.begin(key, hashlib.sha256(body).hexdigest())
+        idempotency_total.inc(path, outcome)
+
+        if outcome == "replay":
+            await send({"type": "http.response.start", "status": entry.status,
+                        "headers": entry.headers + [(b"idempotent-replayed", b"true")]})
+            await send({"type": "http.response.body", "body": entry.body})
+            return
+        if outcome == "in_flight":
+            await _error(409, "A request with this Idempotency-Key is still being processed",
+                         {"Retry-After": "1"})(scope, receive, send)
+            return
+        if outcome == "mismatch":
+            await _error(422, "Idempotency-Key was already used with a different request")(scope, receive, send)
+            return
+
+        delivered = False
+
+        async def replay_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response = {"status": 500, "headers": [], "body": bytearray()}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers") or [])
+            elif message["type"] == "http.response.body":
+                response["body"].extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, send_wrapper)
+        except BaseException:
+            self.store.abandon(key, entry)
+            raise
+        self.store.complete(key, entry, response["status"], response["headers"], bytes(response["body"]))
+
+
+def install(app) -> None:
+    app.add_middleware(IdempotencyMiddleware)
+    metrics.register_gauges(lambda: metrics.gauge_lines(
+        "edunexus_idempotency_keys", "Idempotency keys currently stored.", {"": len(store)}))
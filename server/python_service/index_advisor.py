@@ -0,0 +1,264 @@
+"""
+Index advisor: replays the query shapes main.py (and its workers) issue against
+a seeded database with EXPLAIN (ANALYZE, BUFFERS) and flags sequential scans.
+
+    python index_advisor.py check [--min-rows 1000] [--json]
+    python index_advisor.py migration [--all] [--out ../migrations/0NN_service_query_indexes.sql]
+
+`check` prints one line per shape: execution time, buffers touched and any
+Seq Scan on a table with at least --min-rows rows (smaller tables are scanned
+sequentially on purpose by the planner, so seed first). Writes are explained
+inside a transaction that is rolled back. Exit status 1 if anything was flagged.
+
+`migration` writes CREATE INDEX CONCURRENTLY statements for the shapes that
+were flagged and whose index does not exist yet (--all: every suggestion not
+already declared in server/migrations, without connecting). The file is
+marked no-transaction.
+
+Parameter values are sampled from the database so the plans reflect real
+selectivity; shapes on tables or columns this schema lacks are reported as
+skipped.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), '..', 'migrations')
+PLACEHOLDER_ID = '00000000-0000-0000-0000-000000000000'
+
+
+class Index(NamedTuple):
+    name: str
+    table: str
+    definition: str  # everything after ON public.<table>
+
+
+class Shape(NamedTuple):
+    name: str
+    source: str             # where the service issues it
+    sql: str                # %(name)s parameters
+    sample: Optional[str]   # SELECT returning one row of parameter values
+    defaults: Dict[str, Any]
+    index: Optional[Index]  # suggested index if it seq-scans
+
+
+SHAPES: List[Shape] = [
+    Shape('users.by_email', 'python_signup duplicate check, check-email',
+          "SELECT id FROM public.users WHERE email = %(email)s",
+          "SELECT email FROM public.users ORDER BY random() LIMIT 1", {'email': 'nobody@example.com'}, None),
+    Shape('users.by_id', 'python_signin profile fetch',
+          "SELECT * FROM public.users WHERE id = %(id)s",
+          "SELECT id FROM public.users ORDER BY random() LIMIT 1", {'id': PLACEHOLDER_ID}, None),
+    Shape('users.by_institute', 'GET /api/py/management/users',
+          "SELECT id, name, email, role FROM public.users WHERE institute_id = %(institute_id)s ORDER BY id LIMIT 100",
+          "SELECT institute_id FROM public.users WHERE institute_id IS NOT NULL ORDER BY random() LIMIT 1",
+          {'institute_id': 'x'}, Index('users_institute_id_idx', 'users', '(institute_id, id)')),
+    Shape('org_codes.active_code', 'validate_org_code',
+          "SELECT * FROM public.org_codes WHERE code = %(code)s AND is_active = true",
+          "SELECT code FROM public.org_codes ORDER BY random() LIMIT 1", {'code': 'XXXXXXXX'},
+          Index('org_codes_active_code_idx', 'org_codes', '(code) WHERE is_active')),
+    Shape('teachers.pending_by_institute', 'GET /api/py/management/pending-teachers',
+          "SELECT * FROM public.teachers WHERE status = 'pending' AND institute_id = %(institute_id)s",
+          "SELECT institute_id FROM public.teachers WHERE institute_id IS NOT NULL ORDER BY random() LIMIT 1",
+          {'institute_id': 'x'},
+          Index('teachers_pending_institute_idx', 'teachers', "(institute_id) WHERE status = 'pending'")),
+    Shape('teachers.pending', 'GET /api/py/management/pending-teachers (no institute)',
+          "SELECT * FROM public.teachers WHERE status = 'pending'", None, {},
+          Index('teachers_pending_created_idx', 'teachers', "(created_at) WHERE status = 'pending'")),
+    Shape('teachers.by_user', 'python_signin status check, outbox insert_row',
+          "SELECT status FROM public.teachers WHERE user_id = %(user_id)s",
+          "SELECT user_id FROM public.teachers ORDER BY random() LIMIT 1", {'user_id': PLACEHOLDER_ID},
+          Index('teachers_user_id_idx', 'teachers', '(user_id)')),
+    Shape('teachers.approve', 'approve-teacher / reject-teacher',
+          "UPDATE public.teachers SET status = 'approved', is_verified = true WHERE user_id = %(user_id)s",
+          "SELECT user_id FROM public.teachers ORDER BY random() LIMIT 1", {'user_id': PLACEHOLDER_ID},
+          Index('teachers_user_id_idx', 'teachers', '(user_id)')),
+    Shape('students.by_user', 'outbox insert_row',
+          "SELECT user_id FROM public.students WHERE user_id = %(user_id)s",
+          "SELECT user_id FROM public.students ORDER BY random() LIMIT 1", {'user_id': PLACEHOLDER_ID},
+          Index('students_user_id_idx', 'students', '(user_id)')),
+    Shape('students.by_class', 'institute/class rosters',
+          "SELECT * FROM public.students WHERE institute_id = %(institute_id)s AND class_id = %(class_id)s",
+          "SELECT institute_id, class_id FROM public.students WHERE class_id IS NOT NULL ORDER BY random() LIMIT 1",
+          {'institute_id': 'x', 'class_id': 'x'},
+          Index('students_institute_class_idx', 'students', '(institute_id, class_id)')),
+    Shape('parents.by_user', 'outbox insert_row',
+          "SELECT user_id FROM public.parents WHERE user_id = %(user_id)s",
+          "SELECT user_id FROM public.parents ORDER BY random() LIMIT 1", {'user_id': PLACEHOLDER_ID},
+          Index('parents_user_id_idx', 'parents', '(user_id)')),
+    Shape('parents.by_child', 'parent lookup for a student',
+          "SELECT * FROM public.parents WHERE child_ids @> ARRAY[%(child)s]::text[]",
+          "SELECT child_ids[1] FROM public.parents WHERE cardinality(child_ids) > 0 ORDER BY random() LIMIT 1",
+          {'child': 'x'}, Index('parents_child_ids_idx', 'parents', 'USING gin (child_ids)')),
+    Shape('management_managers.by_user', 'outbox insert_row',
+          "SELECT user_id FROM public.management_managers WHERE user_id = %(user_id)s",
+          "SELECT user_id FROM public.management_managers ORDER BY random() LIMIT 1", {'user_id': PLACEHOLDER_ID},
+          Index('management_managers_user_id_idx', 'management_managers', '(user_id)')),
+    Shape('user_dashboard_states.by_user', 'signin state fetch, restore, state upsert',
+          "SELECT state_data FROM public.user_dashboard_states WHERE user_id = %(user_id)s",
+          "SELECT user_id FROM public.user_dashboard_states ORDER BY random() LIMIT 1", {'user_id': PLACEHOLDER_ID},
+          None),
+    Shape('signup_outbox.claim', 'outbox worker',
+          "SELECT id FROM public.signup_outbox WHERE status = 'pending' AND available_at <= NOW() "
+          "ORDER BY available_at LIMIT 50 FOR UPDATE SKIP LOCKED", None, {}, None),
+    Shape('audit_events.page', 'GET /api/py/admin/audit-events',
+          "SELECT * FROM public.audit_events WHERE occurred_at >= NOW() - INTERVAL '1 day' "
+          "ORDER BY occurred_at DESC, id DESC LIMIT 101", None, {}, None),
+    Shape('institute_role_counts.by_institute', 'GET /api/py/management/institute-counts',
+          "SELECT role, status, total FROM public.institute_role_counts WHERE institute_id = %(institute_id)s",
+          "SELECT institute_id FROM public.institute_role_counts ORDER BY random() LIMIT 1", {'institute_id': 'x'},
+          None),
+]
+
+
+def _walk(node: Dict[str, Any]):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _walk(child)
+
+
+def _table_rows(cur, table: str) -> int:
+    cur.execute("SELECT GREATEST(c.reltuples, 0)::bigint FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = 'public' AND c.relname = %s", (table,))
+    row = cur.fetchone()
+    return int(row[0]) if row else 0
+
+
+def explain(conn, shape: Shape, min_rows: int) -> Dict[str, Any]:
+    result: Dict[str, Any] = {'shape': shape.name, 'source': shape.source}
+    with conn.cursor() as cur:
+        try:
+            params = dict(shape.defaults)
+            if shape.sample:
+                cur.execute(shape.sample)
+                row = cur.fetchone()
+                if row is not None and all(v is not None for v in row):
+                    params.update(zip(shape.defaults, (str(v) for v in row)))
+            cur.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + shape.sql, params)
+            plan = cur.fetchone()[0][0]
+        except Exception as e:
+            result['skipped'] = str(e).strip().splitlines()[0]
+            return result
+        finally:
+            conn.rollback()  # EXPLAIN ANALYZE of an UPDATE really runs it
+
+        seq_scans = []
+        for node in _walk(plan['Plan']):
+            if node.get('Node Type') == 'Seq Scan':
+                rows = _table_rows(cur, node['Relation Name'])
+                if rows >= min_rows:
+                    seq_scans.append({'table': node['Relation Name'], 'table_rows': rows,
+                                      'rows_removed': node.get('Rows Removed by Filter', 0)})
+        conn.rollback()
+    top = plan['Plan']
+    result.update({
+        'execution_ms': round(plan.get('Execution Time', 0.0), 3),
+        'shared_hit': top.get('Shared Hit Blocks', 0),
+        'shared_read': top.get('Shared Read Blocks', 0),
+        'seq_scans': seq_scans,
+        'flagged': bool(seq_scans),
+    })
+    return result
+
+
+def existing_indexes(conn) -> set:
+    with conn.cursor() as cur:
+        cur.execute("SELECT indexname FROM pg_indexes WHERE schemaname = 'public'")
+        names = {r[0] for r in cur.fetchall()}
+    conn.rollback()
+    return names
+
+
+def render_migration(indexes: List[Index]) -> str:
+    lines = [
+        '-- migrate: no-transaction',
+        '-- Indexes for the query shapes in server/python_service/index_advisor.py that',
+        '-- sequential-scan without them. Generated by `python index_advisor.py migration`.',
+        '-- CONCURRENTLY: each statement runs on its own, outside a transaction.',
+    ]
+    seen = set()
+    for index in indexes:
+        if index.name in seen:
+            continue
+        seen.add(index.name)
+        users = ', '.join(s.name for s in SHAPES if s.index and s.index.name == index.name)
+        lines.append(f'-- {users}')
+        lines.append(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name} ON public.{index.table} {index.definition};')
+    return '\n'.join(lines) + '\n'
+
+
+def declared_in_migrations() -> set:
+    names = set()
+    for f in os.listdir(MIGRATIONS_DIR):
+        if f.endswith('.sql'):
+            with open(os.path.join(MIGRATIONS_DIR, f), encoding='utf-8') as fh:
+                names.update(re.findall(r'CREATE\s+INDEX\s+(?:CONCURRENTLY\s+)?IF\s+NOT\s+EXISTS\s+(\w+)', fh.read(), re.I))
+    return names
+
+
+def next_migration_path(slug: str) -> str:
+    numbers = [int(f[:3]) for f in os.listdir(MIGRATIONS_DIR) if f[:3].isdigit()]
+    return os.path.join(MIGRATIONS_DIR, f'{max(numbers, default=0) + 1:03d}_{slug}.sql')
+
+
+def cmd_check(args) -> int:
+    with db.connection() as conn:
+        results = [explain(conn, shape, args.min_rows) for shape in SHAPES]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for r in results:
+            if 'skipped' in r:
+                print(f"{r['shape']:<38} skipped: {r['skipped']}")
+                continue
+            flag = 'SEQ SCAN ' + ', '.join(f"{s['table']}({s['table_rows']} rows)" for s in r['seq_scans']) \
+                if r['flagged'] else 'ok'
+            print(f"{r['shape']:<38} {r['execution_ms']:>9.3f}ms  hit={r['shared_hit']:<6} read={r['shared_read']:<6} {flag}")
+    return 1 if any(r.get('flagged') for r in results) else 0
+
+
+def cmd_migration(args) -> int:
+    if args.all:
+        declared = declared_in_migrations()
+        wanted = [s.index for s in SHAPES if s.index and s.index.name not in declared]
+    else:
+        with db.connection() as conn:
+            flagged = {r['shape'] for r in (explain(conn, s, args.min_rows) for s in SHAPES) if r.get('flagged')}
+            present = existing_indexes(conn)
+        wanted = [s.index for s in SHAPES if s.name in flagged and s.index and s.index.name not in present]
+        for s in SHAPES:
+            if s.name in flagged and s.index is None:
+                print(f'{s.name}: flagged but has no suggested index', file=sys.stderr)
+    if not wanted:
+        print('no missing indexes', file=sys.stderr)
+        return 0
+    out = args.out or next_migration_path('service_query_indexes')
+    with open(out, 'w', encoding='utf-8') as f:
+        f.write(render_migration(wanted))
+    print(f'wrote {out}', file=sys.stderr)
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='EXPLAIN the service query shapes and suggest indexes')
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_check = sub.add_parser('check', help='explain every shape and flag sequential scans')
+    p_check.add_argument('--min-rows', type=int, default=1000, help='ignore seq scans of smaller tables')
+    p_check.add_argument('--json', action='store_true')
+    p_mig = sub.add_parser('migration', help='write a CREATE INDEX CONCURRENTLY migration')
+    p_mig.add_argument('--all', action='store_true',
+                       help='every suggested index not already in a migration file, without connecting')
+    p_mig.add_argument('--min-rows', type=int, default=1000)
+    p_mig.add_argument('--out')
+    args = parser.parse_args()
+    sys.exit(cmd_check(args) if args.cmd == 'check' else cmd_migration(args))
+
+
+if __name__ == '__main__':
+    main()
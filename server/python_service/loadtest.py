@@ -0,0 +1,285 @@
+"""
+Concurrent load generator for the Python auth service.
+
+Replays a weighted mix of realistic workloads against a running service
+(point the service at supabase_standin.py for reproducible runs):
+
+  signin   login storm: signin with role/org checks, then restore dashboard state
+  signup   bulk signups of students/teachers joining with an org code
+  state    dashboard state saves (payload size set by --state-kb)
+  poll     management polling of pending teachers
+  check    check-email lookups
+
+    python loadtest.py --target http://localhost:8000 --duration 60 --concurrency 50
+    python loadtest.py --profile morning --rate 200 --duration 120 --out morning.json
+
+--concurrency runs a closed loop (N virtual users back to back); --rate runs an
+open loop with a fixed arrival rate, and latency is measured from the scheduled
+start so a stalled server cannot hide its queueing delay (coordinated omission).
+
+All traffic comes from one IP and signin cycles through the --users accounts, so
+the service's sign-in throttle (throttle.py) would answer most signins with
+429. Start the service under test with THROTTLE_IP_BURST=0 THROTTLE_EMAIL_BURST=0
+unless the throttle itself is what you are measuring.
+
+The JSON report holds throughput, p50/p95/p99/max latency and error counts per
+endpoint, plus run metadata, so results from two builds can be diffed.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+PROFILES = {
+    # weights per scenario
+    "mixed": {"signin": 50, "signup": 10, "state": 25, "poll": 10, "check": 5},
+    "morning": {"signin": 85, "state": 10, "poll": 5},
+    "enrolment": {"signup": 70, "check": 20, "signin": 10},
+    "dashboard": {"state": 70, "signin": 20, "poll": 10},
+}
+PASSWORD = "LoadTest123!"
+
+
+@dataclass
+class Stats:
+    latencies: List[float] = field(default_factory=list)
+    statuses: Dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+
+    def record(self, seconds: float, status: str, ok: bool) -> None:
+        self.latencies.append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # nearest-rank
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(stats: Stats, elapsed: float) -> Dict:
+    values = sorted(stats.latencies)
+    n = len(values)
+    return {
+        "requests": n,
+        "throughput_rps": round(n / elapsed, 2) if elapsed else 0.0,
+        "errors": stats.errors,
+        "error_rate": round(stats.errors / n, 4) if n else 0.0,
+        "statuses": stats.statuses,
+        "latency_ms": {
+            "mean": round(sum(values) / n * 1000, 2) if n else 0.0,
+            "p50": round(percentile(values, 50) * 1000, 2),
+            "p95": round(percentile(values, 95) * 1000, 2),
+            "p99": round(percentile(values, 99) * 1000, 2),
+            "max": round(values[-1] * 1000, 2) if n else 0.0,
+        },
+    }
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.stats: Dict[str, Stats] = {}
+        self.users: List[Dict] = []          # registered accounts available for signin/state
+        self.orgs: List[Dict] = []           # {"code", "type", "institute_id"}
+        self.state_payload = {"widgets": [{"id": i, "layout": "x" * 64} for i in range(max(1, args.state_kb * 1024 // 90))]}
+
+    async def request(self, endpoint: str, method: str, path: str, scheduled: Optional[float] = None,
+                      ok_statuses=(200,), **kwargs) -> Optional[httpx.Response]:
+        started = scheduled if scheduled is not None else time.perf_counter()
+        try:
+            res = await self.client.request(method, path, **kwargs)
+            status, ok = str(res.status_code), res.status_code in ok_statuses
+        except httpx.HTTPError as e:
+            res, status, ok = None, type(e).__name__, False
+        self.stats.setdefault(endpoint, Stats()).record(time.perf_counter() - started, status, ok)
+        return res
+
+    # --- setup ---
+
+    async def setup(self) -> None:
+        for i in range(self.args.orgs):
+            org_type = "institute" if i % 2 == 0 else "school"
+            institute_id = f"loadtest-{org_type}-{i}"
+            res = await self.client.post("/api/py/create-org-code", json={"type": org_type, "institute_id": institute_id})
+            res.raise_for_status()
+            self.orgs.append({"code": res.json()["code"], "type": org_type, "institute_id": institute_id})
+        sem = asyncio.Semaphore(self.args.concurrency)
+
+        async def register(_):
+            async with sem:
+                await self.signup(record=False)
+
+        await asyncio.gather(*(register(i) for i in range(self.args.users)))
+        if not self.users:
+            raise SystemExit("setup failed: no users could be registered")
+
+    # --- scenarios ---
+
+    async def signup(self, scheduled: Optional[float] = None, record: bool = True) -> None:
+        org = random.choice(self.orgs)
+        role = random.choice(["Student", "Student", "Student", "Teacher", "Parent"])
+        email = f"lt_{uuid.uuid4().hex[:12]}@loadtest.example.com"
+        body = {"name": "Load Test", "email": email, "password": PASSWORD, "role": role,
+                "extra": {"uniqueId": org["code"], "orgType": org["type"]}}
+        if record:
+            res = await self.request("signup", "POST", "/api/py/signup", scheduled, json=body)
+        else:
+            try:
+                res = await self.client.post("/api/py/signup", json=body)
+            except httpx.HTTPError:
+                return
+        if res is not None and res.status_code == 200:
+            self.users.append({"email": email, "role": role, "org": org, "id": res.json()["user"]["id"]})
+
+    async def signin(self, scheduled: Optional[float] = None) -> None:
+        user = random.choice(self.users)
+        org = user["org"]
+        body = {"email": user["email"], "password": PASSWORD, "role": user["role"],
+                "extra": {"uniqueId": org["code"], "orgType": org["type"], "instituteName": org["institute_id"]}}
+        # teachers stay pending until a manager approves them; the service answers 403
+        ok = (200, 403) if user["role"] == "Teacher" else (200,)
+        res = await self.request("signin", "POST", "/api/py/signin", scheduled, ok_statuses=ok, json=body)
+        if res is not None and res.status_code == 200:
+            await self.request("restore_state", "POST", "/api/py/restore-dashboard-state", json={"user_id": user["id"]})
+
+    async def state(self, scheduled: Optional[float] = None) -> None:
+        user = random.choice(self.users)
+        payload = {**self.state_payload, "saved_at": time.time()}
+        await self.request("state", "POST", "/api/py/state", scheduled, json={"user_id": user["id"], "state": payload})
+
+    async def poll(self, scheduled: Optional[float] = None) -> None:
+        org = random.choice(self.orgs)
+        await self.request("pending_teachers", "GET", "/api/py/management/pending-teachers", scheduled,
+                           params={"institute_id": org["institute_id"]})
+
+    async def check(self, scheduled: Optional[float] = None) -> None:
+        email = random.choice(self.users)["email"] if random.random() < 0.5 else f"nobody_{uuid.uuid4().hex[:8]}@example.com"
+        await self.request("check_email", "POST", "/api/py/check-email", scheduled, json={"email": email})
+
+    # --- drivers ---
+
+    def pick(self, weights: Dict[str, int]):
+        names = list(weights)
+        return getattr(self, random.choices(names, weights=[weights[n] for n in names])[0])
+
+    async def closed_loop(self, weights: Dict[str, int], deadline: float) -> None:
+        async def virtual_user():
+            while time.perf_counter() < deadline:
+                await self.pick(weights)()
+
+        await asyncio.gather(*(virtual_user() for _ in range(self.args.concurrency)))
+
+    async def open_loop(self, weights: Dict[str, int], deadline: float) -> None:
+        interval = 1.0 / self.args.rate
+        next_at = time.perf_counter()
+        tasks = set()
+        while next_at < deadline:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(self.pick(weights)(scheduled=next_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_at += random.expovariate(1.0 / interval) if self.args.poisson else interval
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in PROFILES["mixed"]:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}")
+        weights[name.strip()] = int(weight or 1)
+    return weights
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+async def run(args) -> Dict:
+    weights = args.mix or PROFILES[args.profile]
+    limits = httpx.Limits(max_connections=max(args.concurrency, 10), max_keepalive_connections=max(args.concurrency, 10))
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+        test = LoadTest(client, args)
+        await test.setup()
+        test.stats.clear()
+        started = time.perf_counter()
+        deadline = started + args.duration
+        if args.rate:
+            await test.open_loop(weights, deadline)
+        else:
+            await test.closed_loop(weights, deadline)
+        elapsed = time.perf_counter() - started
+
+    total = Stats()
+    for s in test.stats.values():
+        total.latencies.extend(s.latencies)
+        total.errors += s.errors
+        for status, count in s.statuses.items():
+            total.statuses[status] = total.statuses.get(status, 0) + count
+    return {
+        "meta": {
+            "label": args.label, "revision": git_revision(), "target": args.target,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "duration_s": round(elapsed, 2), "mode": "open" if args.rate else "closed",
+            "rate": args.rate, "concurrency": args.concurrency, "mix": weights,
+            "setup": {"orgs": args.orgs, "users": args.users, "state_kb": args.state_kb},
+        },
+        "total": summarize(total, elapsed),
+        "endpoints": {name: summarize(s, elapsed) for name, s in sorted(test.stats.items())},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the Python auth service")
+    parser.add_argument("--target", default="http://localhost:8000")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed")
+    parser.add_argument("--mix", type=parse_mix, help="custom weights, e.g. signin=60,state=30,poll=10")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of measured load")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users (closed loop)")
+    parser.add_argument("--rate", type=float, help="arrivals per second (open loop)")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times with --rate")
+    parser.add_argument("--orgs", type=int, default=4, help="org codes created during setup")
+    parser.add_argument("--users", type=int, default=50, help="accounts registered during setup")
+    parser.add_argument("--state-kb", type=int, default=8, help="approximate dashboard state size")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--label", help="free-form build label stored in the report")
+    parser.add_argument("--out", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        t = report["total"]
+        print(f"{t['requests']} requests, {t['throughput_rps']} req/s, p95 {t['latency_ms']['p95']}ms, "
+              f"errors {t['error_rate']:.2%} -> {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
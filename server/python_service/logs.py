@@ -0,0 +1,135 @@
+"""
+Structured, non-blocking logging for the Python service.
+
+Request threads only put records on an in-memory queue (QueueHandler); a
+single listener thread formats them as JSON lines and writes to stdout, so
+stdout I/O never happens on the request path. Every record carries the
+current trace id (see tracing.py) and any `extra={...}` fields.
+
+    log = logs.get_logger("signup")
+    log.warning("role table insert failed", extra={"role": req.role, "error": str(e)})
+
+LOG_LEVEL          minimum level (default INFO; DEBUG enables the debug lines)
+LOG_DEBUG_SAMPLE   keep 1 in N DEBUG records per call site (default 1 = all)
+LOG_QUEUE_SIZE     max queued records before new ones are dropped (default 10000)
+LOG_FORMAT         "json" (default) or "text" for local development
+
+With DEBUG off, `log.debug(...)` costs one cached level check; pass values as
+%-args rather than f-strings so nothing is formatted for dropped records.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+DEBUG_SAMPLE = max(1, int(os.environ.get("LOG_DEBUG_SAMPLE", "1")))
+QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+
+ROOT_NAME = "edunexus"
+
+# attributes every LogRecord has; anything else came from `extra=`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "trace_id"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Runs on the calling thread: stamps the trace id and samples DEBUG records."""
+
+    def __init__(self, debug_sample: int = 1):
+        super().__init__()
+        self.debug_sample = debug_sample
+        self._counts = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno == logging.DEBUG and self.debug_sample > 1:
+            site = (record.pathname, record.lineno)
+            n = self._counts.get(site, 0)
+            self._counts[site] = n + 1  # racy increments only skew the sample slightly
+            if n % self.debug_sample:
+                return False
+        # tracing imports this module, so look it up lazily instead of importing it
+        tracing = sys.modules.get("tracing")
+        record.trace_id = tracing.current_trace_id() if tracing else None
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller: when the queue is full the record is dropped."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render message and traceback on the calling thread: args may be mutated and
+        # the live frames are gone by the time the listener formats the record.
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_lock = threading.Lock()
+_listener = None
+queue_handler = None
+
+
+def setup() -> logging.Logger:
+    """Idempotently wire the edunexus logger tree to the background JSON writer."""
+    global _listener, queue_handler
+    root = logging.getLogger(ROOT_NAME)
+    with _lock:
+        if _listener is not None:
+            return root
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter() if FORMAT == "json" else
+                            logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        queue_handler = DroppingQueueHandler(q)
+        queue_handler.addFilter(ContextFilter(DEBUG_SAMPLE))
+        root.addHandler(queue_handler)
+        root.setLevel(getattr(logging, LEVEL, logging.INFO))
+        root.propagate = False
+        _listener = logging.handlers.QueueListener(q, stream, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+    return root
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup()
+    return logging.getLogger(f"{ROOT_NAME}.{name}")
@@ -1,15 +1,35 @@
-
 import os
+import sys
 import json
 import random
 import string
-from fastapi import FastAPI, HTTPException, Body, Header
+from fastapi import FastAPI, HTTPException, Body, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
 
+# Sibling helper modules live next to this file; make them importable whether we are
+# started as `python main.py` or as `uvicorn server.python_service.main:app` (render.yaml).
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import admin
+import audit
+import cache
+import capture
+import counters
+import idempotency
+import logs
+import metrics
+import outbox
+import profiling
+import resilience
+import throttle
+import tracing
+import warmup
+import worker_pool
+
 # Load env from parent directory
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', '.env'))
 
@@ -17,10 +37,16 @@ url: str = os.environ.get("SUPABASE_URL") or os.environ.get("VITE_SUPABASE_URL")
 # Use Service Role Key for Admin Access (Bypasses RLS)
 key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
 
+log = logs.get_logger("service")
+
 if not url or not key:
-    print("CRITICAL WARNING: SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY missing.")
+    log.critical("SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY missing")
 
 app = FastAPI()
+# Sync endpoints run on the AnyIO thread pool; instrument them and shed load when it saturates.
+# Installed before CORS so that CORS (added later, hence outer) also decorates 503 sheds.
+app.router.route_class = worker_pool.PooledRoute
+worker_pool.install(app)
 
 # Build allowed origin list and regex for local dev/private LAN IPs
 _allowed_origins = ["http://localhost:5173", "https://edunexus-frontend-v2.onrender.com"]
@@ -54,15 +80,42 @@ from fastapi.responses import JSONResponse
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
-    print(f"Validation Error: {exc}")
+    log.info("validation error", extra={"path": request.url.path, "error": str(exc)})
     return JSONResponse(
         status_code=422,
         content={"detail": str(exc), "body": str(exc.body)},
     )
 
+@app.exception_handler(resilience.UpstreamUnavailable)
+async def upstream_unavailable_handler(request, exc):
+    log.warning("upstream unavailable", extra={"path": request.url.path, "error": str(exc)})
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily unavailable, please retry"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.middleware("http")
+async def request_budget_middleware(request, call_next):
+    # Every outbound Supabase call made while serving this request shares one deadline
+    with resilience.request_budget():
+        return await call_next(request)
+
+# Admin-only CPU / per-request / allocation profiling endpoints
+profiling.install(app)
+# Retries of signup / state with the same Idempotency-Key replay the first answer
+idempotency.install(app)
+# Opt-in anonymised traffic capture for replay.py (TRAFFIC_CAPTURE_FILE)
+capture.install(app)
+
+# Added last so they are the outermost layers and also see shed / failed requests;
+# tracing wraps metrics so every span tree covers the full request.
+metrics.install(app)
+tracing.install(app)
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
-    print(f"Global Error: {exc}")
+    log.error("unhandled error", exc_info=exc, extra={"path": request.url.path})
     return JSONResponse(
         status_code=500,
         content={"detail": f"Internal Server Error: {str(exc)}"},
@@ -92,22 +145,64 @@ class OrgCodeRequest(BaseModel):
 # Global Supabase Client
 supabase_admin: Client = None
 
+def client_options() -> ClientOptions:
+    # Fresh options per client: the default session storage must not be shared
+    # between the admin client and per-request auth clients.
+    return ClientOptions(postgrest_client_timeout=resilience.CALL_TIMEOUT_S)
+
+def new_client() -> Client:
+    return create_client(url, key, options=client_options())
+
 if url and key:
     try:
-        supabase_admin = create_client(url, key)
+        supabase_admin = new_client()
     except Exception as e:
-        print(f"Failed to initialize Supabase client: {e}")
+        log.error("failed to initialize Supabase client", extra={"error": str(e)})
 
 def get_supabase_admin() -> Client:
     return supabase_admin
 
+def run_query(query, name: str, idempotent: bool = False):
+    """Execute a PostgREST query builder through the resilience layer.
+
+    `name` is "<table>.<operation>". Like resilience.call, nothing is retried or
+    hedged unless the caller passes idempotent=True (reads, and writes judged
+    safe to repeat).
+    """
+    return resilience.call(name, query.execute, idempotent=idempotent)
+
+# Background worker for post-signup tasks (signup_outbox)
+outbox.install(app, get_supabase_admin)
+# Buffered audit log (audit_events) + GET /api/py/admin/audit-events
+audit.install(app, get_supabase_admin)
+# Per-institute role counts (institute_role_counts) + periodic reconciliation
+counters.install(app, get_supabase_admin)
+# Sign-in admission control (per-email / per-IP buckets, Auth concurrency cap)
+throttle.install(app)
+# Two-tier lookup cache (per-process LRU + host-wide SQLite), shared by all workers
+cache.install(app)
+org_codes_cache = cache.namespace("org_codes")
+org_names_cache = cache.namespace("org_names")
+profiles_cache = cache.namespace("profiles")
+# GET /ready: 503 until start-up warm-up (connections, org codes, org names) is done
+warmup.install(app)
+
+# AUTO_MIGRATE=1 applies pending server/migrations on start-up (migrate.py, needs DATABASE_URL);
+# a no-op check is one SELECT, and concurrent workers serialize on an advisory lock
+AUTO_MIGRATE = os.environ.get("AUTO_MIGRATE", "0") == "1"
+
 @app.on_event("startup")
 def startup_db_check():
+    if AUTO_MIGRATE:
+        import migrate  # psycopg2 is only needed when enabled
+        migrate.run_at_startup()
     supabase = get_supabase_admin()
     if not supabase:
-        print("[ERROR] Supabase not connected.")
-        return
-    print(f"Service Ready. Key loaded: {key[:5]}...")
+        log.error("Supabase not connected")
+    else:
+        log.info("service started", extra={"key_prefix": key[:5]})
+    # after migrations, so preload queries see the current schema; / answers meanwhile, /ready does not
+    warmup.start(get_supabase_admin)
 
 @app.get("/")
 def read_root():
@@ -118,18 +213,101 @@ def read_root():
 def generate_code(length=8):
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
+def check_signin_account(req: SigninRequest, db_role: Optional[str], db_org_type: Optional[str]):
+    """Role / org-type checks on the stored profile; raises HTTPException on mismatch."""
+    # A. Role Check (if role provided)
+    # Note: req.role might be "Management" but user is "Manager" (simplified role check needed?)
+    # For now, strict check if provided.
+    if req.role and req.role != db_role:
+        raise HTTPException(status_code=400, detail=f"Login denied. Role mismatch: Account is registered as {db_role}.")
+
+    # B. Org Type Check (Strict)
+    # Verify if user registered as School trying to login as Institute
+    desired_org_type = req.extra.get("orgType") if req.extra else None
+
+    # Normalize comparison
+    if db_org_type and desired_org_type:
+        db_norm = db_org_type.lower()
+        req_norm = desired_org_type.lower()
+
+        if db_norm != req_norm:
+            if db_norm == "school" and req_norm == "institute":
+                raise HTTPException(status_code=400, detail="Wrong Input")
+            if db_norm == "institute" and req_norm == "school":
+                raise HTTPException(status_code=400, detail="Wrong Input")
+            # Generic fallback
+            raise HTTPException(status_code=400, detail="Wrong Input")
+
+def role_row(req: SignupRequest, user_id: str, org_info: Optional[dict]) -> Optional[dict]:
+    """The role-specific row for a new user, written in the profile's transaction."""
+    if req.role == "Management":
+        # Create default manager entry
+        return {"table": "management_managers", "row": {
+            "user_id": user_id,
+            "name": req.name,
+            "email": req.email,
+            "role": "Manager"
+        }}
+    if req.role == "Teacher":
+        return {"table": "teachers", "row": {
+            "user_id": user_id,
+            "title": req.extra.get("title"),
+            "department": req.extra.get("department"),
+            "institute_id": org_info["institute_id"] if org_info else (req.extra.get("instituteName") or req.extra.get("instituteId")),
+            "class_id": req.extra.get("classId"),
+            "is_verified": False,
+            "status": "pending"
+        }}
+    if req.role == "Student":
+        return {"table": "students", "row": {
+            "user_id": user_id,
+            "roll_number": req.extra.get("rollNumber"),
+            "class_id": req.extra.get("classId"),
+            "institute_id": org_info["institute_id"] if org_info else req.extra.get("instituteId"),
+            "parent_id": req.extra.get("parentId"),
+            "is_verified": False,
+            "status": "pending"
+        }}
+    if req.role == "Parent":
+        return {"table": "parents", "row": {
+            "user_id": user_id,
+            "institute_id": org_info["institute_id"] if org_info else None,
+            "child_ids": req.extra.get("childIds", [])
+        }}
+    return None
+
+def authenticated_user_id(authorization: Optional[str]) -> Optional[str]:
+    """User id behind `Authorization: Bearer <access token>` (the signin token), or None."""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    token = authorization[7:].strip()
+    try:
+        res = resilience.call("auth.get_user", lambda: get_supabase_admin().auth.get_user(token), idempotent=True)
+    except resilience.UpstreamUnavailable:
+        raise
+    except Exception:
+        return None
+    return getattr(getattr(res, "user", None), "id", None)
+
 def validate_org_code(code: str, required_type: Optional[str] = None):
     try:
         supabase = get_supabase_admin()
-        res = supabase.table("org_codes").select("*").eq("code", code).eq("is_active", True).execute()
-        if not res.data:
+
+        def load():
+            res = run_query(supabase.table("org_codes").select("*").eq("code", code).eq("is_active", True), "org_codes.select", idempotent=True)
+            return res.data[0] if res.data else None
+
+        data = org_codes_cache.get(code, load)
+        if not data:
             return None
-        
-        data = res.data[0]
+
         if required_type and data['type'] != required_type:
             return None
             
         return data
+    except resilience.UpstreamUnavailable:
+        # Don't report "invalid code" when we simply couldn't reach Supabase
+        raise
     except:
         return None
 
@@ -142,129 +320,150 @@ def python_signup(req: SignupRequest):
         raise HTTPException(status_code=500, detail="Supabase not configured")
 
     # 1. Strict Duplicate Check (Use public table as source of truth)
-    try:
-        # Check simple duplicate
-        existing_res = supabase.table("users").select("id").eq("email", req.email).execute()
-        if existing_res.data and len(existing_res.data) > 0:
-            # Strict rejection as requested
-            raise HTTPException(status_code=400, detail="Email-ID already been used")
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Error checking duplicate: {e}")
-        # Fail safe
-        raise HTTPException(status_code=500, detail="Internal Server Error during validation")
+    with tracing.span("signup.duplicate_check"):
+        try:
+            # Check simple duplicate
+            existing_res = run_query(supabase.table("users").select("id").eq("email", req.email), "users.select", idempotent=True)
+            if existing_res.data and len(existing_res.data) > 0:
+                # Strict rejection as requested
+                raise HTTPException(status_code=400, detail="Email-ID already been used")
+        except (HTTPException, resilience.UpstreamUnavailable):
+            raise
+        except Exception as e:
+            log.error("duplicate check failed", extra={"error": str(e)})
+            # Fail safe
+            raise HTTPException(status_code=500, detail="Internal Server Error during validation")
     
     # 2. ORG CODE VALIDATION FOR NON-MANAGEMENT
     org_info = None
-    if req.role in ["Student", "Parent", "Teacher"]:
-        # Code is expected in 'extra'
-        code = req.extra.get("uniqueId") or req.extra.get("code")
+    with tracing.span("signup.org_code_validation"):
+        if req.role in ["Student", "Parent", "Teacher"]:
+            # Code is expected in 'extra'
+            code = req.extra.get("uniqueId") or req.extra.get("code")
         
-        # For Teachers, we now enforce validation if they claim to join an institute
-        if req.role == "Teacher" and not code:
-             # If using invited flow (frontend pendingTeacher), frontend might pass code?
-             # But if passing uniqueId, we check it.
-             pass
-
-        if code:
-            org_info = validate_org_code(code)
-            if not org_info:
-                # If code provided but invalid (checks org_codes table)
-                raise HTTPException(status_code=400, detail="Invalid Organization Code")
-
-            # STRICT TYPE CHECK: ensure user selected correct tab/type for this code
-            req_type = req.extra.get("orgType") or req.extra.get("type")
-            if req_type:
-                 req_type_norm = req_type.lower()
-                 info_type_norm = org_info.get("type", "").lower()
-                 if req_type_norm != info_type_norm:
-                      # Mismatch: User used School tab for Institute code or vice versa
-                      raise HTTPException(status_code=400, detail="Invalid Details")
+            # For Teachers, we now enforce validation if they claim to join an institute
+            if req.role == "Teacher" and not code:
+                 # If using invited flow (frontend pendingTeacher), frontend might pass code?
+                 # But if passing uniqueId, we check it.
+                 pass
+
+            if code:
+                org_info = validate_org_code(code)
+                if not org_info:
+                    # If code provided but invalid (checks org_codes table)
+                    raise HTTPException(status_code=400, detail="Invalid Organization Code")
+
+                # STRICT TYPE CHECK: ensure user selected correct tab/type for this code
+                req_type = req.extra.get("orgType") or req.extra.get("type")
+                if req_type:
+                     req_type_norm = req_type.lower()
+                     info_type_norm = org_info.get("type", "").lower()
+                     if req_type_norm != info_type_norm:
+                          # Mismatch: User used School tab for Institute code or vice versa
+                          raise HTTPException(status_code=400, detail="Invalid Details")
 
     # 0. CHECK IF USER ALREADY EXISTS IN PUBLIC TABLE
-    try:
-        # Fetch role and extra to check consistency
-        existing_res = supabase.table("users").select("*").eq("email", req.email).execute()
-        if existing_res.data and len(existing_res.data) > 0:
-             existing_user = existing_res.data[0]
+    with tracing.span("signup.existing_user_check"):
+        try:
+            # Fetch role and extra to check consistency
+            existing_res = run_query(supabase.table("users").select("*").eq("email", req.email), "users.select", idempotent=True)
+            if existing_res.data and len(existing_res.data) > 0:
+                 existing_user = existing_res.data[0]
              
-             # Check for "Context Switch" Exception for Management Roles
-             ALLOWED_TITLES = ["Chairman", "Director", "Principal", "Vice Principal", "Manager", "Administrator"]
+                 # Check for "Context Switch" Exception for Management Roles
+                 ALLOWED_TITLES = ["Chairman", "Director", "Principal", "Vice Principal", "Manager", "Administrator"]
              
-             req_title = req.extra.get("title")
-             is_management = req.role == "Management"
-             title_ok = req_title in ALLOWED_TITLES
+                 req_title = req.extra.get("title")
+                 is_management = req.role == "Management"
+                 title_ok = req_title in ALLOWED_TITLES
              
-             existing_role = existing_user.get("role")
-             existing_extra = existing_user.get("extra") or {}
-             existing_type = existing_extra.get("type") or existing_extra.get("org_type")
+                 existing_role = existing_user.get("role")
+                 existing_extra = existing_user.get("extra") or {}
+                 # promoted column (migration 019), extra for rows not backfilled yet
+                 existing_type = existing_user.get("org_type") or existing_extra.get("type") or existing_extra.get("org_type")
              
-             req_type = req.extra.get("type")
-             if org_info:
-                 req_type = org_info.get("type")
+                 req_type = req.extra.get("type")
+                 if org_info:
+                     req_type = org_info.get("type")
              
-             # Allow Merge/Update if Management switching context
-             if is_management and title_ok and existing_role == "Management" and existing_type and req_type and existing_type != req_type:
-                 print(f"Allowing Context Switch for {req.email}: {existing_type} -> {req_type}")
-                 new_extra = {**existing_extra, **req.extra}
-                 if req_type:
-                     new_extra["type"] = req_type
-                     new_extra["org_type"] = req_type
+                 # Allow Merge/Update if Management switching context
+                 if is_management and title_ok and existing_role == "Management" and existing_type and req_type and existing_type != req_type:
+                     log.info("allowing context switch", extra={"email": req.email, "from_type": existing_type, "to_type": req_type})
+                     new_extra = {**existing_extra, **req.extra}
+                     if req_type:
+                         new_extra["type"] = req_type
+                         new_extra["org_type"] = req_type
                  
-                 supabase.table("users").update({"extra": new_extra}).eq("id", existing_user['id']).execute()
-                 existing_user["extra"] = new_extra
-                 return {"success": True, "user": existing_user}
+                     run_query(supabase.table("users").update({"extra": new_extra}).eq("id", existing_user['id']), "users.update")
+                     profiles_cache.invalidate(existing_user['id'])
+                     audit.record("user.context_switch", actor_id=existing_user["id"], subject_id=existing_user["id"],
+                                  institute_id=org_info["institute_id"] if org_info else existing_user.get("institute_id"),
+                                  from_type=existing_type, to_type=req_type)
+                     existing_user["extra"] = new_extra
+                     existing_user["org_type"] = req_type
+                     return {"success": True, "user": existing_user}
              
-             raise HTTPException(status_code=400, detail="Email-ID is already existing")
+                 raise HTTPException(status_code=400, detail="Email-ID is already existing")
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Error checking existing user: {e}")
+        except (HTTPException, resilience.UpstreamUnavailable):
+            raise
+        except Exception as e:
+            log.warning("existing user check failed", extra={"error": str(e)})
 
     try:
         # 2. Native Auth Signup
         user_id = None
-        try:
-            auth_client = create_client(url, key)
-            # Prefer admin create_user when service role key is available to avoid relying on
-            # SMTP/email delivery for confirmation during automated flows/tests.
-            auth_res = None
+        with tracing.span("signup.auth_create"):
             try:
-                # create user as already-confirmed to avoid email confirmation errors in test env
-                auth_res = auth_client.auth.admin.create_user({"email": req.email, "password": req.password, "email_confirm": True})
-                # admin.create_user returns a dict-like object with 'user'
-                if isinstance(auth_res, dict) and auth_res.get('user'):
-                    user_id = auth_res['user']['id']
-                else:
-                    user_id = getattr(auth_res.user, 'id', None)
-            except Exception as auth_err:
-                msg = str(auth_err)
-                # If user already registered in Auth (but passed step 0, so NOT in public db), 
-                # we have a zombie Auth user. We can't easily get the ID without admin.list_users 
-                # or signing in.
-                # However, falling back to sign_up when "User already registered" will just fail again 
-                # or try to send email.
-                print(f"Admin create_user failed: {msg}")
+                auth_client = new_client()
+                # Prefer admin create_user when service role key is available to avoid relying on
+                # SMTP/email delivery for confirmation during automated flows/tests.
+                auth_res = None
+                try:
+                    # create user as already-confirmed to avoid email confirmation errors in test env
+                    auth_res = resilience.call(
+                        "auth.admin.create_user",
+                        lambda: auth_client.auth.admin.create_user({"email": req.email, "password": req.password, "email_confirm": True}),
+                    )
+                    # admin.create_user returns a dict-like object with 'user'
+                    if isinstance(auth_res, dict) and auth_res.get('user'):
+                        user_id = auth_res['user']['id']
+                    else:
+                        user_id = getattr(auth_res.user, 'id', None)
+                except resilience.UpstreamUnavailable:
+                    # The user may or may not have been created; a sign_up fallback would only muddy that
+                    raise
+                except Exception as auth_err:
+                    msg = str(auth_err)
+                    # If user already registered in Auth (but passed step 0, so NOT in public db), 
+                    # we have a zombie Auth user. We can't easily get the ID without admin.list_users 
+                    # or signing in.
+                    # However, falling back to sign_up when "User already registered" will just fail again 
+                    # or try to send email.
+                    log.warning("admin create_user failed", extra={"error": msg})
                 
-                if "already registered" in msg or "already exists" in msg:
-                    # Zombie auth user. We really should stop or warn. 
-                    # If we fallback to sign_up, it sends email.
-                    # Best action: Fail and tell user to contact support or try password reset?
-                    # Or for now, treat as failure.
-                    raise HTTPException(status_code=400, detail="Email-ID is already existing")
+                    if "already registered" in msg or "already exists" in msg:
+                        # Zombie auth user. We really should stop or warn. 
+                        # If we fallback to sign_up, it sends email.
+                        # Best action: Fail and tell user to contact support or try password reset?
+                        # Or for now, treat as failure. `reconcile_auth.py --repair auth` clears these out.
+                        raise HTTPException(status_code=400, detail="Email-ID is already existing")
                 
-                # Only fallback if it's NOT an "already registered" error (e.g. unknown error)
-                # Fallback: attempt standard sign_up (may send confirmation email)
-                print("Falling back to standard sign_up...")
-                auth_res = auth_client.auth.sign_up({"email": req.email, "password": req.password})
-                user_id = getattr(auth_res.user, 'id', None) if auth_res and hasattr(auth_res, 'user') else None
-
-        except Exception as e:
-            # Catching the fallback error or logic error
-            print(f"Auth loop failed: {e}")
-            raise HTTPException(status_code=400, detail=f"Auth Signup Failed: {str(e)}")
+                    # Only fallback if it's NOT an "already registered" error (e.g. unknown error)
+                    # Fallback: attempt standard sign_up (may send confirmation email)
+                    log.info("falling back to standard sign_up")
+                    auth_res = resilience.call(
+                        "auth.sign_up",
+                        lambda: auth_client.auth.sign_up({"email": req.email, "password": req.password}),
+                    )
+                    user_id = getattr(auth_res.user, 'id', None) if auth_res and hasattr(auth_res, 'user') else None
+
+            except resilience.UpstreamUnavailable:
+                raise
+            except Exception as e:
+                # Catching the fallback error or logic error
+                log.warning("auth signup failed", extra={"error": str(e)})
+                raise HTTPException(status_code=400, detail=f"Auth Signup Failed: {str(e)}")
         
         if not user_id:
             raise HTTPException(status_code=400, detail="Signup failed")
@@ -286,60 +485,23 @@ def python_signup(req: SignupRequest):
             user_data["extra"]["institute_id"] = org_info["institute_id"]
             user_data["extra"]["org_type"] = org_info["type"]
 
-        supabase.table("users").insert(user_data).execute()
-
-        # 4. Role Specific Tables (NEW)
-        try:
-            if req.role == "Management":
-                # Create default manager entry
-                mgr_data = {
-                    "user_id": user_id,
-                    "name": req.name,
-                    "email": req.email,
-                    "role": "Manager"
-                }
-                supabase.table("management_managers").insert(mgr_data).execute()
-
-            elif req.role == "Teacher":
-                t_data = {
-                    "user_id": user_id,
-                    "title": req.extra.get("title"),
-                    "department": req.extra.get("department"),
-                    "institute_id": org_info["institute_id"] if org_info else (req.extra.get("instituteName") or req.extra.get("instituteId")),
-                    "class_id": req.extra.get("classId"),
-                    "is_verified": False,
-                    "status": "pending"
-                }
-                supabase.table("teachers").insert(t_data).execute()
-
-            elif req.role == "Student":
-                s_data = {
-                    "user_id": user_id,
-                    "roll_number": req.extra.get("rollNumber"),
-                    "class_id": req.extra.get("classId"),
-                    "institute_id": org_info["institute_id"] if org_info else req.extra.get("instituteId"),
-                    "parent_id": req.extra.get("parentId"),
-                    "is_verified": False,
-                    "status": "pending"
-                }
-                supabase.table("students").insert(s_data).execute()
-
-            elif req.role == "Parent":
-                p_data = {
-                    "user_id": user_id,
-                    "institute_id": org_info["institute_id"] if org_info else None,
-                    "child_ids": req.extra.get("childIds", [])
-                }
-                supabase.table("parents").insert(p_data).execute()
-        except Exception as e:
-            print(f"Warning: Failed to insert into role table: {e}")
-            # Do not fail request, just log
+        # 4. Role specific row in the same transaction as the profile: signin and
+        # approve/reject rely on it existing. The signup audit event is committed
+        # with them and written to audit_events by the outbox worker.
+        signup_event = audit.outbox_tasks(
+            "user.signup", actor_id=user_id, subject_id=user_id,
+            institute_id=org_info["institute_id"] if org_info else None, role=req.role,
+            org_type=org_info["type"] if org_info else None, org_code=org_info.get("code") if org_info else None)
+        with tracing.span("signup.profile_insert"):
+            outbox.create_profile(supabase, user_data, role_row(req, user_id, org_info), signup_event)
 
         new_user = user_data
         return {"success": True, "user": new_user}
 
+    except resilience.UpstreamUnavailable:
+        raise
     except Exception as e:
-        print(f"Signup Error: {e}")
+        log.error("signup error", extra={"error": str(e)})
         msg = str(e).lower()
         if "duplicate" in msg or "unique" in msg:
              raise HTTPException(status_code=400, detail="Email-ID is already existing")
@@ -348,143 +510,149 @@ def python_signup(req: SignupRequest):
 
         
 @app.post("/api/py/signin")
-async def python_signin(req: SigninRequest):
+def python_signin(req: SigninRequest, request: Request):
+    # Plain def on purpose: every step below is blocking I/O and must run on the worker
+    # pool, not on the event loop where it would stall all other requests.
+    # Per-email / per-IP buckets: over-limit attempts end here with a 429, before any network call
+    throttle.check_signin(request, req.email)
     supabase = get_supabase_admin()
     if not supabase:
         raise HTTPException(status_code=500, detail="Supabase not configured")
 
-    auth_client = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_SERVICE_ROLE_KEY"))
+    auth_client = new_client()
 
     try:
         # 1. Authenticate with Supabase Auth
-        try:
-            auth_res = auth_client.auth.sign_in_with_password({"email": req.email, "password": req.password})
-        except Exception as e:
-             if "Invalid login credentials" in str(e):
-                 raise HTTPException(status_code=401, detail="Invalid credentials")
-             raise HTTPException(status_code=400, detail=str(e))
+        with tracing.span("signin.auth"):
+            try:
+                # Re-issuing a password sign-in is safe, but never hedge it (two sessions per login)
+                with throttle.auth_slot():
+                    auth_res = resilience.call(
+                        "auth.sign_in_with_password",
+                        lambda: auth_client.auth.sign_in_with_password({"email": req.email, "password": req.password}),
+                        idempotent=True,
+                        hedge=False,
+                    )
+            except (resilience.UpstreamUnavailable, HTTPException):
+                raise
+            except Exception as e:
+                 if "Invalid login credentials" in str(e):
+                     raise HTTPException(status_code=401, detail="Invalid credentials")
+                 raise HTTPException(status_code=400, detail=str(e))
+
+            if not auth_res.user:
+                 raise HTTPException(status_code=401, detail="Login failed")
+
+            user_id = auth_res.user.id
+            session_token = auth_res.session.access_token
 
-        if not auth_res.user:
-             raise HTTPException(status_code=401, detail="Login failed")
+        # 2. Strict Validation against Public DB
+        with tracing.span("signin.profile_fetch"):
+            def load_profile():
+                res = run_query(supabase.table("users").select("*").eq("id", user_id), "users.select", idempotent=True)
+                return res.data[0] if res.data else None
 
-        user_id = auth_res.user.id
-        session_token = auth_res.session.access_token
+            db_user = profiles_cache.get(user_id, load_profile)
+            if not db_user:
+                raise HTTPException(status_code=404, detail="User profile not found")
 
-        # 2. Strict Validation against Public DB
-        res = supabase.table("users").select("*").eq("id", user_id).execute()
-        if not res.data:
-            raise HTTPException(status_code=404, detail="User profile not found")
-        
-        db_user = res.data[0]
-        db_role = db_user.get("role")
-        db_extra = db_user.get("extra") or {}
-        db_org_type = db_extra.get("org_type") or db_extra.get("type")
-
-        # A. Role Check (if role provided)
-        # Note: req.role might be "Management" but user is "Manager" (simplified role check needed?)
-        # For now, strict check if provided.
-        if req.role and req.role != db_role:
-             raise HTTPException(status_code=400, detail=f"Login denied. Role mismatch: Account is registered as {db_role}.")
-
-        # B. Org Type Check (Strict)
-        # Verify if user registered as School trying to login as Institute
-        desired_org_type = req.extra.get("orgType") if req.extra else None
-        
-        # Normalize comparison
-        if db_org_type and desired_org_type:
-            db_norm = db_org_type.lower()
-            req_norm = desired_org_type.lower()
-            
-            if db_norm != req_norm:
-                if db_norm == "school" and req_norm == "institute":
-                    raise HTTPException(status_code=400, detail="Wrong Input")
-                if db_norm == "institute" and req_norm == "school":
-                    raise HTTPException(status_code=400, detail="Wrong Input")
-                # Generic fallback
-                raise HTTPException(status_code=400, detail="Wrong Input")
+            db_role = db_user.get("role")
+            db_extra = db_user.get("extra") or {}
+            db_org_type = db_user.get("org_type") or db_extra.get("org_type") or db_extra.get("type")
+
+        with tracing.span("signin.org_checks"):
+            check_signin_account(req, db_role, db_org_type)
 
-        # C. Institute Code & Name Check (Strict for Teacher/Student/Parent if provided)
-        # Frontend will pass uniqueId (Code) and instituteName/orgName in extra
+            # C. Institute Code & Name Check (Strict for Teacher/Student/Parent if provided)
+            # Frontend will pass uniqueId (Code) and instituteName/orgName in extra
         
-        # 1. Check Code Existence
-        req_code = req.extra.get("uniqueId") or req.extra.get("code")
-        req_org_name = req.extra.get("instituteName") or req.extra.get("orgName") or req.extra.get("schoolName")
-
-        if req.role == "Teacher" or req.role == "Student" or req.role == "Parent":
-            # If code is provided (it should be mandatory for these roles now per requirement)
-            if req_code:
-                # Validate Code
-                org_info = validate_org_code(req_code)
-                if not org_info:
-                    raise HTTPException(status_code=400, detail="Invalid Code")
+            # 1. Check Code Existence
+            req_code = req.extra.get("uniqueId") or req.extra.get("code")
+            req_org_name = req.extra.get("instituteName") or req.extra.get("orgName") or req.extra.get("schoolName")
+
+            if req.role == "Teacher" or req.role == "Student" or req.role == "Parent":
+                # If code is provided (it should be mandatory for these roles now per requirement)
+                if req_code:
+                    # Validate Code
+                    org_info = validate_org_code(req_code)
+                    if not org_info:
+                        raise HTTPException(status_code=400, detail="Invalid Code")
                 
-                # STRICT VALIDATION: Check Login Type Mismatch (School vs Institute)
-                # Ensure user logged in with correct Type toggle matching the code
-                req_login_type = req.extra.get("orgType")
-                if req_login_type:
-                     db_org_type = org_info.get("type", "").lower()
-                     print(f"DEBUG: Login Type Check - Req: '{req_login_type}', DB: '{db_org_type}', Code: '{req_code}'")
-                     if req_login_type.lower().strip() != db_org_type:
-                         raise HTTPException(status_code=400, detail=f"Invalid Login Type: You selected {req_login_type} but code is for {db_org_type}")
+                    # STRICT VALIDATION: Check Login Type Mismatch (School vs Institute)
+                    # Ensure user logged in with correct Type toggle matching the code
+                    req_login_type = req.extra.get("orgType")
+                    if req_login_type:
+                         db_org_type = org_info.get("type", "").lower()
+                         # Fires on every coded signin: keep it lazy (no formatting unless DEBUG is on)
+                         log.debug("login type check req=%r db=%r code=%r", req_login_type, db_org_type, req_code)
+                         if req_login_type.lower().strip() != db_org_type:
+                             raise HTTPException(status_code=400, detail=f"Invalid Login Type: You selected {req_login_type} but code is for {db_org_type}")
                 
-                # Validate Name Matches Code
-                # org_info structure: {id, code, type, institute_id, ...}
-                # We need to check if 'institute_id' matches 'req_org_name' 
-                # OR we might need to fetch the Organization Name from 'organizations' table using 'org_info.institute_id'
-                # But 'organizations' table might not exist fully populated yet?
-                # Let's check if 'organizations' table exists or if we rely on 'org_codes' having metadata?
-                # The 'org_codes' table has 'institute_id'.
+                    # Validate Name Matches Code
+                    # org_info structure: {id, code, type, institute_id, ...}
+                    # We need to check if 'institute_id' matches 'req_org_name' 
+                    # OR we might need to fetch the Organization Name from 'organizations' table using 'org_info.institute_id'
+                    # But 'organizations' table might not exist fully populated yet?
+                    # Let's check if 'organizations' table exists or if we rely on 'org_codes' having metadata?
+                    # The 'org_codes' table has 'institute_id'.
                 
-                # Assumption: 'institute_id' in org_codes IS the Name or ID?
-                # Looking at create_org_code: "institute_id": req.institute_id
-                # Usually this is the ID.
-                # However, user requirement says "Institute name if logging from institute login or School Name... display School Name Mismatch"
+                    # Assumption: 'institute_id' in org_codes IS the Name or ID?
+                    # Looking at create_org_code: "institute_id": req.institute_id
+                    # Usually this is the ID.
+                    # However, user requirement says "Institute name if logging from institute login or School Name... display School Name Mismatch"
                 
-                # Let's try to match against the 'institute_id' stored in 'org_codes'.
-                # Ideally, we should fetch the REAL name from 'organizations' table.
-                # Let's try to fetch organization details if possible.
+                    # Let's try to match against the 'institute_id' stored in 'org_codes'.
+                    # Ideally, we should fetch the REAL name from 'organizations' table.
+                    # Let's try to fetch organization details if possible.
                 
-                # Fallback: if 'institute_id' in org_codes allows storing Name directly (legacy check)?
-                # Or we check if req_org_name matches.
+                    # Fallback: if 'institute_id' in org_codes allows storing Name directly (legacy check)?
+                    # Or we check if req_org_name matches.
                 
-                 # Strict Check: proper Name Mismatch
-                db_org_id = org_info.get("institute_id")
-                db_org_type = org_info.get("type", "").lower()
+                     # Strict Check: proper Name Mismatch
+                    db_org_id = org_info.get("institute_id")
+                    db_org_type = org_info.get("type", "").lower()
                 
-                match = False
-                if db_org_id:
-                     # Simple string match (case insensitive)
-                     if db_org_id.lower().strip() == req_org_name.lower().strip():
-                         match = True
-                     else:
-                         # Fetch organization name from correct table
-                         try:
-                             table_name = "institutes" if db_org_type == "institute" else "schools"
-                             org_res = supabase.table(table_name).select("name").eq("id", db_org_id).execute()
-                             if org_res.data:
-                                 real_name = org_res.data[0]['name']
-                                 if real_name.lower().strip() == req_org_name.lower().strip():
-                                     match = True
-                         except Exception as db_err:
-                             print(f"Name verification DB error: {db_err}")
-                             pass
+                    match = False
+                    if db_org_id:
+                         # Simple string match (case insensitive)
+                         if db_org_id.lower().strip() == req_org_name.lower().strip():
+                             match = True
+                         else:
+                             # Fetch organization name from correct table
+                             try:
+                                 table_name = "institutes" if db_org_type == "institute" else "schools"
+
+                                 def load_name():
+                                     org_res = run_query(supabase.table(table_name).select("name").eq("id", db_org_id), f"{table_name}.select", idempotent=True)
+                                     return org_res.data[0]['name'] if org_res.data else None
+
+                                 real_name = org_names_cache.get(f"{table_name}:{db_org_id}", load_name)
+                                 if real_name:
+                                     if real_name.lower().strip() == req_org_name.lower().strip():
+                                         match = True
+                             except resilience.UpstreamUnavailable:
+                                 raise
+                             except Exception as db_err:
+                                 log.warning("name verification lookup failed", extra={"error": str(db_err)})
+                                 pass
                 
-                # If we still haven't matched, and we enforced Name validation:
-                if not match:
-                    # Determine Error Message
-                    err_msg = "School Name Mismatch"
-                    if db_org_type == "institute":
-                        err_msg = "Institute Name Mismatch"
+                    # If we still haven't matched, and we enforced Name validation:
+                    if not match:
+                        # Determine Error Message
+                        err_msg = "School Name Mismatch"
+                        if db_org_type == "institute":
+                            err_msg = "Institute Name Mismatch"
                     
-                    raise HTTPException(status_code=400, detail=err_msg)
+                        raise HTTPException(status_code=400, detail=err_msg)
 
         # D. Status Check (Strict for Teachers)
-        if req.role == "Teacher":
-             # We need to check the 'teachers' table for the status.
-             # db_user has 'id'.
-             t_res = supabase.table("teachers").select("status").eq("user_id", user_id).execute()
-             if t_res.data:
-                 t_status = t_res.data[0].get("status") or "pending"
+        with tracing.span("signin.status_check"):
+            if req.role == "Teacher":
+                 # We need to check the 'teachers' table for the status.
+                 # db_user has 'id'.
+                 t_res = run_query(supabase.table("teachers").select("status").eq("user_id", user_id), "teachers.select", idempotent=True)
+                 # No teachers row yet means nobody has approved it either
+                 t_status = (t_res.data[0].get("status") if t_res.data else None) or "pending"
                  if t_status == "pending":
                      # Return 403 with specific detail handled by frontend
                      raise HTTPException(status_code=403, detail="Waiting for Management Approval")
@@ -493,16 +661,18 @@ async def python_signin(req: SigninRequest):
         
         # 3. Fetch Dashboard State (from user_dashboard_states)
         # 3. Fetch Dashboard State
-        dashboard_state = {}
-        dashboard_error = False
-        try:
-            settings_res = supabase.table("user_dashboard_states").select("state_data").eq("user_id", user_id).execute()
-            if settings_res.data:
-                dashboard_state = settings_res.data[0]['state_data']
-        except Exception as e:
-            print(f"Dashboard State Fetch Error: {e}")
-            dashboard_error = True
-
+        with tracing.span("signin.state_fetch"):
+            dashboard_state = {}
+            dashboard_error = False
+            try:
+                settings_res = run_query(supabase.table("user_dashboard_states").select("state_data").eq("user_id", user_id), "user_dashboard_states.select", idempotent=True)
+                if settings_res.data:
+                    dashboard_state = settings_res.data[0]['state_data']
+            except Exception as e:
+                log.warning("dashboard state fetch failed", extra={"error": str(e)})
+                dashboard_error = True
+
+        audit.record("user.signin", actor_id=user_id, subject_id=user_id, role=req.role)
         return {
             "success": True, 
             "token": session_token, 
@@ -510,10 +680,10 @@ async def python_signin(req: SigninRequest):
             "dashboard_state": dashboard_state,
             "dashboard_error": dashboard_error
         }
-    except HTTPException:
+    except (HTTPException, resilience.UpstreamUnavailable):
         raise
     except Exception as e:
-        print(f"Signin Error: {e}")
+        log.error("signin error", extra={"error": str(e)})
         # Return specific error for debugging
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
@@ -526,9 +696,11 @@ def check_email(req: Dict[str, str]):
     if not supabase:
          raise HTTPException(status_code=500, detail="Supabase not configured")
     try:
-        res = supabase.table("users").select("id").eq("email", email).execute()
+        res = run_query(supabase.table("users").select("id").eq("email", email), "users.select", idempotent=True)
         exists = len(res.data) > 0
         return {"exists": exists}
+    except resilience.UpstreamUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -544,14 +716,16 @@ def restore_dashboard_state(req: Dict[str, str]):
 
     try:
         # Simulate check first
-        res = supabase.table("user_dashboard_states").select("state_data").eq("user_id", user_id).execute()
+        res = run_query(supabase.table("user_dashboard_states").select("state_data").eq("user_id", user_id), "user_dashboard_states.select", idempotent=True)
         if res.data:
             return {"success": True, "dashboard_state": res.data[0]['state_data']}
         else:
             # Return empty but success
             return {"success": True, "dashboard_state": {}}
+    except resilience.UpstreamUnavailable:
+        raise
     except Exception as e:
-        print(f"Restore State Error: {e}")
+        log.error("restore state failed", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/py/create-org-code")
@@ -562,17 +736,22 @@ def create_org_code(req: OrgCodeRequest, authorization: str = Header(None)):
     
     supabase = get_supabase_admin()
     code = generate_code()
+    # creator: the caller's verified session, resolved before the write like approve/reject
+    actor_id = authenticated_user_id(authorization)
     
     data = {
         "code": code,
         "type": req.type,
-        "institute_id": req.institute_id
-        # "created_by": user_id 
+        "institute_id": req.institute_id,
+        "created_by": actor_id
     }
     
     try:
-        supabase.table("org_codes").insert(data).execute()
+        run_query(supabase.table("org_codes").insert(data), "org_codes.insert")
+        audit.record("org_code.create", actor_id=actor_id, institute_id=req.institute_id, code=code, type=req.type)
         return {"success": True, "code": code}
+    except resilience.UpstreamUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -589,10 +768,12 @@ def update_state(req: StateRequest):
         }
         # checking if user exists in settings is not strictly needed if we assume user exists, 
         # but upsert handling matches primary key.
-        supabase.table("user_dashboard_states").upsert(data).execute()
+        run_query(supabase.table("user_dashboard_states").upsert(data), "user_dashboard_states.upsert")
         return {"success": True}
+    except resilience.UpstreamUnavailable:
+        raise
     except Exception as e:
-        print(f"Update State Error: {e}")
+        log.error("update state failed", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -614,33 +795,66 @@ def get_pending_teachers(institute_id: Optional[str] = None):
         if institute_id:
             query = query.eq("institute_id", institute_id)
         
-        res = query.execute()
+        res = run_query(query, "teachers.select", idempotent=True)
         return res.data
+    except resilience.UpstreamUnavailable:
+        raise
     except Exception as e:
-        print(f"Error fetching pending teachers: {e}")
+        log.error("pending teachers fetch failed", extra={"error": str(e)})
         # Return error as detail to see it in curl
         raise HTTPException(status_code=500, detail=f"Failed to fetch teachers: {str(e)}")
 
+# Names and emails of a whole institute (ids are guessable): admin key, like the other operational reads
+@app.get("/api/py/management/users", dependencies=[Depends(admin.require_admin)])
+def list_institute_users(institute_id: str, role: Optional[str] = None, after: Optional[str] = None, limit: int = 100):
+    # Keyset pagination on (institute_id[, role], id): served by the 020 indexes
+    supabase = get_supabase_admin()
+    if not supabase:
+         raise HTTPException(status_code=500, detail="Supabase not configured")
+
+    limit = max(1, min(limit, 500))
+    query = supabase.table("users").select("id, name, email, role, institute_id, org_type, title, created_at") \
+        .eq("institute_id", institute_id)
+    if role:
+        query = query.eq("role", role)
+    if after:
+        query = query.gt("id", after)
+    res = run_query(query.order("id").limit(limit), "users.select", idempotent=True)
+    users = res.data or []
+    return {"users": users, "next_after": users[-1]["id"] if len(users) == limit else None}
+
 @app.post("/api/py/management/approve-teacher")
-def approve_teacher(req: Dict[str, str]):
+def approve_teacher(req: Dict[str, str], authorization: Optional[str] = Header(None)):
     user_id = req.get("user_id")
     if not user_id:
         raise HTTPException(status_code=400, detail="User ID required")
         
     supabase = get_supabase_admin()
+    # actor: the caller's verified session (resolved before the write); a body actor_id is only what the client claims
+    actor_id = authenticated_user_id(authorization)
     # Update status to approved and is_verified to true
-    supabase.table("teachers").update({"status": "approved", "is_verified": True}).eq("user_id", user_id).execute()
+    res = run_query(supabase.table("teachers").update({"status": "approved", "is_verified": True}).eq("user_id", user_id), "teachers.update")
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Teacher not found")
+    audit.record("teacher.approve", actor_id=actor_id, subject_id=user_id,
+                 institute_id=res.data[0].get("institute_id"), claimed_actor_id=req.get("actor_id"))
     return {"success": True}
 
 @app.post("/api/py/management/reject-teacher")
-def reject_teacher(req: Dict[str, str]):
+def reject_teacher(req: Dict[str, str], authorization: Optional[str] = Header(None)):
     user_id = req.get("user_id")
     if not user_id:
         raise HTTPException(status_code=400, detail="User ID required")
         
     supabase = get_supabase_admin()
+    # actor: the caller's verified session (resolved before the write); a body actor_id is only what the client claims
+    actor_id = authenticated_user_id(authorization)
     # Update status to rejected
-    supabase.table("teachers").update({"status": "rejected", "is_verified": False}).eq("user_id", user_id).execute()
+    res = run_query(supabase.table("teachers").update({"status": "rejected", "is_verified": False}).eq("user_id", user_id), "teachers.update")
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Teacher not found")
+    audit.record("teacher.reject", actor_id=actor_id, subject_id=user_id,
+                 institute_id=res.data[0].get("institute_id"), claimed_actor_id=req.get("actor_id"))
     return {"success": True}
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+"""
+In-process metrics with a Prometheus text endpoint (/metrics).
+
+Records, per route in main.py, request counts by status and a latency
+histogram, plus a latency histogram per outbound dependency call
+(PostgREST table + operation, Auth method) fed by resilience.call().
+
+Hot-path cost is one lock acquisition and a bisect per observation; the
+exposition text is only built when /metrics is scraped.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+from fastapi.responses import PlainTextResponse
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labelvalues -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._series.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total, count) in items:
+            running = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                running += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                le_label = 'le="' + le + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le_label)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {count}")
+        return lines
+
+
+_registry: List = []
+_gauge_collectors: List[Callable[[], List[str]]] = []
+
+
+def counter(name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    metric = Counter(name, help_text, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+    metric = Histogram(name, help_text, labelnames, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def register_gauges(collector: Callable[[], List[str]]) -> None:
+    """Register a callback that returns exposition lines for point-in-time gauges."""
+    _gauge_collectors.append(collector)
+
+
+def gauge_lines(name: str, help_text: str, samples: Dict[str, float], kind: str = "gauge") -> List[str]:
+    """Helper for collectors: {label-string or "": value} -> exposition lines."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples.items():
+        lines.append(f"{name}{labels} {value:g}")
+    return lines
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _gauge_collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            lines.append(f"# collector error: {_escape(e)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Service metrics ---
+
+http_requests = counter(
+    "edunexus_http_requests_total", "HTTP requests handled, by route and status.", ("route", "method", "status"))
+http_latency = histogram(
+    "edunexus_http_request_duration_seconds", "HTTP request latency by route.", ("route", "method"))
+dependency_latency = histogram(
+    "edunexus_dependency_duration_seconds",
+    "Outbound call latency (including retries) by dependency, target and operation.",
+    ("dependency", "target", "operation", "outcome"))
+dependency_retries = counter(
+    "edunexus_dependency_retries_total", "Outbound call retries by target and operation.", ("target", "operation"))
+
+
+def split_dependency(name: str) -> Tuple[str, str, str]:
+    """'users.select' -> (postgrest, users, select); 'auth.admin.create_user' -> (auth, auth, admin.create_user)."""
+    target, _, operation = name.partition(".")
+    dependency = "auth" if target == "auth" else "postgrest"
+    return dependency, target, operation or "call"
+
+
+def observe_dependency(name: str, seconds: float, outcome: str) -> None:
+    dependency, target, operation = split_dependency(name)
+    dependency_latency.observe(seconds, dependency, target, operation, outcome)
+
+
+def observe_retry(name: str) -> None:
+    _, target, operation = split_dependency(name)
+    dependency_retries.inc(target, operation)
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (no BaseHTTPMiddleware task hop) timing every HTTP request."""
+
+    def __init__(self, app, router=None):
+        self.app = app
+        self.router = router
+
+    def _route_path(self, scope) -> str:
+        route = scope.get("route")
+        if route is None and self.router is not None:
+            # answered before routing (load shedding, idempotent replay): label it with the
+            # template the router would have picked
+            partial = None
+            for candidate in self.router.routes:
+                match = candidate.matches(scope)[0]
+                if match == Match.FULL:
+                    route = candidate
+                    break
+                if match == Match.PARTIAL and partial is None:
+                    partial = candidate  # right path, other method (405)
+            route = route or partial
+        return getattr(route, "path", None) or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Use the route template (not the raw path) to keep label cardinality bounded
+            path = self._route_path(scope)
+            method = scope.get("method", "")
+            http_latency.observe(time.perf_counter() - started, path, method)
+            http_requests.inc(path, method, str(status[0]))
+
+
+def install(app) -> None:
+    app.add_middleware(MetricsMiddleware, router=app.router)
+
+    @app.get("/metrics")
+    async def prometheus_metrics():
+        return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,297 @@
+"""
+Schema migration runner for server/migrations.
+
+    python migrate.py status                   # applied / pending / changed, touches nothing
+    python migrate.py up [--dry-run]           # apply pending migrations in order
+    python migrate.py baseline [--through 021_service_query_indexes]
+                                               # record migrations as applied without running them
+
+Only NNN_name.sql files take part, in file-name order; the version is the file
+name without .sql. Applied migrations are recorded in public.schema_migrations
+with the sha256 of the file. A file edited after it was applied is reported as
+changed and never re-run: write a new migration instead.
+
+Each pending file runs in one transaction together with its ledger row, so a
+failed migration leaves nothing behind. A file whose first line is
+`-- migrate: no-transaction` (CREATE INDEX CONCURRENTLY) runs statement by
+statement in autocommit instead and must be safe to re-run; an INVALID index
+left by an interrupted concurrent build is dropped before it is rebuilt.
+
+Appliers serialize on a session advisory lock and re-read the ledger once they
+hold it, so workers starting together apply each file exactly once. When
+nothing is pending no lock is taken and the whole check is one SELECT, which is
+what the service runs at start-up with AUTO_MIGRATE=1 (needs DATABASE_URL).
+
+The migrations up to 015 were applied by hand to databases in a known state
+(009 rebuilds the schema, 010 seeds test data) and cannot be replayed, so a
+database gets a ledger by `baseline`; until then `up` refuses to run and the
+start-up hook only logs a warning.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from psycopg2 import errors
+
+import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'migrations')
+NO_TRANSACTION = '-- migrate: no-transaction'
+LOCK_KEY = "hashtext('schema_migrations')"
+
+LEDGER_DDL = """
+CREATE TABLE IF NOT EXISTS public.schema_migrations (
+    version TEXT PRIMARY KEY,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    duration_ms INT,
+    baseline BOOLEAN NOT NULL DEFAULT FALSE
+);
+ALTER TABLE public.schema_migrations ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON public.schema_migrations FROM anon, authenticated;
+"""
+
+RECORD = 'INSERT INTO public.schema_migrations (version, checksum, duration_ms) VALUES (%s, %s, %s)'
+
+_FILE = re.compile(r'^\d{3}_\w+\.sql$')
+_DOLLAR_TAG = re.compile(r'\$[A-Za-z_]\w*\$|\$\$')
+_CONCURRENT_INDEX = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', re.I)
+
+
+class NotBaselined(RuntimeError):
+    pass
+
+
+class Migration(NamedTuple):
+    version: str
+    sql: str
+    checksum: str
+    transactional: bool
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    out = []
+    for name in sorted(f for f in os.listdir(directory) if _FILE.match(f)):
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            sql = f.read().replace('\r\n', '\n')
+        out.append(Migration(name[:-4], sql, hashlib.sha256(sql.encode()).hexdigest(),
+                             not sql.lstrip().startswith(NO_TRANSACTION)))
+    return out
+
+
+def statements(sql: str) -> List[str]:
+    """Split a script on top-level semicolons (outside quotes, dollar quotes and comments)."""
+    out, start, i, n = [], 0, 0, len(sql)
+    while i < n:
+        c = sql[i]
+        if sql.startswith('--', i):
+            j = sql.find('\n', i)
+            i = n if j < 0 else j + 1
+        elif sql.startswith('/*', i):
+            j = sql.find('*/', i + 2)
+            i = n if j < 0 else j + 2
+        elif c in '\'"':
+            j = i + 1
+            while True:
+                j = sql.find(c, j)
+                if j < 0 or not sql.startswith(c * 2, j):
+                    break
+                j += 2
+            i = n if j < 0 else j + 1
+        elif c == '$' and _DOLLAR_TAG.match(sql, i):
+            tag = _DOLLAR_TAG.match(sql, i).group()
+            j = sql.find(tag, i + len(tag))
+            i = n if j < 0 else j + len(tag)
+        elif c == ';':
+            out.append(sql[start:i])
+            start = i = i + 1
+        else:
+            i += 1
+    out.append(sql[start:])
+    return [s.strip() for s in out if re.sub(r'--[^\n]*', '', s).strip()]
+
+
+def drop_invalid_index(cur, statement: str) -> None:
+    """IF NOT EXISTS would keep the INVALID index a failed concurrent build leaves behind."""
+    m = _CONCURRENT_INDEX.search(statement)
+    if not m:
+        return
+    cur.execute("SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = %s", (m.group(1),))
+    row = cur.fetchone()
+    if row is not None and not row[0]:
+        cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS public.{m.group(1)}')
+
+
+def ledger(conn) -> Optional[Dict[str, str]]:
+    """version -> checksum of applied migrations, or None if there is no ledger yet."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT version, checksum FROM public.schema_migrations')
+            return dict(cur.fetchall())
+    except errors.UndefinedTable:
+        return None
+    finally:
+        if not conn.autocommit:
+            conn.rollback()
+
+
+def plan(migrations: List[Migration], applied: Dict[str, str]) -> Tuple[List[Migration], List[Migration]]:
+    """(pending, changed since applied)."""
+    pending = [m for m in migrations if m.version not in applied]
+    changed = [m for m in migrations if m.version in applied and applied[m.version] != m.checksum]
+    return pending, changed
+
+
+def _apply(conn, m: Migration) -> int:
+    started = time.monotonic()
+    if m.transactional:
+        with conn.cursor() as cur:
+            cur.execute(m.sql)
+            cur.execute(RECORD, (m.version, m.checksum, int((time.monotonic() - started) * 1000)))
+        conn.commit()
+    else:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                for statement in statements(m.sql):
+                    drop_invalid_index(cur, statement)
+                    cur.execute(statement)
+                cur.execute(RECORD, (m.version, m.checksum, int((time.monotonic() - started) * 1000)))
+        finally:
+            conn.autocommit = False
+    return int((time.monotonic() - started) * 1000)
+
+
+def _locked(conn, fn):
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT pg_advisory_lock({LOCK_KEY})')
+    conn.commit()
+    try:
+        return fn()
+    finally:
+        if not conn.closed:
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute(f'SELECT pg_advisory_unlock({LOCK_KEY})')
+            conn.commit()
+
+
+def upgrade(dry_run: bool = False, report: Callable[[str], None] = print) -> List[str]:
+    """Apply pending migrations; returns the versions applied (or that would be, with dry_run)."""
+    migrations = discover()
+    with db.connection() as conn:
+        applied = ledger(conn)
+        if applied is None:
+            raise NotBaselined('no schema_migrations ledger: run `python migrate.py baseline` first')
+        pending, changed = plan(migrations, applied)
+        for m in changed:
+            report(f'{m.version} changed since it was applied (not re-run)')
+        if not pending or dry_run:
+            return [m.version for m in pending]
+
+        def run() -> List[str]:
+            # another worker may have applied some while we waited for the lock
+            done = []
+            for m in plan(migrations, ledger(conn) or {})[0]:
+                report(f'applying {m.version}' + ('' if m.transactional else ' (no transaction)'))
+                ms = _apply(conn, m)
+                report(f'applied {m.version} in {ms}ms')
+                done.append(m.version)
+            return done
+
+        return _locked(conn, run)
+
+
+def baseline(through: Optional[str] = None, report: Callable[[str], None] = print) -> int:
+    migrations = discover()
+    if through is not None and through not in {m.version for m in migrations}:
+        raise SystemExit(f'unknown migration {through}')
+    wanted = [m for m in migrations if through is None or m.version <= through]
+    with db.connection() as conn:
+        def run() -> int:
+            with conn.cursor() as cur:
+                cur.execute(LEDGER_DDL)
+                db.execute_values('INSERT INTO public.schema_migrations (version, checksum, baseline) VALUES %s '
+                                  'ON CONFLICT (version) DO NOTHING',
+                                  [(m.version, m.checksum, True) for m in wanted], cur=cur)
+                cur.execute('SELECT count(*) FROM public.schema_migrations')
+                total = cur.fetchone()[0]
+            conn.commit()
+            return total
+
+        total = _locked(conn, run)
+    report(f'baseline through {wanted[-1].version if wanted else "-"}: {total} migrations recorded')
+    return total
+
+
+def run_at_startup() -> None:
+    """AUTO_MIGRATE hook for the service: never raises, reports through the service log."""
+    import logs
+    log = logs.get_logger('migrate')
+    started = time.monotonic()
+    try:
+        done = upgrade(report=log.info)
+    except NotBaselined as e:
+        log.warning('schema migrations skipped', extra={'error': str(e)})
+        return
+    except Exception as e:
+        log.error('schema migration failed', extra={'error': str(e)})
+        return
+    log.info('schema up to date', extra={'applied': done, 'duration_ms': int((time.monotonic() - started) * 1000)})
+
+
+def cmd_status(args) -> int:
+    migrations = discover()
+    with db.connection() as conn:
+        applied = ledger(conn)
+    if applied is None:
+        print('no schema_migrations ledger (run `python migrate.py baseline`)')
+        applied = {}
+    pending, changed = plan(migrations, applied)
+    pending, changed = {m.version for m in pending}, {m.version for m in changed}
+    for m in migrations:
+        state = 'pending' if m.version in pending else 'changed' if m.version in changed else 'applied'
+        print(f'{m.version:<45} {state}')
+    return 1 if changed else 0
+
+
+def cmd_up(args) -> int:
+    try:
+        versions = upgrade(dry_run=args.dry_run)
+    except NotBaselined as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.dry_run:
+        print('\n'.join(f'pending {v}' for v in versions) or 'nothing pending')
+    elif not versions:
+        print('nothing pending')
+    return 0
+
+
+def cmd_baseline(args) -> int:
+    baseline(args.through)
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Apply server/migrations with a checksummed ledger')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help='show applied, pending and changed migrations').set_defaults(fn=cmd_status)
+    up = sub.add_parser('up', help='apply pending migrations')
+    up.add_argument('--dry-run', action='store_true', help='only list pending migrations')
+    up.set_defaults(fn=cmd_up)
+    base = sub.add_parser('baseline', help='record migrations as applied without running them')
+    base.add_argument('--through', metavar='VERSION', help='last migration to record (default: all)')
+    base.set_defaults(fn=cmd_baseline)
+    args = parser.parse_args()
+    sys.exit(args.fn(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+Durable outbox for post-signup side work (migration 016_signup_outbox.sql).
+
+python_signup writes the profile row, its role row (teachers, students, ...;
+migration 022) and its follow-up tasks (today the user.signup audit event,
+see audit.outbox_tasks) in one transaction (`create_profile`), then returns.
+A background thread claims
+pending tasks in batches (`claim_signup_outbox`, FOR UPDATE SKIP LOCKED with
+a lease, so several service instances can run workers), runs them grouped by
+task type, marks successes done in one update and reschedules failures with
+jittered exponential backoff. After OUTBOX_MAX_ATTEMPTS a task is parked as
+'dead' for inspection.
+
+Task types are registered with @handler("name"); a handler receives the whole
+batch of claimed rows of its type and returns the ids that failed with their
+errors. Handlers must be safe to re-run: a worker that dies mid-batch leaves
+its rows to be claimed again once the lease expires.
+
+OUTBOX_WORKER        "0" disables the worker in this process (tasks still get enqueued)
+OUTBOX_BATCH         rows claimed per round trip (default 50)
+OUTBOX_POLL_MS       idle poll interval (default 2000); enqueues wake the worker early
+OUTBOX_MAX_ATTEMPTS  attempts before a task is parked as dead (default 8)
+OUTBOX_LEASE_S       how long a claimed batch is hidden from other workers (default 60)
+"""
+
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import logs
+import metrics
+import resilience
+
+log = logs.get_logger("outbox")
+
+ENABLED = os.environ.get("OUTBOX_WORKER", "1").lower() not in ("0", "false", "no")
+BATCH = int(os.environ.get("OUTBOX_BATCH", "50"))
+IDLE_POLL_S = float(os.environ.get("OUTBOX_POLL_MS", "2000")) / 1000.0
+MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+LEASE_S = int(os.environ.get("OUTBOX_LEASE_S", "60"))
+BACKLOG_REFRESH_S = 15.0
+RETRY_BASE_S = 2.0
+RETRY_MAX_S = 600.0
+
+tasks_total = metrics.counter("edunexus_outbox_tasks_total", "Outbox tasks processed, by task and outcome.",
+                              ("task", "outcome"))
+batch_seconds = metrics.histogram("edunexus_outbox_batch_duration_seconds", "Time to process one claimed batch.")
+
+Handler = Callable[[object, List[Dict]], Dict[int, str]]
+_handlers: Dict[str, Handler] = {}
+
+
+def handler(task: str):
+    def register(fn: Handler) -> Handler:
+        _handlers[task] = fn
+        return fn
+    return register
+
+
+def task(name: str, **payload) -> Dict:
+    return {"task": name, "payload": payload}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# --- Enqueue ---
+
+def create_profile(client, profile: Dict, role_row: Optional[Dict], tasks: List[Dict]) -> None:
+    """Insert the users row, its role row ({"table", "row"}) and its outbox tasks atomically."""
+    try:
+        resilience.call("users.create_profile_with_tasks",
+                        client.rpc("create_profile_with_tasks",
+                                   {"p_profile": profile, "p_tasks": tasks, "p_role_row": role_row}).execute,
+                        idempotent=False)
+    except Exception as e:
+        if getattr(e, "code", None) != "PGRST202":
+            raise
+        # Migration 016/022 not applied yet: previous behaviour, profile then inline role row and side work
+        log.warning("create_profile_with_tasks(p_role_row) missing, running signup tasks inline")
+        resilience.call("users.insert", client.table("users").insert(profile).execute)
+        run_inline(client, ([task("insert_row", **role_row)] if role_row else []) + tasks)
+        return
+    if tasks:
+        worker.wake()
+
+
+def run_inline(client, tasks: List[Dict]) -> None:
+    rows = [{"id": n, "task": t["task"], "payload": t["payload"]} for n, t in enumerate(tasks)]
+    for name in {r["task"] for r in rows}:
+        items = [r for r in rows if r["task"] == name]
+        try:
+            failed = _handlers[name](client, items)
+        except Exception as e:
+            failed = {i["id"]: str(e) for i in items}
+        for error in failed.values():
+            log.warning("inline signup task failed", extra={"task": name, "error": error})
+
+
+# --- Built-in handlers ---
+
+@handler("insert_row")
+def insert_rows(client, rows: List[Dict]) -> Dict[int, str]:
+    """payload: {"table": ..., "row": {...}}; skipped when the table already has a row for row["user_id"].
+
+    Signup no longer queues role rows (they are written with the profile); this drains
+    tasks queued before migration 022 and backs the inline fallback.
+    """
+    failed: Dict[int, str] = {}
+    by_table: Dict[str, List[Dict]] = {}
+    for r in rows:
+        by_table.setdefault(r["payload"]["table"], []).append(r)
+    for table, items in by_table.items():
+        try:
+            # a re-claimed task may already have been applied before its worker died
+            user_ids = [i["payload"]["row"]["user_id"] for i in items if i["payload"]["row"].get("user_id")]
+            existing = set()
+            if user_ids:
+                res = resilience.call(f"{table}.select",
+                                      client.table(table).select("user_id").in_("user_id", user_ids).execute,
+                                      idempotent=True)
+                existing = {r["user_id"] for r in res.data or []}
+            todo = [i for i in items if i["payload"]["row"].get("user_id") not in existing]
+            if todo:
+                resilience.call(f"{table}.insert", client.table(table).insert([i["payload"]["row"] for i in todo]).execute)
+        except Exception as e:
+            if len(items) == 1:
+                failed[items[0]["id"]] = str(e)
+                continue
+            # isolate the bad row(s): retry the group one by one
+            for i in items:
+                failed.update(insert_rows(client, [i]))
+    return failed
+
+
+# --- Worker ---
+
+class Worker:
+    def __init__(self):
+        self.client_getter: Optional[Callable[[], object]] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.backlog: Optional[int] = None
+        self.oldest_age_s: Optional[float] = None
+        self._backlog_at = 0.0
+
+    def start(self, client_getter: Callable[[], object]) -> None:
+        self.client_getter = client_getter
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+            self._thread.start()
+            log.info("outbox worker started", extra={"batch": BATCH, "poll_ms": IDLE_POLL_S * 1000})
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            client = self.client_getter() if self.client_getter else None
+            processed = 0
+            if client is not None:
+                try:
+                    processed = self.process_batch(client)
+                    self._refresh_backlog(client)
+                except Exception as e:
+                    log.warning("outbox batch failed", extra={"error": str(e)})
+            if processed < BATCH:
+                # caught up (or failing): sleep until the next poll or an enqueue
+                self._wake.wait(IDLE_POLL_S)
+                self._wake.clear()
+
+    def process_batch(self, client) -> int:
+        res = resilience.call("signup_outbox.claim",
+                              client.rpc("claim_signup_outbox", {"p_limit": BATCH, "p_lease_seconds": LEASE_S}).execute)
+        rows = res.data or []
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        by_task: Dict[str, List[Dict]] = {}
+        for r in rows:
+            by_task.setdefault(r["task"], []).append(r)
+
+        done: List[int] = []
+        for name, items in by_task.items():
+            fn = _handlers.get(name)
+            if fn is None:
+                failed = {i["id"]: f"no handler for task {name!r}" for i in items}
+            else:
+                try:
+                    failed = fn(client, items)
+                except Exception as e:
+                    failed = {i["id"]: str(e) for i in items}
+            for i in items:
+                if i["id"] in failed:
+                    self._reschedule(client, i, failed[i["id"]])
+                else:
+                    done.append(i["id"])
+                    tasks_total.inc(name, "done")
+
+        if done:
+            resilience.call("signup_outbox.update", client.table("signup_outbox").update(
+                {"status": "done", "processed_at": _now().isoformat(), "last_error": None}).in_("id", done).execute,
+                idempotent=True)
+        batch_seconds.observe(time.perf_counter() - started)
+        return len(rows)
+
+    def _reschedule(self, client, row: Dict, error: str) -> None:
+        attempts = int(row.get("attempts") or 1)  # already incremented by the claim
+        dead = attempts >= MAX_ATTEMPTS
+        delay = random.uniform(0, min(RETRY_MAX_S, RETRY_BASE_S * (2 ** attempts)))
+        update = {"last_error": error[:1000]}
+        if dead:
+            update["status"] = "dead"
+        else:
+            update["available_at"] = (_now() + timedelta(seconds=delay)).isoformat()
+        tasks_total.inc(row["task"], "dead" if dead else "retry")
+        log.warning("outbox task failed", extra={"task": row["task"], "id": row["id"], "attempts": attempts,
+                                                  "dead": dead, "error": error})
+        resilience.call("signup_outbox.update",
+                        client.table("signup_outbox").update(update).eq("id", row["id"]).execute, idempotent=True)
+
+    def _refresh_backlog(self, client) -> None:
+        if time.monotonic() - self._backlog_at < BACKLOG_REFRESH_S:
+            return
+        self._backlog_at = time.monotonic()
+        res = resilience.call("signup_outbox.select", client.table("signup_outbox").select("created_at", count="exact")
+                              .eq("status", "pending").order("created_at").limit(1).execute, idempotent=True)
+        self.backlog = res.count or 0
+        if res.data:
+            oldest = datetime.fromisoformat(res.data[0]["created_at"].replace("Z", "+00:00"))
+            self.oldest_age_s = max(0.0, (_now() - oldest).total_seconds())
+        else:
+            self.oldest_age_s = 0.0
+
+
+worker = Worker()
+
+
+def _gauges() -> List[str]:
+    if worker.backlog is None:
+        return []
+    return (metrics.gauge_lines("edunexus_outbox_backlog", "Pending outbox tasks (refreshed every 15s).",
+                                {"": worker.backlog}) +
+            metrics.gauge_lines("edunexus_outbox_oldest_pending_seconds", "Age of the oldest pending outbox task.",
+                                {"": worker.oldest_age_s or 0.0}))
+
+
+def install(app, client_getter: Callable[[], object]) -> None:
+    metrics.register_gauges(_gauges)
+
+    @app.on_event("startup")
+    def start_outbox_worker():
+        if ENABLED:
+            worker.start(client_getter)
+
+    @app.on_event("shutdown")
+    def stop_outbox_worker():
+        worker.stop()
@@ -0,0 +1,265 @@
+"""
+On-demand profiling for live workers (admin only, see admin.py).
+
+  GET  /api/py/admin/profile/cpu?seconds=10&interval_ms=5
+       Statistical profile: samples every thread's stack for N seconds.
+  X-Profile-Request: <expires>.<signature>   (request header)
+       Deterministic profile of that one request; the response carries
+       X-Profile-Id and the result is at GET /api/py/admin/profile/requests/{id}.
+       Sign with `python profiling.py sign /api/py/signin` (uses ADMIN_API_KEY).
+  POST /api/py/admin/profile/alloc/start, GET .../alloc/snapshot?top=20, POST .../alloc/stop
+       tracemalloc: each snapshot returns the top-N growth since the previous one.
+
+CPU results are in "folded stacks" format (`frame;frame;frame count`), which
+flamegraph.pl, inferno and speedscope all import directly.
+"""
+
+import asyncio
+import functools
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+
+import admin
+import logs
+
+log = logs.get_logger("profiling")
+
+MAX_SAMPLE_SECONDS = 60
+KEEP_REQUEST_PROFILES = 20
+PROFILE_HEADER = b"x-profile-request"
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def folded(stacks: Counter) -> str:
+    return "".join(f"{stack} {int(count)}\n" for stack, count in stacks.most_common())
+
+
+# --- Statistical sampler ---
+
+_sampling = threading.Lock()
+
+
+def sample_stacks(seconds: float, interval: float) -> Counter:
+    """Sample all threads except this one; returns folded stack -> sample count."""
+    me = threading.get_ident()
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            frames.append(names.get(ident, f"thread-{ident}"))
+            stacks[";".join(reversed(frames))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+# --- Deterministic per-request profiler ---
+
+class CallProfiler:
+    """sys.setprofile hook that attributes self time (microseconds) to full call paths."""
+
+    def __init__(self):
+        self.path = []
+        self.stack = []  # [start, time spent in children]
+        self.totals: Counter = Counter()
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter()
+        if event == "call" or event == "c_call":
+            self.path.append(_frame_label(frame.f_code) if event == "call" else f"<c>:{getattr(arg, '__qualname__', arg)}")
+            self.stack.append([now, 0.0])
+        elif self.stack:  # return / c_return / c_exception of a frame we saw enter
+            start, children = self.stack.pop()
+            elapsed = now - start
+            self.totals[";".join(self.path)] += (elapsed - children) * 1e6
+            self.path.pop()
+            if self.stack:
+                self.stack[-1][1] += elapsed
+
+
+_request_profile: ContextVar[Optional[str]] = ContextVar("request_profile", default=None)
+_results: "OrderedDict[str, str]" = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def sign(path: str, ttl: int = 300, key: Optional[str] = None) -> str:
+    expires = int(time.time()) + ttl
+    secret = (key or admin.admin_key() or "").encode()
+    mac = hmac.new(secret, f"{expires}:{path}".encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{mac}"
+
+
+def verify(value: str, path: str) -> bool:
+    secret = admin.admin_key()
+    if not secret:
+        return False
+    expires, _, mac = value.partition(".")
+    try:
+        if int(expires) < time.time():
+            return False
+    except ValueError:
+        return False
+    expected = hmac.new(secret.encode(), f"{expires}:{path}".encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(mac, expected)
+
+
+def profiled(fn):
+    """Endpoint wrapper (applied by worker_pool.PooledRoute): profile the call if the request asked for it."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile_id = _request_profile.get()
+        if profile_id is None:
+            return fn(*args, **kwargs)
+        profiler = CallProfiler()
+        sys.setprofile(profiler)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sys.setprofile(None)
+            with _results_lock:
+                _results[profile_id] = folded(profiler.totals)
+                while len(_results) > KEEP_REQUEST_PROFILES:
+                    _results.popitem(last=False)
+
+    return wrapper
+
+
+class RequestProfileMiddleware:
+    """Plain ASGI: accept a signed X-Profile-Request header and tag the response with X-Profile-Id."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        header = dict(scope.get("headers") or []).get(PROFILE_HEADER)
+        if not header or not verify(header.decode("latin-1"), scope.get("path", "")):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = secrets.token_hex(6)
+        token = _request_profile.set(profile_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers") or []) + [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_profile.reset(token)
+
+
+# --- Allocation snapshots ---
+
+_alloc_lock = threading.Lock()
+_alloc_baseline: Optional[tracemalloc.Snapshot] = None
+
+
+def alloc_diff(top: int) -> Dict:
+    global _alloc_baseline
+    with _alloc_lock:
+        if not tracemalloc.is_tracing():
+            raise HTTPException(status_code=409, detail="tracemalloc not started")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        if _alloc_baseline is None:
+            stats = [{"location": str(s.traceback), "size_kb": round(s.size / 1024, 1), "count": s.count}
+                     for s in snapshot.statistics("traceback")[:top]]
+        else:
+            stats = [{"location": str(s.traceback), "size_diff_kb": round(s.size_diff / 1024, 1),
+                      "size_kb": round(s.size / 1024, 1), "count_diff": s.count_diff}
+                     for s in snapshot.compare_to(_alloc_baseline, "traceback")[:top]]
+        first = _alloc_baseline is None
+        _alloc_baseline = snapshot
+    return {"baseline": first, "traced_kb": round(current / 1024, 1), "peak_kb": round(peak / 1024, 1), "top": stats}
+
+
+def install(app) -> None:
+    app.add_middleware(RequestProfileMiddleware)
+    guard = [Depends(admin.require_admin)]
+
+    @app.get("/api/py/admin/profile/cpu", dependencies=guard)
+    async def cpu_profile(seconds: float = 10, interval_ms: float = 5):
+        seconds = max(0.1, min(seconds, MAX_SAMPLE_SECONDS))
+        if not _sampling.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="a CPU profile is already running")
+        try:
+            log.info("cpu profile started", extra={"seconds": seconds, "interval_ms": interval_ms})
+            # asyncio's default executor, not the AnyIO limiter: a saturated endpoint pool
+            # must not keep the profiler from starting
+            stacks = await asyncio.get_running_loop().run_in_executor(
+                None, sample_stacks, seconds, max(0.001, interval_ms / 1000))
+        finally:
+            _sampling.release()
+        return PlainTextResponse(folded(stacks))
+
+    @app.get("/api/py/admin/profile/requests/{profile_id}", dependencies=guard)
+    async def request_profile(profile_id: str):
+        with _results_lock:
+            result = _results.get(profile_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail="profile not found (expired or still running)")
+        return PlainTextResponse(result)
+
+    @app.post("/api/py/admin/profile/alloc/start", dependencies=guard)
+    async def alloc_start(frames: int = 10):
+        global _alloc_baseline
+        with _alloc_lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, min(frames, 50)))
+            _alloc_baseline = None
+        return {"tracing": True}
+
+    @app.get("/api/py/admin/profile/alloc/snapshot", dependencies=guard)
+    async def alloc_snapshot(top: int = 20):
+        return await asyncio.get_running_loop().run_in_executor(None, alloc_diff, max(1, min(top, 200)))
+
+    @app.post("/api/py/admin/profile/alloc/stop", dependencies=guard)
+    async def alloc_stop():
+        global _alloc_baseline
+        with _alloc_lock:
+            tracemalloc.stop()
+            _alloc_baseline = None
+        return {"tracing": False}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Profiling helpers")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_sign = sub.add_parser("sign", help="print an X-Profile-Request header value for a path")
+    p_sign.add_argument("path")
+    p_sign.add_argument("--ttl", type=int, default=300)
+    args = parser.parse_args()
+    if not admin.admin_key():
+        raise SystemExit("ADMIN_API_KEY not set")
+    print(sign(args.path, args.ttl))
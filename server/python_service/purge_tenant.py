@@ -0,0 +1,329 @@
+"""
+Remove every account of an institute (or of a users filter): public rows in
+batched transactions, then the Auth users with bounded concurrency.
+
+    python purge_tenant.py --institute "Inst A" --dry-run
+    python purge_tenant.py --institute "Inst A" --yes [--batch 500] [--concurrency 8]
+    python purge_tenant.py --where "u.email LIKE '%@seed.invalid'" --yes
+
+An institute's accounts are the users with that institute_id plus everyone in
+its teachers/students/parents rows; --where is an SQL condition on users u and,
+with --institute, narrows that set further.
+
+1. select   the ids are written once, sorted, to <state>/ids
+2. public   per batch of ids, one transaction deletes the pending outbox tasks,
+            the per-user tables (dashboard states, settings, sessions), the role
+            rows and finally the users rows; --institute also deletes its org codes
+3. auth     auth.admin.delete_user per id on --concurrency threads, each retried
+            with backoff up to --retries times; an id that is already gone counts as done
+
+Progress lives in the state directory (default purge-state/<institute or
+filter hash>): the ids file, the number of ids whose public rows are gone, and
+a journal of deleted Auth ids. Re-running the same command resumes where it
+stopped; every step is safe to repeat. Progress and throughput are printed every
+--progress-s seconds, and one tenant.purge row goes to audit_events at the end.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Set
+
+from psycopg2 import errors
+from supabase import create_client
+
+import db
+import resilience
+
+# deleted before users, in this order; tables that do not exist are skipped
+USER_TABLES = ['user_dashboard_states', 'user_settings', 'login_sessions',
+               'teachers', 'students', 'parents', 'management_managers']
+
+INSTITUTE_IDS = """
+    SELECT id FROM public.users WHERE institute_id = %(institute)s
+    UNION SELECT user_id FROM public.teachers WHERE institute_id = %(institute)s
+    UNION SELECT user_id FROM public.students WHERE institute_id = %(institute)s
+    UNION SELECT user_id FROM public.parents WHERE institute_id = %(institute)s
+"""
+
+
+def selection_sql(institute: Optional[str], where: Optional[str]) -> str:
+    """Always executed with a params dict, so a literal % in --where is doubled."""
+    where = where.replace('%', '%%') if where else where
+    if institute and where:
+        return f'SELECT u.id::text FROM ({INSTITUTE_IDS}) s JOIN public.users u ON u.id = s.id WHERE ({where}) ORDER BY 1'
+    if institute:
+        return f'SELECT id::text FROM ({INSTITUTE_IDS}) s WHERE id IS NOT NULL ORDER BY 1'
+    return f'SELECT u.id::text FROM public.users u WHERE ({where}) ORDER BY 1'
+
+
+class State:
+    """Files in the state directory; each one is replaced atomically or appended to."""
+
+    def __init__(self, directory: str):
+        self.dir = directory
+        os.makedirs(directory, exist_ok=True)
+        self.ids_path = os.path.join(directory, 'ids')
+
+    def _replace(self, name: str, text: str) -> None:
+        tmp = os.path.join(self.dir, name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, os.path.join(self.dir, name))
+
+    def _read(self, name: str, default: str) -> str:
+        try:
+            with open(os.path.join(self.dir, name), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return default
+
+    @property
+    def selected(self) -> bool:
+        return os.path.exists(self.ids_path)
+
+    def write_ids(self, ids: Iterator[str]) -> int:
+        tmp = self.ids_path + '.tmp'
+        n = 0
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for user_id in ids:
+                f.write(user_id + '\n')
+                n += 1
+        os.replace(tmp, self.ids_path)
+        return n
+
+    def ids(self, skip: int = 0) -> Iterator[str]:
+        with open(self.ids_path, encoding='utf-8') as f:
+            for n, line in enumerate(f):
+                if n >= skip:
+                    yield line.rstrip('\n')
+
+    def count(self) -> int:
+        with open(self.ids_path, encoding='utf-8') as f:
+            return sum(1 for _ in f)
+
+    @property
+    def public_done(self) -> int:
+        return int(self._read('public.done', '0'))
+
+    @public_done.setter
+    def public_done(self, n: int) -> None:
+        self._replace('public.done', str(n))
+
+    def auth_done(self) -> Set[str]:
+        return set(self._read('auth.done', '').split())
+
+    def auth_journal(self):
+        return open(os.path.join(self.dir, 'auth.done'), 'a', encoding='utf-8')
+
+
+class Progress:
+    def __init__(self, label: str, total: int, done: int, every_s: float):
+        self.label, self.total, self.done, self.every_s = label, total, done, every_s
+        self.started = self.last = time.monotonic()
+        self.start_done = done
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def add(self, n: int = 1, failed: int = 0) -> None:
+        with self.lock:
+            self.done += n
+            self.failed += failed
+            now = time.monotonic()
+            if now - self.last >= self.every_s:
+                self.last = now
+                self.print()
+
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return (self.done - self.start_done) / elapsed if elapsed > 0 else 0.0
+
+    def print(self) -> None:
+        failed = f', {self.failed} failed' if self.failed else ''
+        print(f'{self.label:<7} {self.done}/{self.total}{failed}  {self.rate():.0f}/s', file=sys.stderr)
+
+
+def existing_user_tables() -> List[str]:
+    with db.transaction() as cur:
+        cur.execute("SELECT table_name FROM information_schema.columns "
+                    "WHERE table_schema = 'public' AND column_name = 'user_id' AND table_name = ANY(%s)", (USER_TABLES,))
+        present = {r[0] for r in cur.fetchall()}
+    return [t for t in USER_TABLES if t in present]
+
+
+def has_outbox() -> bool:
+    with db.transaction() as cur:
+        cur.execute("SELECT to_regclass('public.signup_outbox') IS NOT NULL")
+        return cur.fetchone()[0]
+
+
+def delete_public_batch(ids: List[str], tables: List[str], outbox: bool) -> int:
+    """One transaction for the batch; returns the users rows deleted."""
+    with db.transaction() as cur:
+        cur.execute("SET LOCAL lock_timeout = '5s'")
+        if outbox:
+            # a pending insert_row task would re-create a role row for a deleted user
+            cur.execute("DELETE FROM public.signup_outbox WHERE status = 'pending' "
+                        "AND payload->'row'->>'user_id' = ANY(%s)", (ids,))
+        for table in tables:
+            cur.execute(f'DELETE FROM public.{table} WHERE user_id = ANY(%s::uuid[])', (ids,))
+        cur.execute('DELETE FROM public.users WHERE id = ANY(%s::uuid[])', (ids,))
+        return cur.rowcount
+
+
+def purge_public(state: State, total: int, batch: int, progress_s: float) -> int:
+    tables, outbox = existing_user_tables(), has_outbox()
+    done = state.public_done
+    progress = Progress('public', total, done, progress_s)
+    removed = 0
+    ids = state.ids(skip=done)
+    while True:
+        chunk = [i for _, i in zip(range(batch), ids)]
+        if not chunk:
+            break
+        while True:
+            try:
+                removed += delete_public_batch(chunk, tables, outbox)
+                break
+            except (errors.LockNotAvailable, errors.DeadlockDetected) as e:
+                print(f'  batch at {done} blocked ({e.pgcode}), retrying', file=sys.stderr)
+                time.sleep(1)
+        done += len(chunk)
+        state.public_done = done
+        progress.add(len(chunk))
+    progress.print()
+    return removed
+
+
+def _not_found(e: Exception) -> bool:
+    return getattr(e, 'status', None) == 404 or 'not found' in str(e).lower()
+
+
+def delete_auth_user(client, user_id: str, retries: int) -> bool:
+    """True once the Auth user is gone; False after `retries` failed attempts."""
+    for attempt in range(retries + 1):
+        try:
+            resilience.call('auth.admin.delete_user', lambda: client.auth.admin.delete_user(user_id))
+            return True
+        except Exception as e:
+            if _not_found(e):
+                return True
+            if attempt == retries:
+                print(f'  auth delete {user_id} failed: {e}', file=sys.stderr)
+                return False
+            time.sleep(random.uniform(0, min(30.0, 0.5 * 2 ** attempt)))
+    return False
+
+
+def purge_auth(client, state: State, total: int, concurrency: int, retries: int, progress_s: float) -> int:
+    done = state.auth_done()
+    progress = Progress('auth', total, len(done), progress_s)
+    slots = threading.BoundedSemaphore(concurrency * 4)
+    journal_lock = threading.Lock()
+    failed = 0
+
+    with state.auth_journal() as journal, ThreadPoolExecutor(concurrency, thread_name_prefix='purge') as pool:
+        def run(user_id: str) -> None:
+            nonlocal failed
+            try:
+                ok = delete_auth_user(client, user_id, retries)
+            finally:
+                slots.release()
+            if ok:
+                with journal_lock:
+                    journal.write(user_id + '\n')
+                    journal.flush()
+            else:
+                with journal_lock:
+                    failed += 1
+            progress.add(1 if ok else 0, failed=0 if ok else 1)
+
+        for user_id in state.ids():
+            if user_id in done:
+                continue
+            slots.acquire()
+            pool.submit(run, user_id)
+    progress.print()
+    return failed
+
+
+def finish(institute: Optional[str], where: Optional[str], summary: dict) -> None:
+    with db.transaction() as cur:
+        if institute:
+            cur.execute('DELETE FROM public.org_codes WHERE institute_id = %s', (institute,))
+            summary['org_codes'] = cur.rowcount
+        cur.execute("SELECT to_regclass('public.audit_events') IS NOT NULL")
+        if cur.fetchone()[0]:
+            cur.execute("INSERT INTO public.audit_events (id, occurred_at, action, institute_id, details) "
+                        "VALUES (gen_random_uuid(), NOW(), 'tenant.purge', %s, %s)",
+                        (institute, json.dumps({'where': where, **summary})))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Delete all accounts of an institute or users filter')
+    parser.add_argument('--institute', help='institute_id to purge')
+    parser.add_argument('--where', help='SQL condition on users u (narrows --institute when both are given)')
+    parser.add_argument('--batch', type=int, default=500, help='ids per public delete transaction')
+    parser.add_argument('--concurrency', type=int, default=8, help='Auth deletes in flight')
+    parser.add_argument('--retries', type=int, default=5, help='retries per Auth delete')
+    parser.add_argument('--state', metavar='DIR', help='progress directory (default purge-state/<selection>)')
+    parser.add_argument('--progress-s', type=float, default=5, help='seconds between progress lines')
+    parser.add_argument('--keep-auth', action='store_true', help='only delete the public rows')
+    parser.add_argument('--dry-run', action='store_true', help='count the selected accounts and exit')
+    parser.add_argument('--yes', action='store_true', help='required to delete anything')
+    args = parser.parse_args()
+    if not args.institute and not args.where:
+        parser.error('--institute or --where is required')
+
+    sql = selection_sql(args.institute, args.where)
+    if args.dry_run:
+        with db.transaction() as cur:
+            cur.execute(f'SELECT count(*) FROM ({sql}) s', {'institute': args.institute})
+            print(f'{cur.fetchone()[0]} accounts selected')
+        return
+    if not args.yes:
+        raise SystemExit('refusing to delete without --yes (try --dry-run first)')
+
+    client = None
+    if not args.keep_auth:
+        url = os.environ.get('SUPABASE_URL') or os.environ.get('VITE_SUPABASE_URL')
+        key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+        if not url or not key:
+            raise SystemExit('SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set (or pass --keep-auth)')
+        client = create_client(url, key)
+
+    slug = re.sub(r'\W+', '_', args.institute or '').strip('_') or 'where'
+    digest = hashlib.sha256(f'{args.institute}\0{args.where}'.encode()).hexdigest()[:8]
+    state = State(args.state or os.path.join('purge-state', f'{slug}-{digest}'))
+    started = time.monotonic()
+
+    if state.selected:
+        total = state.count()
+        print(f'resuming {state.dir}: {total} accounts, {state.public_done} public done', file=sys.stderr)
+    else:
+        with db.connection() as conn:
+            with conn.cursor(name='purge_tenant_ids') as cur:  # server-side: ids are streamed to the file
+                cur.itersize = 10000
+                cur.execute(sql, {'institute': args.institute})
+                total = state.write_ids(r[0] for r in cur)
+        print(f'selected {total} accounts into {state.dir}', file=sys.stderr)
+
+    summary = {'accounts': total, 'users_deleted': purge_public(state, total, args.batch, args.progress_s)}
+    if client is not None:
+        summary['auth_failed'] = purge_auth(client, state, total, args.concurrency, args.retries, args.progress_s)
+    finish(args.institute, args.where, summary)
+    summary['seconds'] = round(time.monotonic() - started, 1)
+    print(json.dumps(summary))
+    if summary.get('auth_failed'):
+        sys.exit(1)  # re-run to retry the failed Auth deletes
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Reconcile Supabase Auth accounts against public.users profiles.
+
+    python reconcile_auth.py [--per-page 1000] [--partitions 64] [--report FILE]
+                             [--repair auth|profiles|both] [--min-age-h 24] [--concurrency 4]
+
+Orphans come in two kinds:
+  auth_only      an Auth account with no profile: the zombie left behind when
+                 signup created the Auth user but never wrote the profile (the
+                 next signup with that email gets "Email-ID is already existing")
+  profile_only   a users row whose Auth account is gone (nobody can sign in to it)
+
+Both sides are streamed: Auth through auth.admin.list_users page by page,
+profiles in id order in short keyset batches from DATABASE_URL (or through
+PostgREST when it is not set). Each id is hash-partitioned into a spill file in
+a temporary directory, then the set difference is taken one partition at a
+time, so memory holds about (accounts / --partitions) ids whatever the total.
+
+Every orphan is written as a JSON line to --report (default stdout) and the
+totals go to stderr. Nothing is changed without --repair, which
+  auth_only      -> auth.admin.delete_user
+  profile_only   -> DELETE FROM users (role tables cascade)
+with at most --concurrency repairs in flight. Accounts younger than
+--min-age-h may be signups still in progress and are reported as recent but
+never repaired. Each candidate is checked again right before it is repaired,
+because list_users pages by offset and can skip or repeat accounts created or
+deleted during the scan.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from supabase import create_client
+
+import db
+import resilience
+
+AUTH_ONLY, PROFILE_ONLY = 'auth_only', 'profile_only'
+REPAIRS = {'auth': {AUTH_ONLY}, 'profiles': {PROFILE_ONLY}, 'both': {AUTH_ONLY, PROFILE_ONLY}}
+EPOCH = '1970-01-01T00:00:00+00:00'
+
+Account = Tuple[str, str, str]  # id, email, created_at (ISO 8601)
+
+
+def _iso(value) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value) if value else EPOCH
+
+
+def auth_accounts(client, per_page: int) -> Iterator[Account]:
+    page = 1
+    while True:
+        users = resilience.call('auth.admin.list_users',
+                                lambda: client.auth.admin.list_users(page=page, per_page=per_page), idempotent=True)
+        for u in users:
+            yield u.id, u.email or '', _iso(u.created_at)
+        if len(users) < per_page:
+            return
+        page += 1
+
+
+def _profile_batch_db(after: str, limit: int) -> List[Account]:
+    with db.transaction() as cur:
+        cur.execute('SELECT id::text, email, created_at FROM public.users WHERE id > %s ORDER BY id LIMIT %s',
+                    (after, limit))
+        return [(r[0], r[1] or '', _iso(r[2])) for r in cur.fetchall()]
+
+
+def _profile_batch_rest(client, after: str, limit: int) -> List[Account]:
+    q = client.table('users').select('id, email, created_at').gt('id', after).order('id').limit(limit)
+    res = resilience.call('users.select', q.execute, idempotent=True)
+    return [(r['id'], r.get('email') or '', _iso(r.get('created_at'))) for r in res.data or []]
+
+
+def profile_accounts(client, batch: int) -> Iterator[Account]:
+    fetch: Callable[[str, int], List[Account]] = _profile_batch_db if db.DSN else \
+        (lambda after, limit: _profile_batch_rest(client, after, limit))
+    after = '00000000-0000-0000-0000-000000000000'
+    while True:
+        rows = fetch(after, batch)
+        yield from rows
+        if len(rows) < batch:
+            return
+        after = rows[-1][0]
+
+
+class Spill:
+    """Hash-partitioned, tab-separated spill files for one side."""
+
+    def __init__(self, directory: str, side: str, partitions: int):
+        self.paths = [os.path.join(directory, f'{side}.{n:04d}') for n in range(partitions)]
+        self.count = 0
+
+    def write(self, accounts: Iterator[Account]) -> None:
+        files = [open(p, 'w', encoding='utf-8') for p in self.paths]
+        try:
+            for account in accounts:
+                files[zlib.crc32(account[0].encode()) % len(files)].write('\t'.join(account) + '\n')
+                self.count += 1
+        finally:
+            for f in files:
+                f.close()
+
+    def load(self, n: int) -> Dict[str, Tuple[str, str]]:
+        out = {}
+        with open(self.paths[n], encoding='utf-8') as f:
+            for line in f:
+                user_id, email, created_at = line.rstrip('\n').split('\t')
+                out[user_id] = (email, created_at)
+        return out
+
+
+def orphans(auth: Spill, profiles: Spill) -> Iterator[Tuple[str, Account]]:
+    for n in range(len(auth.paths)):
+        a, p = auth.load(n), profiles.load(n)
+        for user_id in a.keys() - p.keys():
+            yield AUTH_ONLY, (user_id, *a[user_id])
+        for user_id in p.keys() - a.keys():
+            yield PROFILE_ONLY, (user_id, *p[user_id])
+
+
+def _not_found(e: Exception) -> bool:
+    return getattr(e, 'status', None) == 404 or 'not found' in str(e).lower()
+
+
+def repair_one(client, kind: str, user_id: str) -> str:
+    """'repaired', 'skipped' (no longer an orphan) or 'gone' (already removed)."""
+    if kind == AUTH_ONLY:
+        q = client.table('users').select('id').eq('id', user_id).limit(1)
+        if resilience.call('users.select', q.execute, idempotent=True).data:
+            return 'skipped'
+        try:
+            resilience.call('auth.admin.delete_user', lambda: client.auth.admin.delete_user(user_id))
+        except Exception as e:
+            if _not_found(e):
+                return 'gone'
+            raise
+        return 'repaired'
+    try:
+        resilience.call('auth.admin.get_user_by_id', lambda: client.auth.admin.get_user_by_id(user_id),
+                        idempotent=True)
+        return 'skipped'
+    except Exception as e:
+        if not _not_found(e):
+            raise
+    res = resilience.call('users.delete', client.table('users').delete().eq('id', user_id).execute)
+    return 'repaired' if res.data else 'gone'
+
+
+class Repairer:
+    """Runs repairs on a bounded pool; submit() blocks once `concurrency * 4` are queued."""
+
+    def __init__(self, client, concurrency: int):
+        self.client = client
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='reconcile')
+        self.slots = threading.BoundedSemaphore(concurrency * 4)
+        self.lock = threading.Lock()
+        self.outcomes: Dict[str, int] = {}
+
+    def submit(self, kind: str, user_id: str) -> None:
+        self.slots.acquire()
+        self.pool.submit(self._run, kind, user_id)
+
+    def _run(self, kind: str, user_id: str) -> None:
+        try:
+            outcome = repair_one(self.client, kind, user_id)
+        except Exception as e:
+            outcome = 'failed'
+            print(f'repair {kind} {user_id} failed: {e}', file=sys.stderr)
+        finally:
+            self.slots.release()
+        with self.lock:
+            key = f'{kind}.{outcome}'
+            self.outcomes[key] = self.outcomes.get(key, 0) + 1
+
+    def close(self) -> Dict[str, int]:
+        self.pool.shutdown(wait=True)
+        return self.outcomes
+
+
+def reconcile(client, args, out) -> Dict[str, object]:
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=args.min_age_h)
+    repair_kinds = REPAIRS.get(args.repair, set())
+    summary: Dict[str, object] = {}
+    directory = tempfile.mkdtemp(prefix='reconcile_auth_')
+    try:
+        started = time.monotonic()
+        auth = Spill(directory, 'auth', args.partitions)
+        auth.write(auth_accounts(client, args.per_page))
+        print(f'auth: {auth.count} accounts in {time.monotonic() - started:.1f}s', file=sys.stderr)
+        started = time.monotonic()
+        profiles = Spill(directory, 'profiles', args.partitions)
+        profiles.write(profile_accounts(client, args.per_page))
+        print(f'profiles: {profiles.count} rows in {time.monotonic() - started:.1f}s', file=sys.stderr)
+
+        repairer = Repairer(client, args.concurrency) if repair_kinds else None
+        counts = {AUTH_ONLY: 0, PROFILE_ONLY: 0, 'recent': 0}
+        try:
+            for kind, (user_id, email, created_at) in orphans(auth, profiles):
+                recent = datetime.fromisoformat(created_at.replace('Z', '+00:00')) > cutoff
+                counts['recent' if recent else kind] += 1
+                out.write(json.dumps({'kind': kind, 'id': user_id, 'email': email, 'created_at': created_at,
+                                      'recent': recent}) + '\n')
+                if repairer and not recent and kind in repair_kinds:
+                    repairer.submit(kind, user_id)
+        finally:
+            if repairer:
+                summary['repairs'] = repairer.close()
+        summary.update({'auth_accounts': auth.count, 'profiles': profiles.count, **counts})
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Find and repair Auth accounts and profiles without a counterpart')
+    parser.add_argument('--per-page', type=int, default=1000, help='Auth list page and profile batch size')
+    parser.add_argument('--partitions', type=int, default=64, help='spill partitions (memory ~ accounts / partitions)')
+    parser.add_argument('--report', metavar='FILE', help='write orphans as JSON lines here instead of stdout')
+    parser.add_argument('--repair', choices=['auth', 'profiles', 'both'], help='delete orphans of this kind')
+    parser.add_argument('--min-age-h', type=float, default=24, help='never repair accounts younger than this')
+    parser.add_argument('--concurrency', type=int, default=4, help='repairs in flight at once')
+    args = parser.parse_args()
+
+    url = os.environ.get('SUPABASE_URL') or os.environ.get('VITE_SUPABASE_URL')
+    key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+    if not url or not key:
+        raise SystemExit('SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set')
+    client = create_client(url, key)
+
+    out = open(args.report, 'w', encoding='utf-8') if args.report else sys.stdout
+    try:
+        summary = reconcile(client, args, out)
+    finally:
+        if args.report:
+            out.close()
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Replay a captured request stream (capture.py) against any instance of the service.
+
+    python replay.py capture.jsonl capture.jsonl.1 --target http://localhost:8000 --speed 5 --provision
+
+Requests are re-issued on the original timeline compressed by --speed
+(1x, 5x, 10x ...). Requests of the same captured user are chained: a user's
+next request is sent only after their previous one finished, so
+signin -> state sequences keep their order even when the target is slower
+than the original.
+
+The target does not know the captured (pseudonymous) accounts, so:
+  --provision   creates the captured org codes and signs up every user whose
+                first captured request is not a signup, before replaying
+  user ids      ids returned by replayed signup/signin responses replace the
+                captured pseudonymous ids in later request bodies
+  passwords     redacted passwords are replaced with one replay password
+
+The report has the same shape as loadtest.py, plus how far behind schedule
+requests were sent (if that grows, the replayer - not the target - is the limit).
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from loadtest import Stats, git_revision, summarize
+
+REPLAY_PASSWORD = "Replay-Password-1!"
+CODE_FIELDS = ("uniqueId", "code")
+ID_FIELDS = ("user_id", "id")
+
+
+def load(paths: List[str]) -> List[Dict]:
+    entries = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue  # torn line at a rotation boundary
+    entries.sort(key=lambda e: e["t"])
+    return entries
+
+
+class Replayer:
+    def __init__(self, client: httpx.AsyncClient, entries: List[Dict], speed: float):
+        self.client = client
+        self.entries = entries
+        self.speed = speed
+        self.codes: Dict[str, str] = {}     # captured code pseudonym -> code created on the target
+        self.ids: Dict[str, str] = {}       # captured user id pseudonym -> id on the target
+        self.stats: Dict[str, Stats] = {}
+        self.lag = Stats()
+        self.chained_late = 0  # sent late because the same user's previous request was still running
+
+    # --- provisioning ---
+
+    async def provision(self) -> None:
+        orgs: Dict[str, Dict] = {}
+        first_request: Dict[str, Dict] = {}
+        for entry in self.entries:
+            body = entry.get("body") if isinstance(entry.get("body"), dict) else {}
+            extra = body.get("extra") if isinstance(body.get("extra"), dict) else {}
+            code = next((extra[f] for f in CODE_FIELDS if extra.get(f)), None)
+            if code:
+                org = orgs.setdefault(code, {"type": None, "institute_id": None})
+                # signups carry the type, signins the institute name; take the first of each
+                org["type"] = org["type"] or (extra.get("orgType") or extra.get("type") or "").lower() or None
+                org["institute_id"] = org["institute_id"] or extra.get("instituteName") or extra.get("orgName")
+            if entry.get("user") and entry["user"] not in first_request:
+                first_request[entry["user"]] = entry
+
+        for code, org in orgs.items():
+            res = await self.client.post("/api/py/create-org-code", json={"type": org["type"] or "institute",
+                                                                          "institute_id": org["institute_id"] or code})
+            if res.status_code == 200:
+                self.codes[code] = res.json()["code"]
+
+        sem = asyncio.Semaphore(20)
+
+        async def signup(entry: Dict) -> None:
+            body = entry["body"]
+            payload = {"name": body.get("name") or "Replay User", "email": body["email"], "password": REPLAY_PASSWORD,
+                       "role": body.get("role") or "Student", "extra": self.rewrite(body.get("extra") or {})}
+            async with sem:
+                res = await self.client.post("/api/py/signup", json=payload)
+            if res.status_code == 200 and entry.get("binds"):
+                self.ids[entry["binds"]] = res.json()["user"]["id"]
+
+        await asyncio.gather(*(signup(e) for e in first_request.values()
+                               if e.get("route") != "/api/py/signup" and isinstance(e.get("body"), dict)
+                               and e["body"].get("email")))
+        print(f"provisioned {len(self.codes)} org codes, {len(self.ids)} users", file=sys.stderr)
+
+    # --- replay ---
+
+    def rewrite(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self.rewrite(v) for v in value]
+        if not isinstance(value, dict):
+            return value
+        out = {}
+        for k, v in value.items():
+            if v == "<redacted>" and k.lower() == "password":
+                out[k] = REPLAY_PASSWORD
+            elif k in CODE_FIELDS and isinstance(v, str):
+                out[k] = self.codes.get(v, v)
+            elif k in ID_FIELDS and isinstance(v, str):
+                out[k] = self.ids.get(v, v)
+            else:
+                out[k] = self.rewrite(v)
+        return out
+
+    async def send(self, entry: Dict, scheduled: float, previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        sent = time.perf_counter()
+        if delay > 0 or previous is None:
+            # only count lag the replayer caused, not waiting for the user's previous request
+            self.lag.record(max(0.0, sent - scheduled), "ok", True)
+        else:
+            self.chained_late += 1
+        name = entry.get("route") or entry.get("path")
+        body = self.rewrite(copy.deepcopy(entry.get("body")))
+        params = self.rewrite(entry.get("query")) if entry.get("query") else None
+        try:
+            res = await self.client.request(entry.get("method", "GET"), entry["path"], params=params,
+                                            json=body if body is not None and entry.get("method") != "GET" else None)
+            status = str(res.status_code)
+            # a request that failed in the capture is expected to fail the same way
+            ok = res.status_code < 400 or res.status_code == entry.get("status")
+        except httpx.HTTPError as e:
+            res, status, ok = None, type(e).__name__, False
+        self.stats.setdefault(name, Stats()).record(time.perf_counter() - sent, status, ok)
+        if res is not None and res.status_code == 200 and entry.get("binds"):
+            try:
+                self.ids[entry["binds"]] = res.json()["user"]["id"]
+            except (ValueError, KeyError, TypeError):
+                pass
+
+    async def run(self) -> float:
+        if not self.entries:
+            return 0.0
+        t0 = self.entries[0]["t"]
+        started = time.perf_counter()
+        last: Dict[str, asyncio.Task] = {}
+        tasks = []
+        for entry in self.entries:
+            scheduled = started + (entry["t"] - t0) / self.speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0.005:
+                await asyncio.sleep(delay)
+            user = entry.get("user")
+            task = asyncio.create_task(self.send(entry, scheduled, last.get(user) if user else None))
+            if user:
+                last[user] = task
+            tasks.append(task)
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+
+async def main_async(args) -> Dict:
+    entries = load(args.files)
+    if args.limit:
+        entries = entries[:args.limit]
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+        replayer = Replayer(client, entries, args.speed)
+        if args.provision:
+            await replayer.provision()
+        elapsed = await replayer.run()
+
+    total = Stats()
+    for s in replayer.stats.values():
+        total.latencies.extend(s.latencies)
+        total.errors += s.errors
+        for status, count in s.statuses.items():
+            total.statuses[status] = total.statuses.get(status, 0) + count
+    captured_span = (entries[-1]["t"] - entries[0]["t"]) if entries else 0.0
+    lag = summarize(replayer.lag, elapsed)["latency_ms"]
+    return {
+        "meta": {"label": args.label, "revision": git_revision(), "target": args.target, "speed": args.speed,
+                 "entries": len(entries), "captured_span_s": round(captured_span, 2), "duration_s": round(elapsed, 2),
+                 "users": len({e["user"] for e in entries if e.get("user")}), "provisioned": args.provision},
+        "schedule_lag_ms": {k: lag[k] for k in ("p50", "p99", "max")},
+        "held_for_user_order": replayer.chained_late,
+        "total": summarize(total, elapsed),
+        "endpoints": {name: summarize(s, elapsed) for name, s in sorted(replayer.stats.items())},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured traffic against the Python service")
+    parser.add_argument("files", nargs="+", help="capture files (rotated files may be passed in any order)")
+    parser.add_argument("--target", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="rate multiple, e.g. 1, 5, 10")
+    parser.add_argument("--provision", action="store_true", help="create captured org codes and users first")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--label")
+    parser.add_argument("--out", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        t = report["total"]
+        print(f"{t['requests']} requests at {args.speed}x, {t['throughput_rps']} req/s, p95 {t['latency_ms']['p95']}ms, "
+              f"errors {t['error_rate']:.2%} -> {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
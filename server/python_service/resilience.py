@@ -0,0 +1,293 @@
+"""
+Resilience layer for outbound Supabase calls (PostgREST + Auth).
+
+Every outbound call made by main.py goes through `call()`, which adds:
+  - a per-call deadline, capped by whatever is left of the request budget
+  - bounded retries with full-jitter backoff (idempotent reads only)
+  - an optional hedged second attempt for slow reads
+  - a shared circuit breaker that fails fast while Supabase is degraded
+
+Failures we gave up on surface as `UpstreamUnavailable` (main.py maps it to a
+503 with Retry-After) instead of a thread stuck on a slow socket.
+
+All knobs are env vars so the behaviour can be exercised against a local
+stand-in that injects latency (point SUPABASE_URL at it).
+"""
+
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Optional
+
+try:
+    import httpx
+    _TRANSIENT_TYPES = (httpx.TransportError, TimeoutError, ConnectionError)
+except ImportError:  # httpx ships with supabase, but don't make it a hard import
+    _TRANSIENT_TYPES = (TimeoutError, ConnectionError)
+
+import metrics
+import tracing
+
+
+def _env_seconds(name: str, default_ms: float) -> float:
+    try:
+        return float(os.environ.get(name, default_ms)) / 1000.0
+    except ValueError:
+        return default_ms / 1000.0
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+REQUEST_BUDGET_S = _env_seconds("SUPABASE_REQUEST_BUDGET_MS", 10000)
+CALL_TIMEOUT_S = _env_seconds("SUPABASE_CALL_TIMEOUT_MS", 4000)
+READ_RETRIES = _env_int("SUPABASE_READ_RETRIES", 2)
+RETRY_BASE_S = _env_seconds("SUPABASE_RETRY_BASE_MS", 100)
+RETRY_MAX_S = _env_seconds("SUPABASE_RETRY_MAX_MS", 1000)
+# 0 disables hedging; otherwise a second read is fired if the first is still
+# outstanding after this long (set it near the observed p95 of reads).
+HEDGE_AFTER_S = _env_seconds("SUPABASE_HEDGE_AFTER_MS", 0)
+BREAKER_FAILURES = _env_int("SUPABASE_BREAKER_FAILURES", 5)
+BREAKER_RESET_S = _env_seconds("SUPABASE_BREAKER_RESET_MS", 30000)
+CALL_WORKERS = _env_int("SUPABASE_CALL_WORKERS", 32)
+
+
+class UpstreamUnavailable(Exception):
+    """Outbound call could not be completed; safe to retry later (HTTP 503)."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    pass
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+# --- Request budget ---
+
+_deadline: ContextVar[Optional[float]] = ContextVar("supabase_deadline", default=None)
+
+
+@contextmanager
+def request_budget(seconds: Optional[float] = None):
+    """Bound all outbound calls made inside the block by one overall deadline."""
+    budget = REQUEST_BUDGET_S if seconds is None else seconds
+    token = _deadline.set(time.monotonic() + budget)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def _call_timeout(name: str) -> float:
+    left = remaining()
+    if left is None:
+        return CALL_TIMEOUT_S
+    if left <= 0:
+        raise DeadlineExceeded(f"{name}: request budget exhausted")
+    return min(CALL_TIMEOUT_S, left)
+
+
+# --- Circuit breaker ---
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open probe -> closed."""
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET_S):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state_locked()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                # let exactly one request through to probe recovery
+                self._probing = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._opened_at is None:
+                return 1.0
+            return max(1.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+supabase_breaker = CircuitBreaker("supabase")
+
+_BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+metrics.register_gauges(lambda: metrics.gauge_lines(
+    "edunexus_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open).",
+    {f'{{breaker="{supabase_breaker.name}"}}': _BREAKER_STATES[supabase_breaker.state]}))
+
+
+# --- Call execution ---
+
+_executor = ThreadPoolExecutor(max_workers=CALL_WORKERS, thread_name_prefix="supabase-call")
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Network failures and 5xx answers are worth retrying; 4xx/app errors are not."""
+    if isinstance(exc, (UpstreamUnavailable,) + _TRANSIENT_TYPES):
+        return True
+    if type(exc).__name__ == "AuthRetryableError":
+        return True
+    # AuthApiError carries .status; postgrest APIError carries a PG code in .code,
+    # so only treat 3-digit 5xx values as HTTP server errors.
+    for attr in ("status", "code"):
+        value = getattr(exc, attr, None)
+        try:
+            if 500 <= int(value) <= 599:
+                return True
+        except (TypeError, ValueError):
+            continue
+    return False
+
+
+def _backoff(attempt: int) -> float:
+    # "full jitter": uniform between 0 and the capped exponential step
+    return random.uniform(0, min(RETRY_MAX_S, RETRY_BASE_S * (2 ** attempt)))
+
+
+def _attempt(name: str, fn: Callable[[], Any], timeout: float, hedge: bool) -> Any:
+    started = time.monotonic()
+    deadline = started + timeout
+    # each submission needs its own context copy (a Context can't be entered twice)
+    futures = {_executor.submit(copy_context().run, fn)}
+
+    if hedge and 0 < HEDGE_AFTER_S < timeout:
+        done, _ = wait(futures, timeout=HEDGE_AFTER_S)
+        if not done:
+            futures.add(_executor.submit(copy_context().run, fn))
+
+    last_exc: Optional[BaseException] = None
+    while futures:
+        done, futures = wait(futures, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for fut in done:
+            exc = fut.exception()
+            if exc is None:
+                return fut.result()
+            last_exc = exc
+        # a hedged twin may still succeed; keep waiting for it
+
+    if last_exc is not None and not futures:
+        raise last_exc
+    raise DeadlineExceeded(f"{name}: no response within {timeout * 1000:.0f}ms")
+
+
+def call(name: str, fn: Callable[[], Any], *, idempotent: bool = False, hedge: Optional[bool] = None,
+         breaker: Optional[CircuitBreaker] = None) -> Any:
+    """Run one outbound call under deadline, retry, hedge and breaker policy.
+
+    `name` identifies the dependency, e.g. "users.select" or "auth.sign_in_with_password".
+    Only `idempotent` calls are retried or hedged.
+    """
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        with tracing.span(name, kind="client", **{"peer.service": metrics.split_dependency(name)[0]}):
+            return _call(name, fn, idempotent, hedge, breaker)
+    except CircuitOpen:
+        outcome = "circuit_open"
+        raise
+    except DeadlineExceeded:
+        outcome = "timeout"
+        raise
+    except UpstreamUnavailable:
+        outcome = "unavailable"
+        raise
+    except Exception:
+        # upstream answered with an application error (4xx, constraint violation, ...)
+        outcome = "error"
+        raise
+    finally:
+        metrics.observe_dependency(name, time.perf_counter() - started, outcome)
+
+
+def _call(name: str, fn: Callable[[], Any], idempotent: bool, hedge: Optional[bool],
+          breaker: Optional[CircuitBreaker]) -> Any:
+    breaker = breaker or supabase_breaker
+    hedge = idempotent if hedge is None else (hedge and idempotent)
+    attempts = 1 + (READ_RETRIES if idempotent else 0)
+
+    for attempt in range(attempts):
+        # before allow(): an exhausted budget must not strand a claimed half-open probe
+        timeout = _call_timeout(name)
+        if not breaker.allow():
+            raise CircuitOpen(f"{name}: Supabase circuit open", retry_after=breaker.retry_after())
+        try:
+            result = _attempt(name, fn, timeout, hedge)
+        except Exception as e:
+            if not is_transient(e):
+                # upstream answered (e.g. 4xx / constraint violation) - it's healthy
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt + 1 >= attempts:
+                if isinstance(e, UpstreamUnavailable):
+                    raise
+                raise UpstreamUnavailable(f"{name}: {e}") from e
+            delay = _backoff(attempt)
+            left = remaining()
+            if left is not None and delay >= left:
+                raise DeadlineExceeded(f"{name}: request budget exhausted while retrying") from e
+            metrics.observe_retry(name)
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
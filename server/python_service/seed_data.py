@@ -0,0 +1,359 @@
+"""
+Synthetic large-institute dataset, bulk-loaded with COPY.
+
+    python seed_data.py --institutes 500 --students 200000 --teachers 20000 --seed 42
+    python seed_data.py --reset                       # remove everything seeded earlier
+    python seed_data.py --students 5000 --csv /tmp/seed   # write the CSVs instead of loading
+
+The dataset is a pure function of the parameters and --seed: ids, names,
+codes, timestamps and state documents come from seeded generators, and the
+per-table sha256 printed at the end is the same on every run, so benchmark
+runs can state exactly which data they used.
+
+Shape:
+  - institute sizes are heavy-tailed (Pareto), so a few institutes are very large
+  - one org code per institute, mixed school/institute types
+  - teachers 85% approved / 10% pending / 5% rejected, with titles and departments
+  - students spread over classes, 80% of them linked to a parent; parents have
+    1-3 children in the same institute (child_ids / parent_id both set)
+  - 2 management users per institute
+  - dashboard states for --state-share of users, log-normal size
+    (median ~2 KB, capped at 256 KB like the /state endpoint)
+
+Rows are streamed straight into COPY ... FROM STDIN (no intermediate files),
+one table per transaction, followed by ANALYZE. Only columns that exist in the
+target table are loaded, so older schemas without e.g. teachers.status still
+work. Seeded users live only in the public tables (no Supabase Auth accounts):
+use them for query/plan benchmarks, not signin load tests. Emails end in
+@seed.invalid and institutes are named "Seed ...", which is what --reset
+deletes.
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import time
+import uuid
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import db
+
+EMAIL_DOMAIN = 'seed.invalid'
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+SPAN_S = 365 * 24 * 3600
+MAX_STATE_BYTES = 256 * 1024
+
+FIRST = ['Aarav', 'Vivaan', 'Aditya', 'Diya', 'Ananya', 'Ishaan', 'Kabir', 'Meera', 'Riya', 'Sara', 'Arjun',
+         'Kavya', 'Rohan', 'Nisha', 'Vikram', 'Priya', 'Rahul', 'Sneha', 'Karan', 'Pooja', 'Aman', 'Tara']
+LAST = ['Sharma', 'Verma', 'Iyer', 'Nair', 'Reddy', 'Patel', 'Gupta', 'Singh', 'Das', 'Menon', 'Rao', 'Joshi',
+        'Khan', 'Bose', 'Pillai', 'Mehta', 'Kapoor', 'Chopra']
+TITLES = ['Teacher', 'Senior Teacher', 'Lecturer', 'Assistant Professor', 'Professor', 'HOD']
+DEPARTMENTS = ['Mathematics', 'Physics', 'Chemistry', 'Biology', 'English', 'History', 'Computer Science',
+               'Economics', 'Geography', 'Arts']
+MANAGER_TITLES = ['Principal', 'Director', 'Chairman', 'Vice Principal', 'Administrator', 'Manager']
+TEACHER_STATUS = [('approved', 85), ('pending', 10), ('rejected', 5)]
+
+
+def _split(total: int, weights: List[float]) -> List[int]:
+    """Integer shares of `total` proportional to `weights` (largest remainder)."""
+    s = sum(weights)
+    raw = [total * w / s for w in weights]
+    counts = [int(r) for r in raw]
+    for i in sorted(range(len(raw)), key=lambda i: raw[i] - counts[i], reverse=True)[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+class Dataset:
+    def __init__(self, seed: int, institutes: int, students: int, teachers: int, managers: int,
+                 parent_share: float, state_share: float):
+        self.seed = seed
+        self.managers_per_institute = managers
+        self.state_share = state_share
+        rng = random.Random(seed)
+        weights = [rng.paretovariate(1.16) for _ in range(institutes)]
+        self.institutes = []
+        for i in range(institutes):
+            kind = 'school' if rng.random() < 0.6 else 'institute'
+            name = f"Seed {'School' if kind == 'school' else 'Institute'} {i + 1:04d}"
+            code = ''.join(rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ23456789') for _ in range(8))
+            self.institutes.append({'name': name, 'type': kind, 'code': code,
+                                    'classes': max(1, round(rng.uniform(8, 40)))})
+        self.student_counts = _split(students, weights)
+        self.teacher_counts = _split(teachers, weights)
+        self.student_offsets = self._offsets(self.student_counts)
+        self.teacher_offsets = self._offsets(self.teacher_counts)
+
+        # parents: consecutive students of one institute share a parent
+        self.parent_of = array('l', [-1]) * students
+        self.parent_children: List[Tuple[int, int, int]] = []  # (institute, first student, children)
+        for inst, (first, count) in enumerate(zip(self.student_offsets, self.student_counts)):
+            n = first
+            while n < first + count:
+                children = min(rng.choice((1, 1, 2, 2, 3)), first + count - n)
+                if rng.random() < parent_share:
+                    for c in range(n, n + children):
+                        self.parent_of[c] = len(self.parent_children)
+                    self.parent_children.append((inst, n, children))
+                n += children
+
+    @staticmethod
+    def _offsets(counts: List[int]) -> List[int]:
+        out, acc = [], 0
+        for c in counts:
+            out.append(acc)
+            acc += c
+        return out
+
+    # deterministic per-entity values
+
+    def _rng(self, *key) -> random.Random:
+        return random.Random(f'{self.seed}:' + ':'.join(map(str, key)))
+
+    def user_id(self, role: str, n: int) -> str:
+        digest = hashlib.sha256(f'{self.seed}:{role}:{n}'.encode()).digest()
+        return str(uuid.UUID(bytes=digest[:16], version=4))
+
+    def teacher_title(self, n: int) -> str:
+        return self._rng('title', n).choice(TITLES)
+
+    @staticmethod
+    def _created(rng: random.Random) -> str:
+        return (EPOCH + timedelta(seconds=rng.randrange(SPAN_S))).isoformat()
+
+    def _people(self):
+        """(role, n, institute index) for every seeded user."""
+        for inst in range(len(self.institutes)):
+            for m in range(self.managers_per_institute):
+                yield 'Management', inst * self.managers_per_institute + m, inst
+        for inst, (first, count) in enumerate(zip(self.teacher_offsets, self.teacher_counts)):
+            for n in range(first, first + count):
+                yield 'Teacher', n, inst
+        for inst, (first, count) in enumerate(zip(self.student_offsets, self.student_counts)):
+            for n in range(first, first + count):
+                yield 'Student', n, inst
+        for n, (inst, _, _) in enumerate(self.parent_children):
+            yield 'Parent', n, inst
+
+    # rows per table
+
+    def users(self) -> Iterator[Dict[str, Any]]:
+        for role, n, inst in self._people():
+            rng = self._rng('user', role, n)
+            org = self.institutes[inst]
+            extra: Dict[str, Any] = {'uniqueId': org['code'], 'instituteName': org['name'],
+                                     'institute_id': org['name'], 'org_type': org['type']}
+            if role == 'Management':
+                extra['title'] = MANAGER_TITLES[n % len(MANAGER_TITLES)]
+            elif role == 'Teacher':
+                extra['title'] = self.teacher_title(n)
+            yield {'id': self.user_id(role, n), 'name': f'{rng.choice(FIRST)} {rng.choice(LAST)}',
+                   'email': f'{role.lower()}{n}@{EMAIL_DOMAIN}', 'role': role, 'extra': json.dumps(extra),
+                   'created_at': self._created(rng)}
+
+    def org_codes(self) -> Iterator[Dict[str, Any]]:
+        for org in self.institutes:
+            yield {'code': org['code'], 'type': org['type'], 'institute_id': org['name'], 'is_active': True}
+
+    def management_managers(self) -> Iterator[Dict[str, Any]]:
+        for role, n, inst in self._people():
+            if role != 'Management':
+                return
+            rng = self._rng('user', role, n)
+            yield {'user_id': self.user_id(role, n), 'name': f'{rng.choice(FIRST)} {rng.choice(LAST)}',
+                   'email': f'management{n}@{EMAIL_DOMAIN}', 'role': 'Manager'}
+
+    def teachers(self) -> Iterator[Dict[str, Any]]:
+        for inst, (first, count) in enumerate(zip(self.teacher_offsets, self.teacher_counts)):
+            org = self.institutes[inst]
+            for n in range(first, first + count):
+                rng = self._rng('teacher', n)
+                status = rng.choices([s for s, _ in TEACHER_STATUS], [w for _, w in TEACHER_STATUS])[0]
+                yield {'user_id': self.user_id('Teacher', n), 'title': self.teacher_title(n),
+                       'department': rng.choice(DEPARTMENTS), 'institute_id': org['name'],
+                       'class_id': f"class-{rng.randrange(org['classes']) + 1}", 'is_verified': status == 'approved',
+                       'status': status, 'created_at': self._created(rng)}
+
+    def students(self) -> Iterator[Dict[str, Any]]:
+        for inst, (first, count) in enumerate(zip(self.student_offsets, self.student_counts)):
+            org = self.institutes[inst]
+            for n in range(first, first + count):
+                rng = self._rng('student', n)
+                parent = self.parent_of[n]
+                yield {'user_id': self.user_id('Student', n), 'roll_number': f'{n - first + 1:05d}',
+                       'class_id': f"class-{rng.randrange(org['classes']) + 1}", 'institute_id': org['name'],
+                       'parent_id': self.user_id('Parent', parent) if parent >= 0 else None,
+                       'is_verified': True, 'status': 'approved', 'created_at': self._created(rng)}
+
+    def parents(self) -> Iterator[Dict[str, Any]]:
+        for n, (inst, first, children) in enumerate(self.parent_children):
+            kids = [self.user_id('Student', c) for c in range(first, first + children)]
+            yield {'user_id': self.user_id('Parent', n), 'institute_id': self.institutes[inst]['name'],
+                   'child_ids': '{' + ','.join(kids) + '}', 'created_at': self._created(self._rng('parent', n))}
+
+    def user_dashboard_states(self) -> Iterator[Dict[str, Any]]:
+        for role, n, _ in self._people():
+            rng = self._rng('state', role, n)
+            if rng.random() >= self.state_share:
+                continue
+            size = min(MAX_STATE_BYTES, int(rng.lognormvariate(math.log(2048), 1.0)))
+            yield {'user_id': self.user_id(role, n), 'state_data': json.dumps(_state(rng, size)),
+                   'last_updated_at': self._created(rng)}
+
+
+_TEXT = ' '.join(random.Random(0).choice(FIRST + LAST + DEPARTMENTS).lower() for _ in range(20000))
+
+
+def _state(rng: random.Random, size: int) -> Dict[str, Any]:
+    """A dashboard-like document of roughly `size` bytes."""
+    widgets, used = [], 60
+    while used < size:
+        length = min(200, max(8, size - used))
+        start = rng.randrange(len(_TEXT) - length)
+        widgets.append({'id': len(widgets), 'type': rng.choice(['notes', 'todo', 'calendar', 'grades']),
+                        'pinned': rng.random() < 0.2, 'text': _TEXT[start:start + length]})
+        used += length + 55
+    return {'version': 1, 'theme': rng.choice(['light', 'dark']), 'widgets': widgets}
+
+
+# (table, generator) in load order: role tables reference users
+TABLES = [('org_codes', Dataset.org_codes), ('users', Dataset.users),
+          ('management_managers', Dataset.management_managers), ('teachers', Dataset.teachers),
+          ('students', Dataset.students), ('parents', Dataset.parents),
+          ('user_dashboard_states', Dataset.user_dashboard_states)]
+
+
+class CopyStream(io.TextIOBase):
+    """File-like view over generated rows, read by COPY FROM STDIN; hashes what it yields."""
+
+    def __init__(self, rows: Iterable[Dict[str, Any]], columns: List[str]):
+        self.rows = iter(rows)
+        self.columns = columns
+        self.count = 0
+        self.digest = hashlib.sha256()
+        self._pending = ''
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator='\n')
+        while size < 0 or len(self._pending) + out.tell() < size:
+            try:
+                row = next(self.rows)
+            except StopIteration:
+                break
+            writer.writerow([row.get(c) for c in self.columns])
+            self.count += 1
+        data = self._pending + out.getvalue()
+        self.digest.update(out.getvalue().encode())
+        if size < 0 or len(data) <= size:
+            self._pending = ''
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+
+def table_columns(conn, table: str) -> List[str]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT column_name FROM information_schema.columns "
+                    "WHERE table_schema = 'public' AND table_name = %s", (table,))
+        return [r[0] for r in cur.fetchall()]
+
+
+def sample_columns(dataset: Dataset, gen) -> List[str]:
+    first = next(iter(gen(dataset)), None)
+    return list(first) if first else []
+
+
+def load(dataset: Dataset, conn=None, csv_dir: Optional[str] = None) -> None:
+    total_started = time.monotonic()
+    for table, gen in TABLES:
+        wanted = sample_columns(dataset, gen)
+        if conn is not None:
+            present = set(table_columns(conn, table))
+            if not present:
+                print(f'{table:<22} skipped (table missing)')
+                continue
+            columns = [c for c in wanted if c in present]
+        else:
+            columns = wanted
+        stream = CopyStream(gen(dataset), columns)
+        started = time.monotonic()
+        if conn is not None:
+            with conn.cursor() as cur:
+                cur.copy_expert(f"COPY public.{table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                                stream, size=1 << 20)
+                conn.commit()
+                cur.execute(f'ANALYZE public.{table}')
+                conn.commit()
+        else:
+            with open(os.path.join(csv_dir, f'{table}.csv'), 'w', encoding='utf-8', newline='') as f:
+                f.write(','.join(columns) + '\n')
+                while True:
+                    chunk = stream.read(1 << 20)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        elapsed = time.monotonic() - started
+        rate = stream.count / elapsed if elapsed > 0 else 0
+        print(f'{table:<22} {stream.count:>9} rows  {elapsed:7.1f}s  {rate:>9.0f} rows/s  '
+              f'sha256 {stream.digest.hexdigest()[:16]}')
+    print(f'done in {time.monotonic() - total_started:.1f}s')
+
+
+def reset(conn) -> None:
+    seeded = f"SELECT id FROM public.users WHERE email LIKE '%%@{EMAIL_DOMAIN}'"
+    with conn.cursor() as cur:
+        for table in ('user_dashboard_states', 'parents', 'students', 'teachers', 'management_managers'):
+            if table_columns(conn, table):
+                cur.execute(f'DELETE FROM public.{table} WHERE user_id IN ({seeded})')
+                print(f'{table:<22} {cur.rowcount:>9} rows deleted')
+        cur.execute(f"DELETE FROM public.users WHERE email LIKE '%%@{EMAIL_DOMAIN}'")
+        print(f"{'users':<22} {cur.rowcount:>9} rows deleted")
+        cur.execute("DELETE FROM public.org_codes WHERE institute_id LIKE 'Seed %%'")
+        print(f"{'org_codes':<22} {cur.rowcount:>9} rows deleted")
+    conn.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate and COPY a synthetic large-institute dataset')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--institutes', type=int, default=500)
+    parser.add_argument('--students', type=int, default=200_000)
+    parser.add_argument('--teachers', type=int, default=20_000)
+    parser.add_argument('--managers-per-institute', type=int, default=2)
+    parser.add_argument('--parent-share', type=float, default=0.8, help='fraction of students with a parent')
+    parser.add_argument('--state-share', type=float, default=0.5, help='fraction of users with a dashboard state')
+    parser.add_argument('--csv', metavar='DIR', help='write CSV files to DIR instead of loading')
+    parser.add_argument('--reset', action='store_true', help='delete previously seeded rows and exit')
+    args = parser.parse_args()
+
+    if args.reset:
+        with db.connection() as conn:
+            reset(conn)
+        return
+
+    started = time.monotonic()
+    dataset = Dataset(args.seed, args.institutes, args.students, args.teachers, args.managers_per_institute,
+                      args.parent_share, args.state_share)
+    print(f'planned {args.institutes} institutes, {args.students} students, {args.teachers} teachers, '
+          f'{len(dataset.parent_children)} parents (seed {args.seed}) in {time.monotonic() - started:.1f}s')
+    if args.csv:
+        os.makedirs(args.csv, exist_ok=True)
+        load(dataset, csv_dir=args.csv)
+        return
+    with db.connection() as conn:
+        load(dataset, conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,9 @@
-import os
-import psycopg2
-from psycopg2 import sql
-from dotenv import load_dotenv
-
-
-def load_env():
-    # load .env from repo root
-    here = os.path.dirname(os.path.dirname(__file__))
-    load_dotenv(os.path.join(here, '..', '.env'))
-
-
-def get_conn():
-    load_env()
-    conn_str = os.environ.get('DATABASE_URL')
-    if not conn_str:
-        raise RuntimeError('DATABASE_URL not found in environment')
-    # allow insecure local connections
-    return psycopg2.connect(conn_str)
+import db
 
 
 def setup_tables():
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
+    # one transaction on a pooled connection, which the caller's later queries reuse
+    with db.transaction() as cur:
         # users public table (minimal)
         cur.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -104,11 +85,7 @@ def setup_tables():
         );
         ''')
 
-        conn.commit()
-        print('Tables ensured.')
-    finally:
-        cur.close()
-        conn.close()
+    print('Tables ensured.')
 
 
 if __name__ == '__main__':
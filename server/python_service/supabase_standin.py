@@ -0,0 +1,817 @@
+"""
+Offline stand-in for the parts of Supabase this service uses, so the service,
+the verify/test scripts and the load tests can run on one machine with no
+network and no real project.
+
+Emulated:
+  /auth/v1/admin/users            POST create, GET list (page/per_page)
+  /auth/v1/admin/users/{id}       GET, DELETE
+  /auth/v1/signup                 POST (auto-confirmed, returns a session)
+  /auth/v1/token?grant_type=password
+  /auth/v1/user                   GET (bearer token)
+  /rest/v1/{table}                GET / POST (insert, upsert) / PATCH / DELETE with
+                                  eq, neq, gt, gte, lt, lte, like, ilike, in, is, or/and filters,
+                                  select=col,embedded(cols), order, limit, offset,
+                                  Prefer: return=, resolution=, count=exact
+  /rest/v1/rpc/{fn}               POST for create_profile_with_tasks, claim_signup_outbox,
+                                  ensure_audit_partitions, reconcile_institute_role_counts
+  /v1/traces                      OTLP/HTTP JSON sink for tracing.py
+
+Rows live in SQLite as JSON documents (one table per PostgREST table, created on
+first use; filtered columns get an expression index automatically). Unique
+constraints mirror ensure_tables.py; foreign keys and RLS are not enforced. The
+institute_role_counts triggers of migration 018 and the users column sync of
+migration 019 are emulated on writes.
+
+Fault injection (per service, "auth" / "rest"): base latency + uniform jitter,
+a slow tail, and an error rate answered with 503 (transient, so resilience.py
+retries it). Change it at runtime with POST /_standin/config.
+
+    python supabase_standin.py --port 54321 --latency-ms 20 --jitter-ms 10 --error-rate 0.01
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_SERVICE_ROLE_KEY=standin python main.py
+
+    # in-process (benchmarks)
+    server, url = supabase_standin.start(port=0, latency_ms=5)
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+JWT_SECRET = os.environ.get("STANDIN_JWT_SECRET", "standin-jwt-secret")
+
+# Mirrors ensure_tables.py; unknown tables are accepted with an `id` primary key.
+TABLES: Dict[str, Dict[str, Any]] = {
+    # promoted: columns kept in sync with extra by a trigger (migration 019)
+    "users": {"unique": ["email"], "promoted": {"institute_id": ("institute_id",), "org_type": ("org_type", "type"),
+                                                 "title": ("title",)}},
+    "management_managers": {},
+    "org_codes": {"unique": ["code"], "defaults": {"is_active": True}},
+    "teachers": {"defaults": {"is_verified": False}, "counted_as": "Teacher"},
+    "students": {"defaults": {"is_verified": False}, "counted_as": "Student"},
+    "parents": {"counted_as": "Parent"},
+    "user_dashboard_states": {"pk": "user_id", "timestamp": "last_updated_at"},
+    "audit_events": {"timestamp": "occurred_at"},
+    "signup_outbox": {"serial": True, "defaults": {"status": "pending", "attempts": 0, "last_error": None}},
+}
+
+_IDENT_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _singular(name: str) -> str:
+    return name[:-1] if name.endswith("s") else name
+
+
+class StandinError(Exception):
+    def __init__(self, status: int, body: Dict[str, Any]):
+        super().__init__(body.get("message") or body.get("msg"))
+        self.status = status
+        self.body = body
+
+
+def _pg_error(status: int, code: str, message: str, details: Optional[str] = None) -> StandinError:
+    return StandinError(status, {"code": code, "message": message, "details": details, "hint": None})
+
+
+def _auth_error(status: int, error_code: str, msg: str) -> StandinError:
+    return StandinError(status, {"code": status, "error_code": error_code, "msg": msg})
+
+
+# --- Fault injection ---
+
+class Faults:
+    FIELDS = ("latency_ms", "jitter_ms", "tail_rate", "tail_ms", "error_rate")
+
+    def __init__(self, **values):
+        self.latency_ms = 0.0
+        self.jitter_ms = 0.0
+        self.tail_rate = 0.0
+        self.tail_ms = 0.0
+        self.error_rate = 0.0
+        self.update(values)
+
+    def update(self, values: Dict[str, Any]) -> None:
+        for key in self.FIELDS:
+            if values.get(key) is not None:
+                setattr(self, key, float(values[key]))
+
+    def to_dict(self) -> Dict[str, float]:
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    def apply(self) -> bool:
+        """Sleep for the injected latency; True means answer this request with a 503."""
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if self.tail_rate and random.random() < self.tail_rate:
+            delay += self.tail_ms
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        return bool(self.error_rate) and random.random() < self.error_rate
+
+
+def _promote(table: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    extra = doc.get("extra") if isinstance(doc.get("extra"), dict) else {}
+    for column, keys in TABLES.get(table, {}).get("promoted", {}).items():
+        doc[column] = next((extra[k] for k in keys if extra.get(k) is not None), None)
+    return doc
+
+
+# --- Storage ---
+
+class Store:
+    """JSON documents in SQLite behind one lock (SQLite is single-writer anyway)."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.lock = threading.RLock()
+        self._tables = set()
+        self._indexes = set()
+        self.db.execute("CREATE TABLE IF NOT EXISTS auth_users (id TEXT PRIMARY KEY, email TEXT UNIQUE, "
+                        "salt TEXT, password_hash TEXT, doc TEXT)")
+
+    # tables / indexes
+
+    def _table(self, name: str) -> str:
+        if not _IDENT_RE.match(name):
+            raise _pg_error(404, "PGRST205", f"Could not find the table 'public.{name}' in the schema cache")
+        if name not in self._tables:
+            self.db.execute(f'CREATE TABLE IF NOT EXISTS "t_{name}" (pk TEXT PRIMARY KEY, doc TEXT NOT NULL)')
+            for col in TABLES.get(name, {}).get("unique", []):
+                self.db.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "u_{name}_{col}" '
+                                f'ON "t_{name}" (json_extract(doc, \'$.{col}\'))')
+            self._tables.add(name)
+        return f'"t_{name}"'
+
+    def _column(self, table: str, col: str) -> str:
+        if not _IDENT_RE.match(col):
+            raise _pg_error(400, "42703", f"column {table}.{col} does not exist")
+        if (table, col) not in self._indexes:
+            self.db.execute(f'CREATE INDEX IF NOT EXISTS "i_{table}_{col}" ON "t_{table}" (json_extract(doc, \'$.{col}\'))')
+            self._indexes.add((table, col))
+        return f"json_extract(doc, '$.{col}')"
+
+    # filters
+
+    @staticmethod
+    def _candidates(value: str) -> List[Any]:
+        """A PostgREST filter value is text; match it against the JSON types it could be stored as."""
+        out: List[Any] = [value]
+        if value in ("true", "false"):
+            out.append(1 if value == "true" else 0)
+        else:
+            try:
+                out.append(int(value))
+            except ValueError:
+                try:
+                    out.append(float(value))
+                except ValueError:
+                    pass
+        return out
+
+    @staticmethod
+    def _split(group: str) -> List[str]:
+        """Top-level comma split of an or=(...) / and(...) group."""
+        parts, depth, start = [], 0, 0
+        for i, ch in enumerate(group):
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+            elif ch == "," and depth == 0:
+                parts.append(group[start:i])
+                start = i + 1
+        parts.append(group[start:])
+        return [p.strip() for p in parts if p.strip()]
+
+    def _condition(self, table: str, col: str, expr: str, params: List[Any]) -> str:
+        if col in ("or", "and"):
+            # or=(a.lt.1,and(b.eq.2,c.gt.3))
+            terms = []
+            for term in self._split(expr.strip()[1:-1]):
+                name, _, rest = term.partition("(") if term.startswith(("or(", "and(")) else term.partition(".")
+                terms.append(self._condition(table, name, "(" + rest if name in ("or", "and") else rest, params))
+            return "(" + f" {col.upper()} ".join(terms) + ")"
+        negate = expr.startswith("not.")
+        if negate:
+            expr = expr[4:]
+        op, _, value = expr.partition(".")
+        column = self._column(table, col)
+        if op in ("eq", "neq"):
+            cands = self._candidates(value)
+            clause = f"{column} {'NOT IN' if op == 'neq' else 'IN'} ({','.join('?' * len(cands))})"
+            params.extend(cands)
+        elif op == "in":
+            items = [v.strip().strip('"') for v in value.strip("()").split(",") if v.strip()]
+            cands = [c for v in items for c in self._candidates(v)] or [None]
+            clause = f"{column} IN ({','.join('?' * len(cands))})"
+            params.extend(cands)
+        elif op == "is":
+            clause = {"null": f"{column} IS NULL", "true": f"{column} = 1", "false": f"{column} = 0"}.get(value)
+            if clause is None:
+                raise _pg_error(400, "PGRST100", f"invalid is. value: {value}")
+        elif op in ("gt", "gte", "lt", "lte"):
+            clause = f"{column} {dict(gt='>', gte='>=', lt='<', lte='<=')[op]} ?"
+            params.append(self._candidates(value)[-1])
+        elif op in ("like", "ilike"):
+            # SQLite LIKE is case-insensitive for ASCII, so like behaves as ilike here
+            clause = f"{column} LIKE ?"
+            params.append(value.replace("*", "%"))
+        else:
+            raise _pg_error(400, "PGRST100", f"unsupported operator: {op}")
+        return f"NOT ({clause})" if negate else clause
+
+    def _where(self, table: str, filters: List[Tuple[str, str]]) -> Tuple[str, List[Any]]:
+        params: List[Any] = []
+        clauses = [self._condition(table, col, expr, params) for col, expr in filters]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _order(self, table: str, order: Optional[str]) -> str:
+        if not order:
+            return ""
+        terms = []
+        for term in order.split(","):
+            parts = term.split(".")
+            direction = "DESC" if "desc" in parts[1:] else "ASC"
+            nulls = " NULLS FIRST" if "nullsfirst" in parts[1:] else " NULLS LAST" if "nullslast" in parts[1:] else ""
+            terms.append(f"{self._column(table, parts[0])} {direction}{nulls}")
+        return " ORDER BY " + ", ".join(terms)
+
+    # operations
+
+    def select(self, table: str, filters, order=None, limit=None, offset=None) -> Tuple[List[Dict], int]:
+        with self.lock:
+            t = self._table(table)
+            where, params = self._where(table, filters)
+            sql = f"SELECT doc FROM {t}{where}{self._order(table, order)}"
+            if limit is not None or offset is not None:
+                sql += f" LIMIT {int(limit) if limit is not None else -1} OFFSET {int(offset or 0)}"
+            rows = [json.loads(r[0]) for r in self.db.execute(sql, params)]
+            total = self.db.execute(f"SELECT COUNT(*) FROM {t}{where}", params).fetchone()[0]
+        return rows, total
+
+    def _prepare(self, table: str, row: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        spec = TABLES.get(table, {})
+        pk = spec.get("pk", "id")
+        doc = {**spec.get("defaults", {}), **row}
+        if pk == "id" and not doc.get("id"):
+            doc["id"] = self._next_serial(table) if spec.get("serial") else str(uuid.uuid4())
+        doc.setdefault(spec.get("timestamp", "created_at"), _now())
+        _promote(table, doc)
+        if doc.get(pk) is None:
+            raise _pg_error(400, "23502", f'null value in column "{pk}" of relation "{table}" violates not-null constraint')
+        return str(doc[pk]), doc
+
+    def _next_serial(self, table: str) -> int:
+        row = self.db.execute(f"SELECT MAX(CAST(pk AS INTEGER)) FROM {self._table(table)}").fetchone()
+        return (row[0] or 0) + 1
+
+    def insert(self, table: str, rows: List[Dict], upsert: Optional[str] = None,
+               on_conflict: Optional[str] = None) -> List[Dict]:
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                out = self._insert(table, rows, upsert, on_conflict)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return out
+
+    def _insert(self, table: str, rows: List[Dict], upsert: Optional[str], on_conflict: Optional[str]) -> List[Dict]:
+        out = []
+        t = self._table(table)
+        for row in rows:
+            if upsert and on_conflict and on_conflict != TABLES.get(table, {}).get("pk", "id"):
+                existing = self.db.execute(f"SELECT pk, doc FROM {t} WHERE {self._column(table, on_conflict)} = ?",
+                                           (row.get(on_conflict),)).fetchone()
+            else:
+                pk_col = TABLES.get(table, {}).get("pk", "id")
+                existing = self.db.execute(f"SELECT pk, doc FROM {t} WHERE pk = ?",
+                                           (str(row[pk_col]),)).fetchone() if row.get(pk_col) is not None else None
+            if existing and upsert:
+                if upsert == "ignore":
+                    continue
+                old = json.loads(existing[1])
+                doc = _promote(table, {**old, **row})
+                self.db.execute(f"UPDATE {t} SET doc = ? WHERE pk = ?", (json.dumps(doc), existing[0]))
+                self._bump_counts(table, old, -1)
+                self._bump_counts(table, doc, 1)
+                out.append(doc)
+                continue
+            pk, doc = self._prepare(table, row)
+            try:
+                self.db.execute(f"INSERT INTO {t} (pk, doc) VALUES (?, ?)", (pk, json.dumps(doc)))
+            except sqlite3.IntegrityError as e:
+                raise _pg_error(409, "23505", f'duplicate key value violates unique constraint on "{table}"', str(e))
+            self._bump_counts(table, doc, 1)
+            out.append(doc)
+        return out
+
+    # institute_role_counts triggers (migration 018)
+
+    def _bump_counts(self, table: str, doc: Dict[str, Any], delta: int) -> None:
+        role = TABLES.get(table, {}).get("counted_as")
+        if role is None:
+            return
+        key = {"institute_id": doc.get("institute_id") or "", "role": role, "status": doc.get("status") or "none"}
+        self._add_count(key, delta)
+
+    def _add_count(self, key: Dict[str, Any], delta: int, absolute: bool = False) -> None:
+        t = self._table("institute_role_counts")
+        pk = "|".join((key["institute_id"], key["role"], key["status"]))
+        row = self.db.execute(f"SELECT doc FROM {t} WHERE pk = ?", (pk,)).fetchone()
+        total = delta if absolute or row is None else json.loads(row[0])["total"] + delta
+        doc = {"id": pk, **key, "total": total, "updated_at": _now()}
+        self.db.execute(f"INSERT OR REPLACE INTO {t} (pk, doc) VALUES (?, ?)", (pk, json.dumps(doc)))
+
+    def _reconcile_counts(self) -> int:
+        actual: Dict[Tuple[str, str, str], int] = {}
+        for table, spec in TABLES.items():
+            if "counted_as" not in spec:
+                continue
+            for (doc,) in self.db.execute(f"SELECT doc FROM {self._table(table)}"):
+                doc = json.loads(doc)
+                key = (doc.get("institute_id") or "", spec["counted_as"], doc.get("status") or "none")
+                actual[key] = actual.get(key, 0) + 1
+        stored = {(d["institute_id"], d["role"], d["status"]): d["total"] for d in
+                  (json.loads(r[0]) for r in self.db.execute(f"SELECT doc FROM {self._table('institute_role_counts')}"))}
+        fixed = 0
+        for key in set(actual) | set(stored):
+            if actual.get(key, 0) != stored.get(key, 0):
+                self._add_count(dict(zip(("institute_id", "role", "status"), key)), actual.get(key, 0), absolute=True)
+                fixed += 1
+        return fixed
+
+    # rpc: the functions of server/migrations that the service calls
+
+    def rpc(self, fn: str, args: Dict[str, Any]) -> Any:
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                if fn == "create_profile_with_tasks":
+                    self._insert("users", [args["p_profile"]], None, None)
+                    role_row = args.get("p_role_row")
+                    if role_row:
+                        self._insert(role_row["table"], [role_row["row"]], None, None)
+                    self._insert("signup_outbox", [{"task": t.get("task"), "payload": t.get("payload") or {},
+                                                    "available_at": _now()} for t in args.get("p_tasks") or []],
+                                 None, None)
+                    out = args["p_profile"]
+                elif fn == "claim_signup_outbox":
+                    t, now = self._table("signup_outbox"), _now()
+                    lease = datetime.fromtimestamp(time.time() + int(args.get("p_lease_seconds", 60)), timezone.utc)
+                    out = []
+                    for pk, doc in self.db.execute(
+                            f"SELECT pk, doc FROM {t} WHERE {self._column('signup_outbox', 'status')} = 'pending' "
+                            f"AND {self._column('signup_outbox', 'available_at')} <= ? "
+                            f"ORDER BY {self._column('signup_outbox', 'available_at')} LIMIT ?",
+                            (now, int(args.get("p_limit", 50)))).fetchall():
+                        doc = json.loads(doc)
+                        doc.update(attempts=doc.get("attempts", 0) + 1, available_at=lease.isoformat())
+                        self.db.execute(f"UPDATE {t} SET doc = ? WHERE pk = ?", (json.dumps(doc), pk))
+                        out.append(doc)
+                elif fn == "reconcile_institute_role_counts":
+                    out = self._reconcile_counts()
+                elif fn == "ensure_audit_partitions":
+                    out = 0  # one unpartitioned table here
+                else:
+                    raise _pg_error(404, "PGRST202", f"Could not find the function public.{fn} in the schema cache")
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return out
+
+    def update(self, table: str, filters, patch: Dict[str, Any]) -> List[Dict]:
+        with self.lock:
+            t = self._table(table)
+            where, params = self._where(table, filters)
+            out = []
+            self.db.execute("BEGIN")
+            try:
+                for pk, old in self.db.execute(f"SELECT pk, doc FROM {t}{where}", params).fetchall():
+                    old = json.loads(old)
+                    doc = {**old, **patch}
+                    if "extra" in patch:
+                        _promote(table, doc)
+                    try:
+                        self.db.execute(f"UPDATE {t} SET doc = ? WHERE pk = ?", (json.dumps(doc), pk))
+                    except sqlite3.IntegrityError as e:
+                        raise _pg_error(409, "23505", f'duplicate key value violates unique constraint on "{table}"', str(e))
+                    self._bump_counts(table, old, -1)
+                    self._bump_counts(table, doc, 1)
+                    out.append(doc)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return out
+
+    def delete(self, table: str, filters) -> List[Dict]:
+        with self.lock:
+            t = self._table(table)
+            where, params = self._where(table, filters)
+            rows = [json.loads(r[0]) for r in self.db.execute(f"SELECT doc FROM {t}{where}", params)]
+            self.db.execute(f"DELETE FROM {t}{where}", params)
+            for doc in rows:
+                self._bump_counts(table, doc, -1)
+        return rows
+
+    # auth users
+
+    def create_auth_user(self, email: str, password: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        now = _now()
+        user = {
+            "id": str(uuid.uuid4()), "aud": "authenticated", "role": "authenticated", "email": email,
+            "email_confirmed_at": now, "confirmed_at": now, "created_at": now, "updated_at": now,
+            "app_metadata": {"provider": "email", "providers": ["email"]}, "user_metadata": metadata or {},
+            "identities": [], "is_anonymous": False,
+        }
+        salt = secrets.token_hex(8)
+        with self.lock:
+            try:
+                self.db.execute("INSERT INTO auth_users (id, email, salt, password_hash, doc) VALUES (?, ?, ?, ?, ?)",
+                                (user["id"], email, salt, _hash_password(salt, password), json.dumps(user)))
+            except sqlite3.IntegrityError:
+                raise _auth_error(422, "email_exists", "A user with this email address has already been registered")
+        return user
+
+    def check_password(self, email: str, password: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.db.execute("SELECT salt, password_hash, doc FROM auth_users WHERE email = ?", (email,)).fetchone()
+        if row and hmac.compare_digest(row[1], _hash_password(row[0], password)):
+            return json.loads(row[2])
+        return None
+
+    def get_auth_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.db.execute("SELECT doc FROM auth_users WHERE id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_auth_users(self, page: int, per_page: int) -> Tuple[List[Dict], int]:
+        with self.lock:
+            rows = self.db.execute("SELECT doc FROM auth_users ORDER BY rowid LIMIT ? OFFSET ?",
+                                   (per_page, (page - 1) * per_page)).fetchall()
+            total = self.db.execute("SELECT COUNT(*) FROM auth_users").fetchone()[0]
+        return [json.loads(r[0]) for r in rows], total
+
+    def delete_auth_user(self, user_id: str) -> bool:
+        with self.lock:
+            return self.db.execute("DELETE FROM auth_users WHERE id = ?", (user_id,)).rowcount > 0
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            out = {"auth.users": self.db.execute("SELECT COUNT(*) FROM auth_users").fetchone()[0]}
+            for name in sorted(self._tables):
+                out[name] = self.db.execute(f'SELECT COUNT(*) FROM "t_{name}"').fetchone()[0]
+        return out
+
+
+def _hash_password(salt: str, password: str) -> str:
+    # Deliberately cheap: real bcrypt cost is modelled with --auth-latency-ms instead
+    return hashlib.sha256(f"{salt}:{password}".encode()).hexdigest()
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def issue_token(user: Dict[str, Any], ttl: int = 3600) -> Dict[str, Any]:
+    now = int(time.time())
+    header = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = _b64(json.dumps({"sub": user["id"], "email": user.get("email"), "role": "authenticated",
+                               "aud": "authenticated", "iat": now, "exp": now + ttl}).encode())
+    signature = _b64(hmac.new(JWT_SECRET.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest())
+    return {"access_token": f"{header}.{payload}.{signature}", "token_type": "bearer", "expires_in": ttl,
+            "expires_at": now + ttl, "refresh_token": secrets.token_urlsafe(16), "user": user}
+
+
+def _token_subject(authorization: Optional[str]) -> Optional[str]:
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        header, payload, signature = authorization[7:].strip().split(".")
+        expected = _b64(hmac.new(JWT_SECRET.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest())
+        if not hmac.compare_digest(signature, expected):
+            return None
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return claims["sub"] if claims.get("exp", 0) > time.time() else None
+    except (ValueError, KeyError):
+        return None
+
+
+# --- PostgREST select= parsing / embedding ---
+
+def _split_top(value: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for ch in value:
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += ch == "("
+        depth -= ch == ")"
+        current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def parse_select(value: Optional[str]) -> Tuple[List[str], List[Tuple[str, bool, str]]]:
+    """'*, users!inner(name, email)' -> (['*'], [('users', True, 'name, email')])"""
+    columns, embeds = [], []
+    for part in _split_top(value or "*"):
+        if "(" in part:
+            name, _, inner = part.partition("(")
+            name, _, hint = name.strip().partition("!")
+            embeds.append((name.split(":")[-1], hint == "inner", inner.rstrip(")")))
+        else:
+            columns.append(part)
+    return columns or ["*"], embeds
+
+
+def _project(row: Dict[str, Any], columns: List[str]) -> Dict[str, Any]:
+    if "*" in columns:
+        return dict(row)
+    out = {}
+    for col in columns:
+        alias, _, source = col.partition(":")
+        out[alias] = row.get(source or alias)
+    return out
+
+
+class Standin:
+    def __init__(self, store: Store, auth: Faults, rest: Faults, otlp_file: Optional[str] = None):
+        self.store = store
+        self.faults = {"auth": auth, "rest": rest}
+        self.otlp_file = otlp_file
+        self.spans_received = 0
+        self.requests = {"auth": 0, "rest": 0}
+        self.injected_errors = {"auth": 0, "rest": 0}
+        self._lock = threading.Lock()
+
+    def embed(self, table: str, rows: List[Dict], embeds) -> List[Dict]:
+        for name, inner, cols in embeds:
+            columns, nested = parse_select(cols)
+            fk = f"{_singular(name)}_id"
+            kept = []
+            for row in rows:
+                if fk in row:  # many-to-one: teachers.user_id -> users.id
+                    found, _ = self.store.select(name, [("id", f"eq.{row[fk]}")]) if row[fk] is not None else ([], 0)
+                    value = self.embed(name, [_project(r, columns) for r in found[:1]], nested)
+                    row[name] = value[0] if value else None
+                    matched = bool(value)
+                else:  # one-to-many: users.id <- teachers.user_id
+                    found, _ = self.store.select(name, [(f"{_singular(table)}_id", f"eq.{row.get('id')}")])
+                    row[name] = self.embed(name, [_project(r, columns) for r in found], nested)
+                    matched = bool(row[name])
+                if matched or not inner:
+                    kept.append(row)
+            rows = kept
+        return rows
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real gateway
+    server_version = "SupabaseStandin/1.0"
+    standin: Standin = None  # set by make_server()
+
+    def log_message(self, format, *args):  # noqa: A002 - quiet by default
+        pass
+
+    def _send(self, status: int, body: Any = None, headers: Optional[Dict[str, str]] = None) -> None:
+        data = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def _body(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else None
+
+    def _dispatch(self, method: str) -> None:
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/")
+        query = parse_qsl(url.query, keep_blank_values=True)
+        try:
+            body = self._body()
+            if path.startswith("/_standin"):
+                return self._control(method, path, body)
+            if path == "/v1/traces" and method == "POST":
+                return self._traces(body)
+            service = "auth" if path.startswith("/auth/v1") else "rest" if path.startswith("/rest/v1") else None
+            if service is None:
+                return self._send(404, {"message": f"no route for {path}"})
+            with self.standin._lock:
+                self.standin.requests[service] += 1
+            if self.standin.faults[service].apply():
+                with self.standin._lock:
+                    self.standin.injected_errors[service] += 1
+                return self._send(503, {"message": "injected failure", "code": "503"})
+            if service == "auth":
+                return self._auth(method, path[len("/auth/v1"):], dict(query), body)
+            if path.startswith("/rest/v1/rpc/") and method == "POST":
+                return self._send(200, self.standin.store.rpc(unquote(path[len("/rest/v1/rpc/"):]), body or {}))
+            return self._rest(method, unquote(path[len("/rest/v1/"):]), query, body)
+        except StandinError as e:
+            self._send(e.status, e.body)
+        except (ValueError, TypeError) as e:
+            self._send(400, {"code": "PGRST102", "message": str(e), "details": None, "hint": None})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    # --- /auth/v1 ---
+
+    def _auth(self, method: str, path: str, query: Dict[str, str], body: Any) -> None:
+        store = self.standin.store
+        body = body or {}
+        if path == "/admin/users" and method == "POST":
+            return self._send(200, store.create_auth_user(body.get("email"), body.get("password") or "",
+                                                          body.get("user_metadata") or body.get("data")))
+        if path == "/admin/users" and method == "GET":
+            page, per_page = int(query.get("page") or 1), int(query.get("per_page") or 50)
+            users, total = store.list_auth_users(page, per_page)
+            return self._send(200, {"users": users, "aud": "authenticated"}, {"x-total-count": str(total)})
+        if path.startswith("/admin/users/"):
+            user_id = path.rsplit("/", 1)[-1]
+            if method == "GET":
+                user = store.get_auth_user(user_id)
+                return self._send(200, user) if user else self._send(404, {"code": 404, "error_code": "user_not_found",
+                                                                           "msg": "User not found"})
+            if method == "DELETE":
+                if not store.delete_auth_user(user_id):
+                    raise _auth_error(404, "user_not_found", "User not found")
+                return self._send(200, {})
+        if path == "/signup" and method == "POST":
+            user = store.create_auth_user(body.get("email"), body.get("password") or "", (body.get("data") or {}))
+            return self._send(200, issue_token(user))
+        if path == "/token" and method == "POST" and query.get("grant_type") == "password":
+            user = store.check_password(body.get("email") or "", body.get("password") or "")
+            if user is None:
+                raise StandinError(400, {"code": 400, "error_code": "invalid_credentials",
+                                         "msg": "Invalid login credentials", "error": "invalid_grant",
+                                         "error_description": "Invalid login credentials"})
+            return self._send(200, issue_token(user))
+        if path == "/user" and method == "GET":
+            user_id = _token_subject(self.headers.get("Authorization"))
+            user = store.get_auth_user(user_id) if user_id else None
+            if user is None:
+                raise _auth_error(401, "bad_jwt", "invalid JWT")
+            return self._send(200, user)
+        raise _auth_error(404, "not_found", f"{method} {path} is not emulated")
+
+    # --- /rest/v1 ---
+
+    def _rest(self, method: str, table: str, query: List[Tuple[str, str]], body: Any) -> None:
+        standin, store = self.standin, self.standin.store
+        reserved = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+        params = {k: v for k, v in query if k in reserved}
+        filters = [(k, v) for k, v in query if k not in reserved]
+        prefer = self.headers.get("Prefer", "")
+        representation = "return=representation" in prefer or method == "GET"
+        columns, embeds = parse_select(params.get("select"))
+
+        if method == "GET":
+            rows, total = store.select(table, filters, params.get("order"), params.get("limit"), params.get("offset"))
+        elif method == "POST":
+            rows = body if isinstance(body, list) else [body or {}]
+            upsert = "merge" if "resolution=merge-duplicates" in prefer else \
+                "ignore" if "resolution=ignore-duplicates" in prefer else None
+            rows = store.insert(table, rows, upsert, params.get("on_conflict"))
+            total = len(rows)
+        elif method == "PATCH":
+            rows = store.update(table, filters, body or {})
+            total = len(rows)
+        elif method == "DELETE":
+            rows = store.delete(table, filters)
+            total = len(rows)
+        else:
+            raise _pg_error(405, "PGRST117", f"unsupported method {method}")
+
+        rows = standin.embed(table, [_project(r, columns) for r in rows], embeds)
+        headers = {}
+        if "count=exact" in prefer:
+            start = int(params.get("offset") or 0)
+            headers["Content-Range"] = f"{start}-{start + len(rows) - 1}/{total}" if rows else f"*/{total}"
+        if "vnd.pgrst.object" in self.headers.get("Accept", ""):
+            if len(rows) != 1:
+                raise _pg_error(406, "PGRST116", "JSON object requested, multiple (or no) rows returned",
+                                f"The result contains {len(rows)} rows")
+            return self._send(200, rows[0], headers)
+        status = 200 if method in ("GET", "PATCH", "DELETE") else 201
+        if not representation:
+            return self._send(204 if status == 200 else status, None, headers)
+        self._send(status, rows, headers)
+
+    # --- OTLP sink and control ---
+
+    def _traces(self, body: Any) -> None:
+        spans = [s for rs in (body or {}).get("resourceSpans", []) for ss in rs.get("scopeSpans", [])
+                 for s in ss.get("spans", [])]
+        with self.standin._lock:
+            self.standin.spans_received += len(spans)
+            if self.standin.otlp_file:
+                with open(self.standin.otlp_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(body) + "\n")
+        self._send(200, {"partialSuccess": {}})
+
+    def _control(self, method: str, path: str, body: Any) -> None:
+        standin = self.standin
+        if path == "/_standin/config":
+            if method == "POST":
+                for service, values in (body or {}).items():
+                    if service in standin.faults:
+                        standin.faults[service].update(values)
+            return self._send(200, {k: f.to_dict() for k, f in standin.faults.items()})
+        if path == "/_standin/stats":
+            return self._send(200, {"rows": standin.store.stats(), "requests": standin.requests,
+                                    "injected_errors": standin.injected_errors,
+                                    "spans_received": standin.spans_received})
+        self._send(404, {"message": f"unknown control path {path}"})
+
+
+def make_server(host: str = "127.0.0.1", port: int = 54321, db: str = ":memory:", otlp_file: Optional[str] = None,
+                auth_faults: Optional[Dict] = None, rest_faults: Optional[Dict] = None) -> ThreadingHTTPServer:
+    standin = Standin(Store(db), Faults(**(auth_faults or {})), Faults(**(rest_faults or {})), otlp_file)
+    handler = type("StandinHandler", (Handler,), {"standin": standin})
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.standin = standin
+    return server
+
+
+def start(port: int = 0, **faults) -> Tuple[ThreadingHTTPServer, str]:
+    """Run a stand-in on a background thread; the same faults apply to auth and rest."""
+    server = make_server(port=port, auth_faults=faults, rest_faults=faults)
+    threading.Thread(target=server.serve_forever, name="supabase-standin", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local Supabase stand-in (Auth + PostgREST + OTLP sink)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--db", default=":memory:", help="SQLite file (default: in-memory)")
+    parser.add_argument("--otlp-file", help="append received OTLP trace payloads to this file")
+    for field in Faults.FIELDS:
+        flag = field.replace("_", "-")
+        parser.add_argument(f"--{flag}", type=float, default=0.0, help=f"{field} for both services")
+        parser.add_argument(f"--auth-{flag}", type=float, help=f"{field} for /auth/v1 only")
+        parser.add_argument(f"--rest-{flag}", type=float, help=f"{field} for /rest/v1 only")
+    args = parser.parse_args()
+
+    def faults(prefix: str) -> Dict[str, float]:
+        return {f: (getattr(args, f"{prefix}_{f}") if getattr(args, f"{prefix}_{f}") is not None else getattr(args, f))
+                for f in Faults.FIELDS}
+
+    server = make_server(args.host, args.port, args.db, args.otlp_file, faults("auth"), faults("rest"))
+    print(f"Supabase stand-in listening on http://{args.host}:{server.server_address[1]}")
+    print(f"  auth faults: {server.standin.faults['auth'].to_dict()}")
+    print(f"  rest faults: {server.standin.faults['rest'].to_dict()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from supabase import create_client
+
+import audit
+import supabase_standin
+
+
+class FakeClient:
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+
+    def rpc(self, name, args):
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=None))
+
+    def table(self, name):
+        return SimpleNamespace(insert=lambda rows, returning=None: SimpleNamespace(execute=lambda: self.insert(rows)))
+
+    def insert(self, rows):
+        if self.failing:
+            raise ValueError("insert rejected")
+        self.batches.append(list(rows))
+        return SimpleNamespace(data=[])
+
+
+@pytest.fixture
+def log(monkeypatch):
+    monkeypatch.setattr(audit, "ENABLED", True)
+    monkeypatch.setattr(audit, "BATCH", 3)
+    monkeypatch.setattr(audit, "MAX_BUFFER", 5)
+    client = FakeClient()
+    audit_log = audit.AuditLog()
+    audit_log.client_getter = lambda: client
+    audit_log.client = client
+    return audit_log
+
+
+def actions(events):
+    return [e["action"] for e in events]
+
+
+def test_record_only_buffers(log):
+    log.record("user.signup", actor_id="u1", org="school")
+    assert len(log) == 1 and log.client.batches == []
+
+
+def test_flush_writes_at_most_one_batch(log):
+    for n in range(4):
+        log.record(f"a{n}")
+    assert log.flush()
+    assert actions(log.client.batches[0]) == ["a0", "a1", "a2"]
+    assert len(log) == 1
+
+
+def test_failed_flush_requeues_at_the_front(log):
+    for n in range(4):
+        log.record(f"a{n}")
+    log.client.failing = True
+    assert not log.flush()
+    log.record("a4")
+    log.client.failing = False
+    log.flush()
+    log.flush()
+    assert actions(log.client.batches[0] + log.client.batches[1]) == ["a0", "a1", "a2", "a3", "a4"]
+
+
+def test_full_buffer_drops_newest_events(log):
+    before = audit.events_total.value("dropped")
+    for n in range(7):
+        log.record(f"a{n}")
+    assert len(log) == 5
+    assert audit.events_total.value("dropped") == before + 2
+
+
+def test_requeue_never_exceeds_the_bound(log):
+    for n in range(3):
+        log.record(f"a{n}")
+    log.client.failing = True
+    log.flush()  # buffer empty while the insert is in flight...
+    for n in range(3, 6):
+        log.record(f"a{n}")  # ...and refilled meanwhile
+    log.flush()
+    assert len(log) == 5
+
+
+def test_disabled_records_nothing(log, monkeypatch):
+    monkeypatch.setattr(audit, "ENABLED", False)
+    log.record("user.signup")
+    assert len(log) == 0
+
+
+def test_flusher_writes_after_flush_interval_and_drains_on_stop(log, monkeypatch):
+    monkeypatch.setattr(audit, "FLUSH_S", 0.05)
+    log.start(log.client_getter)
+    log.record("a0")
+    deadline = time.monotonic() + 2
+    while not log.client.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert actions(log.client.batches[0]) == ["a0"]
+    log.record("a1")
+    log.stop()
+    assert len(log) == 0 and actions(log.client.batches[-1]) == ["a1"]
+
+
+def test_cursor_round_trip():
+    row = {"occurred_at": "2026-01-02T03:04:05+00:00", "id": str(uuid.uuid4())}
+    assert audit.decode_cursor(audit.encode_cursor(row)) == [row["occurred_at"], row["id"]]
+
+
+def test_bad_cursor_is_400():
+    with pytest.raises(HTTPException) as exc:
+        audit.decode_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+@pytest.fixture
+def standin():
+    server, url = supabase_standin.start(port=0)
+    yield create_client(url, "standin")
+    server.shutdown()
+    server.server_close()
+
+
+def test_outbox_tasks_carry_a_complete_event(monkeypatch):
+    monkeypatch.setattr(audit, "ENABLED", True)
+    [task] = audit.outbox_tasks("user.signup", actor_id="u1", subject_id="u1", role="Student")
+    assert task["task"] == "audit_event"
+    assert task["payload"]["action"] == "user.signup" and task["payload"]["details"] == {"role": "Student"}
+    monkeypatch.setattr(audit, "ENABLED", False)
+    assert audit.outbox_tasks("user.signup") == []
+
+
+def test_outbox_handler_writes_each_event_once(standin, monkeypatch):
+    monkeypatch.setattr(audit, "ENABLED", True)
+    tasks = audit.outbox_tasks("user.signup", actor_id="u0") + audit.outbox_tasks("user.signup", actor_id="u1")
+    rows = [{"id": n, "task": t["task"], "payload": t["payload"]} for n, t in enumerate(tasks)]
+    assert audit.write_events(standin, rows) == {}
+    assert audit.write_events(standin, rows) == {}  # re-claimed after a worker died mid-batch
+    stored = standin.table("audit_events").select("id, actor_id").execute().data
+    assert sorted(r["actor_id"] for r in stored) == ["u0", "u1"]
@@ -0,0 +1,134 @@
+import pytest
+
+import cache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.sqlite")
+
+
+def worker(path, l1_items=16):
+    """One uvicorn worker's view of the host cache."""
+    return cache.open_cache("local", path, l1_items)
+
+
+def counting(value):
+    calls = []
+
+    def load():
+        calls.append(1)
+        return value
+    return load, calls
+
+
+def test_l1_hit_skips_loader_and_returns_a_copy(path):
+    c = worker(path)
+    load, calls = counting({"role": "Student"})
+    first = c.get("profiles", "u1", 60, load)
+    first["role"] = "mutated"
+    assert c.get("profiles", "u1", 60, load) == {"role": "Student"}
+    assert len(calls) == 1
+
+
+def test_l2_is_shared_between_workers(path):
+    a, b = worker(path), worker(path)
+    load, calls = counting({"code": "AB12"})
+    a.get("org_codes", "AB12", 60, load)
+    assert b.get("org_codes", "AB12", 60, load) == {"code": "AB12"}
+    assert len(calls) == 1
+
+
+def test_none_is_not_cached(path):
+    c = worker(path)
+    load, calls = counting(None)
+    c.get("org_codes", "missing", 60, load)
+    c.get("org_codes", "missing", 60, load)
+    assert len(calls) == 2
+
+
+def test_expired_entries_are_reloaded(path, monkeypatch):
+    c = worker(path)
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    load, calls = counting("Inst A")
+    c.get("org_names", "institutes:1", 60, load)
+    now[0] += 61
+    c.get("org_names", "institutes:1", 60, load)
+    assert len(calls) == 2
+
+
+def test_invalidation_reaches_every_worker(path):
+    a, b = worker(path), worker(path)
+    a.get("profiles", "u1", 60, lambda: {"org_type": "school"})
+    b.get("profiles", "u1", 60, lambda: {"org_type": "school"})
+    a.invalidate("profiles", "u1")
+    assert b.get("profiles", "u1", 60, lambda: {"org_type": "institute"}) == {"org_type": "institute"}
+    assert a.get("profiles", "u1", 60, lambda: {"org_type": "other"}) == {"org_type": "institute"}
+
+
+def test_invalidating_one_key_keeps_others_in_l2(path):
+    a, b = worker(path), worker(path)
+    a.get("profiles", "u1", 60, lambda: {"n": 1})
+    a.get("profiles", "u2", 60, lambda: {"n": 2})
+    a.invalidate("profiles", "u1")
+    load, calls = counting({"n": 0})
+    assert b.get("profiles", "u2", 60, load) == {"n": 2}
+    assert calls == []
+
+
+def test_stale_load_is_not_written_back_after_concurrent_invalidation(path, monkeypatch):
+    a, b, c = worker(path), worker(path), worker(path)
+    l1_set = a.l1.set
+
+    def set_then_invalidate(*args):
+        # another worker invalidates after a's loader returned, before a writes L2
+        l1_set(*args)
+        b.invalidate("profiles", "u1")
+    monkeypatch.setattr(a.l1, "set", set_then_invalidate)
+
+    a.get("profiles", "u1", 60, lambda: {"org_type": "school"})
+    assert c.get("profiles", "u1", 60, lambda: {"org_type": "institute"}) == {"org_type": "institute"}
+
+
+def test_load_racing_an_invalidation_is_not_cached(path):
+    a, b = worker(path), worker(path)
+
+    def load():
+        b.invalidate("profiles", "u1")
+        return {"stale": True}
+
+    assert a.get("profiles", "u1", 60, load) == {"stale": True}
+    assert a.get("profiles", "u1", 60, lambda: {"stale": False}) == {"stale": False}
+
+
+def test_preload_fills_both_tiers(path):
+    a, b = worker(path), worker(path)
+    assert a.preload("org_codes", 60, lambda: {"A": {"code": "A"}, "B": None}) == 1
+    load, calls = counting({"code": "x"})
+    assert a.get("org_codes", "A", 60, load) == {"code": "A"}
+    assert b.get("org_codes", "A", 60, load) == {"code": "A"}
+    assert calls == []
+
+
+def test_l1_is_bounded(path):
+    c = worker(path, l1_items=2)
+    for key in "abc":
+        c.get("org_codes", key, 60, lambda: {"k": key})
+    assert len(c.l1) == 2
+
+
+def test_memory_backend_invalidates_locally():
+    c = cache.open_cache("memory")
+    assert c.l2 is None
+    c.get("profiles", "u1", 60, lambda: 1)
+    c.invalidate("profiles", "u1")
+    assert c.get("profiles", "u1", 60, lambda: 2) == 2
+
+
+def test_off_backend_always_loads():
+    c = cache.open_cache("off")
+    load, calls = counting(1)
+    c.get("profiles", "u1", 60, load)
+    c.get("profiles", "u1", 60, load)
+    assert len(calls) == 2
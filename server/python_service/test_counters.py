@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import pytest
+from supabase import create_client
+
+import counters
+import supabase_standin
+
+
+@pytest.fixture
+def client():
+    """A real supabase client against a fresh stand-in, which emulates the migration 018 triggers."""
+    server, url = supabase_standin.start(port=0)
+    yield create_client(url, "standin")
+    server.shutdown()
+    server.server_close()
+
+
+def add(client, table, n, institute="inst-a", status="pending"):
+    client.table(table).insert([{"user_id": f"{table}-{institute}-{status}-{i}", "institute_id": institute,
+                                 "status": status} for i in range(n)]).execute()
+
+
+def test_inserts_are_counted_per_role_and_status(client):
+    add(client, "teachers", 2)
+    add(client, "teachers", 1, status="approved")
+    add(client, "students", 3, status="approved")
+    add(client, "students", 1, institute="inst-b", status="approved")
+    assert counters.summary(client, "inst-a") == {"institutes": {"inst-a": {
+        "Teacher": {"pending": 2, "approved": 1, "total": 3},
+        "Student": {"approved": 3, "total": 3},
+    }}}
+    assert set(counters.summary(client)["institutes"]) == {"inst-a", "inst-b"}
+
+
+def test_status_changes_and_deletes_move_the_counts(client):
+    add(client, "teachers", 2)
+    client.table("teachers").update({"status": "approved"}).eq("user_id", "teachers-inst-a-pending-0").execute()
+    client.table("teachers").delete().eq("user_id", "teachers-inst-a-pending-1").execute()
+    assert counters.summary(client, "inst-a")["institutes"]["inst-a"]["Teacher"] == {"approved": 1, "total": 1}
+
+
+def test_empty_counter_rows_are_hidden(client):
+    add(client, "parents", 1)
+    client.table("parents").delete().eq("institute_id", "inst-a").execute()
+    assert counters.summary(client) == {"institutes": {}}
+
+
+def test_reconcile_repairs_drift(client):
+    add(client, "students", 2, status="approved")
+    client.table("institute_role_counts").update({"total": 7}).eq("institute_id", "inst-a").execute()
+    before = counters.corrections_total.value()
+    assert counters.reconcile(client) == 1
+    assert counters.corrections_total.value() == before + 1
+    assert counters.summary(client, "inst-a")["institutes"]["inst-a"]["Student"]["total"] == 2
+    assert counters.reconcile(client) == 0
+
+
+def test_reconcile_reports_a_concurrent_run():
+    busy = SimpleNamespace(rpc=lambda fn, args: SimpleNamespace(execute=lambda: SimpleNamespace(data=-1)))
+    before = counters.corrections_total.value()
+    assert counters.reconcile(busy) == -1
+    assert counters.corrections_total.value() == before
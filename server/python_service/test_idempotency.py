@@ -0,0 +1,122 @@
+import hashlib
+from typing import Optional
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+import idempotency
+from idempotency import IdempotencyMiddleware, Store
+
+
+def make_client(status: int = 200, store: Optional[Store] = None):
+    app = FastAPI()
+    calls = []
+
+    @app.post("/api/py/state")
+    def save_state(body: dict, response: Response):
+        calls.append(body)
+        response.status_code = status
+        response.headers["x-trace-id"] = str(len(calls))
+        return {"saved": len(calls)}
+
+    @app.post("/api/py/signin")
+    def signin(body: dict):
+        calls.append(body)
+        return {"ok": True}
+
+    app.add_middleware(IdempotencyMiddleware, store=store if store is not None else Store())
+    return TestClient(app), calls
+
+
+def post(client, body, key="k1", path="/api/py/state"):
+    return client.post(path, json=body, headers={"Idempotency-Key": key} if key else {})
+
+
+def test_retry_is_replayed_without_running_the_handler():
+    client, calls = make_client()
+    first = post(client, {"a": 1})
+    second = post(client, {"a": 1})
+    assert len(calls) == 1
+    assert second.status_code == 200 and second.json() == first.json()
+    assert second.headers["idempotent-replayed"] == "true"
+    # per-response headers are not replayed
+    assert "x-trace-id" not in second.headers
+
+
+def test_same_key_different_body_is_422():
+    client, calls = make_client()
+    post(client, {"a": 1})
+    assert post(client, {"a": 2}).status_code == 422
+    assert len(calls) == 1
+
+
+def test_keys_are_scoped_per_key():
+    client, calls = make_client()
+    post(client, {"a": 1}, key="k1")
+    post(client, {"a": 1}, key="k2")
+    assert len(calls) == 2
+
+
+def test_server_errors_are_not_stored():
+    client, calls = make_client(status=503)
+    post(client, {"a": 1})
+    post(client, {"a": 1})
+    assert len(calls) == 2
+
+
+def test_client_errors_are_replayed():
+    client, calls = make_client(status=400)
+    post(client, {"a": 1})
+    assert post(client, {"a": 1}).status_code == 400
+    assert len(calls) == 1
+
+
+def test_requests_without_key_or_on_other_routes_always_run():
+    client, calls = make_client()
+    post(client, {"a": 1}, key=None)
+    post(client, {"a": 1}, key=None)
+    post(client, {"a": 1}, path="/api/py/signin")
+    post(client, {"a": 1}, path="/api/py/signin")
+    assert len(calls) == 4
+
+
+def test_oversized_key_is_rejected():
+    client, calls = make_client()
+    assert post(client, {"a": 1}, key="x" * (idempotency.MAX_KEY_LENGTH + 1)).status_code == 400
+    assert calls == []
+
+
+def test_in_flight_duplicate_gets_409():
+    store = Store()
+    client, calls = make_client(store=store)
+    body = b'{"a": 1}'
+    store.begin(("/api/py/state", "busy"), hashlib.sha256(body).hexdigest())
+    res = client.post("/api/py/state", content=body,
+                      headers={"Idempotency-Key": "busy", "Content-Type": "application/json"})
+    assert res.status_code == 409
+    assert res.headers["retry-after"] == "1"
+    assert calls == []
+
+
+def test_abandoned_attempt_frees_the_key():
+    store = Store()
+    key = ("/api/py/state", "k1")
+    _, entry = store.begin(key, "fp")
+    store.abandon(key, entry)
+    assert store.begin(key, "fp")[0] == "new"
+
+
+def test_expired_keys_start_over():
+    store = Store(ttl=-1)
+    key = ("/api/py/state", "k1")
+    _, entry = store.begin(key, "fp")
+    store.complete(key, entry, 200, [], b"{}")
+    assert store.begin(key, "fp")[0] == "new"
+
+
+def test_oldest_keys_are_evicted():
+    store = Store(max_keys=2)
+    for n in range(3):
+        store.begin(("/api/py/state", str(n)), "fp")
+    assert len(store) == 2
+    assert store.begin(("/api/py/state", "0"), "fp")[0] == "new"
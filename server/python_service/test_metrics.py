@@ -0,0 +1,55 @@
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+import metrics
+
+
+class ShortCircuit:
+    """Stands in for shedding / idempotent replay: answers before the router runs."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and dict(scope["headers"]).get(b"x-shed"):
+            await JSONResponse({"detail": "busy"}, status_code=503)(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+def app_with_metrics() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/items/{item_id}")
+    def item(item_id: str):
+        return {"id": item_id}
+
+    app.add_middleware(ShortCircuit)
+    metrics.install(app)
+    return app
+
+
+def requests_for(route: str, status: str) -> float:
+    return metrics.http_requests.value(route, "GET", status)
+
+
+def test_routed_requests_use_the_template():
+    client = TestClient(app_with_metrics())
+    before = requests_for("/api/items/{item_id}", "200")
+    client.get("/api/items/42")
+    assert requests_for("/api/items/{item_id}", "200") == before + 1
+
+
+def test_short_circuited_requests_keep_their_route():
+    client = TestClient(app_with_metrics())
+    before = requests_for("/api/items/{item_id}", "503")
+    assert client.get("/api/items/42", headers={"x-shed": "1"}).status_code == 503
+    assert requests_for("/api/items/{item_id}", "503") == before + 1
+
+
+def test_unknown_paths_are_unmatched():
+    client = TestClient(app_with_metrics())
+    before = requests_for("unmatched", "404")
+    client.get("/nope")
+    assert requests_for("unmatched", "404") == before + 1
@@ -0,0 +1,69 @@
+import hashlib
+import re
+
+import migrate
+
+
+def test_splits_on_top_level_semicolons():
+    assert migrate.statements("SELECT 1; SELECT 2;\n") == ["SELECT 1", "SELECT 2"]
+
+
+def test_semicolons_inside_quotes_are_kept():
+    sql = "INSERT INTO t VALUES ('a;b', 'it''s; fine'); SELECT \"odd;name\" FROM t"
+    assert migrate.statements(sql) == ["INSERT INTO t VALUES ('a;b', 'it''s; fine')",
+                                       'SELECT "odd;name" FROM t']
+
+
+def test_dollar_quoted_bodies_are_one_statement():
+    sql = ("CREATE FUNCTION f() RETURNS int AS $$ BEGIN PERFORM 1; RETURN 2; END $$ LANGUAGE plpgsql;\n"
+           "DO $body$ BEGIN RAISE NOTICE '$$;'; END $body$;")
+    out = migrate.statements(sql)
+    assert len(out) == 2
+    assert out[0].endswith("LANGUAGE plpgsql") and out[1].startswith("DO $body$")
+
+
+def test_comments_do_not_split_or_count_as_statements():
+    sql = "-- a comment; with a semicolon\nSELECT 1; /* block; comment */ SELECT 2;\n-- trailing only\n"
+    out = migrate.statements(sql)
+    assert len(out) == 2
+    assert out[0].endswith("SELECT 1") and out[1].endswith("SELECT 2")
+
+
+def test_unterminated_quote_swallows_the_rest():
+    assert migrate.statements("SELECT 'oops; SELECT 2") == ["SELECT 'oops; SELECT 2"]
+
+
+def migration(version, checksum="c"):
+    return migrate.Migration(version, "", checksum, True)
+
+
+def test_plan_separates_pending_and_changed():
+    migrations = [migration("016_a", "x"), migration("017_b", "y"), migration("018_c", "z")]
+    pending, changed = migrate.plan(migrations, {"016_a": "x", "017_b": "edited"})
+    assert [m.version for m in pending] == ["018_c"]
+    assert [m.version for m in changed] == ["017_b"]
+
+
+def test_plan_with_everything_applied_is_empty():
+    migrations = [migration("016_a", "x")]
+    assert migrate.plan(migrations, {"016_a": "x", "015_old": "w"}) == ([], [])
+
+
+def test_discover_orders_checksums_and_flags_no_transaction(tmp_path):
+    (tmp_path / "002_index.sql").write_text("-- migrate: no-transaction\nCREATE INDEX CONCURRENTLY i ON t (c);\n")
+    (tmp_path / "001_init.sql").write_bytes(b"CREATE TABLE t (c int);\r\n")
+    (tmp_path / "notes.sql").write_text("ignored")
+    (tmp_path / "003_draft.sql.bak").write_text("ignored")
+    found = migrate.discover(str(tmp_path))
+    assert [m.version for m in found] == ["001_init", "002_index"]
+    assert found[0].sql == "CREATE TABLE t (c int);\n"  # CRLF normalised before hashing
+    assert found[0].checksum == hashlib.sha256(b"CREATE TABLE t (c int);\n").hexdigest()
+    assert found[0].transactional and not found[1].transactional
+
+
+def test_repo_no_transaction_migrations_split_into_index_builds():
+    for m in migrate.discover():
+        if m.transactional:
+            continue
+        for statement in migrate.statements(m.sql):
+            assert migrate._CONCURRENT_INDEX.search(re.sub(r"--[^\n]*", "", statement)), statement
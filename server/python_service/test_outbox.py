@@ -0,0 +1,147 @@
+from types import SimpleNamespace
+
+import pytest
+
+import outbox
+
+
+class Query:
+    """Just enough of the postgrest builder: records filters, answers on execute()."""
+
+    def __init__(self, client, table, op, value=None):
+        self.client, self.table, self.op, self.value = client, table, op, value
+        self.filters = {}
+
+    def in_(self, column, values):
+        self.filters[column] = list(values)
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def execute(self):
+        return self.client.run(self)
+
+
+class FakeClient:
+    def __init__(self, claimed=(), existing=(), bad_rows=()):
+        self.claimed = list(claimed)
+        self.existing = set(existing)  # user_ids that already have a role row
+        self.bad_rows = set(bad_rows)  # user_ids whose insert fails
+        self.inserted, self.updates = [], []
+
+    def rpc(self, name, args):
+        assert name == "claim_signup_outbox"
+        return Query(self, "signup_outbox", "claim")
+
+    def table(self, name):
+        return SimpleNamespace(
+            select=lambda *a, **k: Query(self, name, "select"),
+            insert=lambda rows: Query(self, name, "insert", rows if isinstance(rows, list) else [rows]),
+            update=lambda values: Query(self, name, "update", values),
+        )
+
+    def run(self, q):
+        if q.op == "claim":
+            rows, self.claimed = self.claimed, []
+            return SimpleNamespace(data=rows)
+        if q.op == "select":
+            return SimpleNamespace(data=[{"user_id": u} for u in q.filters["user_id"] if u in self.existing])
+        if q.op == "insert":
+            if any(r.get("user_id") in self.bad_rows for r in q.value):
+                raise ValueError("insert rejected")
+            self.inserted.extend((q.table, r) for r in q.value)
+            return SimpleNamespace(data=q.value)
+        self.updates.append((q.value, q.filters))
+        return SimpleNamespace(data=[])
+
+
+def claimed(id, name="insert_row", attempts=1, user_id=None, table="teachers"):
+    return {"id": id, "task": name, "attempts": attempts,
+            "payload": {"table": table, "row": {"user_id": user_id or f"u{id}"}}}
+
+
+@pytest.fixture
+def calls():
+    """A throwaway handler that fails the ids in `fail`."""
+    seen, fail = [], {}
+
+    @outbox.handler("test_task")
+    def run(client, rows):
+        seen.extend(rows)
+        return {r["id"]: fail[r["id"]] for r in rows if r["id"] in fail}
+
+    yield SimpleNamespace(seen=seen, fail=fail)
+    outbox._handlers.pop("test_task", None)
+
+
+def test_batch_marks_successes_done_in_one_update(calls):
+    client = FakeClient(claimed=[claimed(1, "test_task"), claimed(2, "test_task")])
+    assert outbox.Worker().process_batch(client) == 2
+    assert len(calls.seen) == 2
+    [(values, filters)] = client.updates
+    assert values["status"] == "done" and filters == {"id": [1, 2]}
+
+
+def test_empty_claim_does_nothing():
+    client = FakeClient()
+    assert outbox.Worker().process_batch(client) == 0
+    assert client.updates == []
+
+
+def test_failed_task_is_rescheduled_with_backoff(calls):
+    calls.fail[2] = "boom"
+    client = FakeClient(claimed=[claimed(1, "test_task"), claimed(2, "test_task", attempts=3)])
+    outbox.Worker().process_batch(client)
+    retry = [(v, f) for v, f in client.updates if f == {"id": 2}]
+    [(values, _)] = retry
+    assert values["last_error"] == "boom" and "available_at" in values and "status" not in values
+    done = [f for v, f in client.updates if v.get("status") == "done"]
+    assert done == [{"id": [1]}]
+
+
+def test_task_is_dead_after_max_attempts(calls, monkeypatch):
+    monkeypatch.setattr(outbox, "MAX_ATTEMPTS", 3)
+    calls.fail[1] = "still broken"
+    client = FakeClient(claimed=[claimed(1, "test_task", attempts=3)])
+    outbox.Worker().process_batch(client)
+    [(values, filters)] = client.updates
+    assert values["status"] == "dead" and filters == {"id": 1}
+
+
+def test_unknown_task_is_rescheduled():
+    client = FakeClient(claimed=[claimed(1, "no_such_task")])
+    outbox.Worker().process_batch(client)
+    [(values, _)] = client.updates
+    assert "no handler" in values["last_error"]
+
+
+def test_handler_exception_fails_the_whole_group(monkeypatch):
+    def explode(client, rows):
+        raise RuntimeError("handler crashed")
+    monkeypatch.setitem(outbox._handlers, "test_task", explode)
+    client = FakeClient(claimed=[claimed(1, "test_task"), claimed(2, "test_task")])
+    outbox.Worker().process_batch(client)
+    assert sorted(f["id"] for v, f in client.updates) == [1, 2]
+    assert all(v["last_error"] == "handler crashed" for v, _ in client.updates)
+
+
+def test_insert_rows_skips_rows_already_applied():
+    client = FakeClient(existing={"u1"})
+    assert outbox.insert_rows(client, [claimed(1), claimed(2)]) == {}
+    assert client.inserted == [("teachers", {"user_id": "u2"})]
+
+
+def test_insert_rows_isolates_the_bad_row():
+    client = FakeClient(bad_rows={"u2"})
+    failed = outbox.insert_rows(client, [claimed(1), claimed(2), claimed(3)])
+    assert list(failed) == [2]
+    assert sorted(r["user_id"] for _, r in client.inserted) == ["u1", "u3"]
+
+
+def test_run_inline_runs_every_task_and_swallows_failures():
+    client = FakeClient(bad_rows={"u2"})
+    outbox.run_inline(client, [outbox.task("insert_row", table="students", row={"user_id": "u1"}),
+                               outbox.task("insert_row", table="teachers", row={"user_id": "u2"})])
+    assert client.inserted == [("students", {"user_id": "u1"})]
@@ -0,0 +1,134 @@
+import time
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, UpstreamUnavailable
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def _half_open(breaker: CircuitBreaker) -> None:
+    _open(breaker)
+    breaker._opened_at = time.monotonic() - breaker.reset_timeout
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker("t", failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("t", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=60)
+    _half_open(breaker)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_probe_success_closes_and_failure_reopens():
+    breaker = CircuitBreaker("t", failure_threshold=5, reset_timeout=60)
+    _half_open(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    _half_open(breaker)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_fails_fast_without_calling():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=60)
+    _open(breaker)
+    calls = []
+    with pytest.raises(CircuitOpen):
+        resilience.call("users.select", lambda: calls.append(1), idempotent=True, breaker=breaker)
+    assert calls == []
+
+
+def test_exhausted_budget_does_not_strand_half_open_probe():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=60)
+    _half_open(breaker)
+    with resilience.request_budget(0):
+        with pytest.raises(DeadlineExceeded):
+            resilience.call("users.select", lambda: "ok", idempotent=True, breaker=breaker)
+    # the probe is still available to the next request
+    assert resilience.call("users.select", lambda: "ok", idempotent=True, breaker=breaker) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_transient_reads_are_retried(monkeypatch):
+    monkeypatch.setattr(resilience, "_backoff", lambda attempt: 0)
+    breaker = CircuitBreaker("t", failure_threshold=10, reset_timeout=60)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert resilience.call("users.select", flaky, idempotent=True, hedge=False, breaker=breaker) == "ok"
+    assert len(attempts) == 3
+
+
+def test_writes_are_not_retried():
+    breaker = CircuitBreaker("t", failure_threshold=10, reset_timeout=60)
+    attempts = []
+
+    def fail():
+        attempts.append(1)
+        raise ConnectionError("reset")
+
+    with pytest.raises(UpstreamUnavailable):
+        resilience.call("users.insert", fail, breaker=breaker)
+    assert len(attempts) == 1
+
+
+def test_application_errors_pass_through_and_count_as_healthy():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=60)
+
+    def conflict():
+        raise ValueError("duplicate key")
+
+    with pytest.raises(ValueError):
+        resilience.call("users.insert", conflict, breaker=breaker)
+    assert breaker.state == "closed"
+
+
+def test_slow_call_hits_call_deadline(monkeypatch):
+    monkeypatch.setattr(resilience, "CALL_TIMEOUT_S", 0.05)
+    breaker = CircuitBreaker("t", failure_threshold=10, reset_timeout=60)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        resilience.call("users.insert", lambda: time.sleep(0.5), breaker=breaker)
+    assert time.monotonic() - started < 0.4
+
+
+def test_is_transient():
+    class ApiError(Exception):
+        def __init__(self, code):
+            self.code = code
+
+    assert resilience.is_transient(ConnectionError())
+    assert resilience.is_transient(ApiError("503"))
+    assert not resilience.is_transient(ApiError("23505"))
+    assert not resilience.is_transient(ApiError("404"))
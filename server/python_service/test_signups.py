@@ -3,7 +3,9 @@ import time
 import uuid
 from dotenv import load_dotenv
 from supabase import create_client
+from psycopg2.extras import RealDictCursor
 from setup_tables import setup_tables
+import db
 
 
 def load_env():
@@ -50,23 +52,15 @@ def run():
     except Exception as e:
         print('Supabase insert failed for initial org_codes, attempting fallback DB inserts:', e)
         try:
-            import psycopg2
-            from psycopg2.extras import RealDictCursor
-            from dotenv import load_dotenv as _load_env
-            _load_env(os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
-            conn_str = os.environ.get('DATABASE_URL')
-            if not conn_str:
-                raise RuntimeError('DATABASE_URL not configured for fallback')
-            with psycopg2.connect(conn_str) as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    if inst_code:
-                        cur.execute("INSERT INTO org_codes (code, type, institute_id) VALUES (%s, %s, %s) RETURNING *;", (inst_code, 'institution', 'INST_TEST'))
-                        row = cur.fetchone()
-                        print('Fallback inst_code insert succeeded:', bool(row), 'code:', inst_code)
-                    if school_code:
-                        cur.execute("INSERT INTO org_codes (code, type, institute_id) VALUES (%s, %s, %s) RETURNING *;", (school_code, 'school', 'INST_TEST_SCHOOL'))
-                        row = cur.fetchone()
-                        print('Fallback school_code insert succeeded:', bool(row), 'code:', school_code)
+            with db.transaction(cursor_factory=RealDictCursor) as cur:
+                if inst_code:
+                    cur.execute("INSERT INTO org_codes (code, type, institute_id) VALUES (%s, %s, %s) RETURNING *;", (inst_code, 'institution', 'INST_TEST'))
+                    row = cur.fetchone()
+                    print('Fallback inst_code insert succeeded:', bool(row), 'code:', inst_code)
+                if school_code:
+                    cur.execute("INSERT INTO org_codes (code, type, institute_id) VALUES (%s, %s, %s) RETURNING *;", (school_code, 'school', 'INST_TEST_SCHOOL'))
+                    row = cur.fetchone()
+                    print('Fallback school_code insert succeeded:', bool(row), 'code:', school_code)
         except Exception as e2:
             print('Fallback DB insert failed for org_codes:', e2)
 
@@ -125,14 +119,8 @@ def run():
                 except Exception as e:
                     print('Supabase insert failed for teachers, falling back to DB insert:', e)
                     try:
-                        import psycopg2
-                        from psycopg2.extras import RealDictCursor
-                        from dotenv import load_dotenv as _load_env
-                        _load_env(os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
-                        conn_str = os.environ.get('DATABASE_URL')
-                        with psycopg2.connect(conn_str) as conn:
-                            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                                cur.execute("INSERT INTO teachers (user_id, title, department, institute_id) VALUES (%s,%s,%s,%s)", (user_id, 'Teacher', 'Test Dept', 'INST_TEST'))
+                        with db.transaction(cursor_factory=RealDictCursor) as cur:
+                            cur.execute("INSERT INTO teachers (user_id, title, department, institute_id) VALUES (%s,%s,%s,%s)", (user_id, 'Teacher', 'Test Dept', 'INST_TEST'))
                     except Exception as e2:
                         print('Fallback insert into teachers failed:', e2)
             if role == 'Student':
@@ -148,14 +136,8 @@ def run():
                 except Exception as e:
                     print('Supabase insert failed for students, falling back to DB insert:', e)
                     try:
-                        import psycopg2
-                        from psycopg2.extras import RealDictCursor
-                        from dotenv import load_dotenv as _load_env
-                        _load_env(os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
-                        conn_str = os.environ.get('DATABASE_URL')
-                        with psycopg2.connect(conn_str) as conn:
-                            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                                cur.execute("INSERT INTO students (user_id, roll_number, class_id, institute_id) VALUES (%s,%s,%s,%s)", (user_id, 'R-100', 'C-1', 'INST_TEST'))
+                        with db.transaction(cursor_factory=RealDictCursor) as cur:
+                            cur.execute("INSERT INTO students (user_id, roll_number, class_id, institute_id) VALUES (%s,%s,%s,%s)", (user_id, 'R-100', 'C-1', 'INST_TEST'))
                     except Exception as e2:
                         print('Fallback insert into students failed:', e2)
             if role == 'Parent':
@@ -170,14 +152,8 @@ def run():
                 except Exception as e:
                     print('Supabase insert failed for parents, falling back to DB insert:', e)
                     try:
-                        import psycopg2
-                        from psycopg2.extras import RealDictCursor
-                        from dotenv import load_dotenv as _load_env
-                        _load_env(os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
-                        conn_str = os.environ.get('DATABASE_URL')
-                        with psycopg2.connect(conn_str) as conn:
-                            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                                cur.execute("INSERT INTO parents (user_id, child_ids, institute_id) VALUES (%s,%s,%s)", (user_id, [], 'INST_TEST'))
+                        with db.transaction(cursor_factory=RealDictCursor) as cur:
+                            cur.execute("INSERT INTO parents (user_id, child_ids, institute_id) VALUES (%s,%s,%s)", (user_id, [], 'INST_TEST'))
                     except Exception as e2:
                         print('Fallback insert into parents failed:', e2)
 
@@ -225,19 +201,13 @@ def run():
                     except Exception as e:
                         print('Supabase insert failed for role table (admin-created user), falling back to DB insert:', e)
                         try:
-                            import psycopg2
-                            from psycopg2.extras import RealDictCursor
-                            from dotenv import load_dotenv as _load_env
-                            _load_env(os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
-                            conn_str = os.environ.get('DATABASE_URL')
-                            with psycopg2.connect(conn_str) as conn:
-                                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                                    if role == 'Teacher':
-                                        cur.execute("INSERT INTO teachers (user_id, title, department, institute_id) VALUES (%s,%s,%s,%s)", (uid, 'Teacher', 'Test Dept', 'INST_TEST'))
-                                    if role == 'Student':
-                                        cur.execute("INSERT INTO students (user_id, roll_number, class_id, institute_id) VALUES (%s,%s,%s,%s)", (uid, 'R-100', 'C-1', 'INST_TEST'))
-                                    if role == 'Parent':
-                                        cur.execute("INSERT INTO parents (user_id, child_ids, institute_id) VALUES (%s,%s,%s)", (uid, [], 'INST_TEST'))
+                            with db.transaction(cursor_factory=RealDictCursor) as cur:
+                                if role == 'Teacher':
+                                    cur.execute("INSERT INTO teachers (user_id, title, department, institute_id) VALUES (%s,%s,%s,%s)", (uid, 'Teacher', 'Test Dept', 'INST_TEST'))
+                                if role == 'Student':
+                                    cur.execute("INSERT INTO students (user_id, roll_number, class_id, institute_id) VALUES (%s,%s,%s,%s)", (uid, 'R-100', 'C-1', 'INST_TEST'))
+                                if role == 'Parent':
+                                    cur.execute("INSERT INTO parents (user_id, child_ids, institute_id) VALUES (%s,%s,%s)", (uid, [], 'INST_TEST'))
                         except Exception as e2:
                             print('Fallback insert into role table failed for admin-created user:', e2)
                     created.append({'role': role, 'email': email, 'password': password, 'id': uid})
@@ -310,18 +280,10 @@ def run():
         print('Supabase insert failed for org_codes, attempting direct DB fallback:', e)
         # Fallback: use DATABASE_URL to insert directly
         try:
-            import psycopg2
-            from psycopg2.extras import RealDictCursor
-            from dotenv import load_dotenv as _load_env
-            _load_env(os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
-            conn_str = os.environ.get('DATABASE_URL')
-            if not conn_str:
-                raise RuntimeError('DATABASE_URL not configured for fallback')
-            with psycopg2.connect(conn_str) as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute("INSERT INTO org_codes (code, type, institute_id) VALUES (%s, %s, %s) RETURNING *;", (code, 'institution', 'INST_TEST'))
-                    row = cur.fetchone()
-                    print('Fallback insert succeeded:', bool(row), 'code:', code)
+            with db.transaction(cursor_factory=RealDictCursor) as cur:
+                cur.execute("INSERT INTO org_codes (code, type, institute_id) VALUES (%s, %s, %s) RETURNING *;", (code, 'institution', 'INST_TEST'))
+                row = cur.fetchone()
+                print('Fallback insert succeeded:', bool(row), 'code:', code)
         except Exception as e2:
             print('Fallback DB insert failed for org_codes:', e2)
 
@@ -0,0 +1,126 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import throttle
+
+
+def request(ip="10.0.0.1", forwarded=None):
+    headers = {"x-forwarded-for": forwarded} if forwarded else {}
+    return SimpleNamespace(headers=headers, client=SimpleNamespace(host=ip))
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    monkeypatch.setattr(throttle, "buckets", throttle.MemoryBuckets())
+    monkeypatch.setattr(throttle, "EMAIL_BURST", 2.0)
+    monkeypatch.setattr(throttle, "EMAIL_PER_MIN", 60.0)
+    monkeypatch.setattr(throttle, "IP_BURST", 100.0)
+
+
+def test_take_spends_a_token_or_reports_the_wait():
+    assert throttle._take(2.0, 5, 1.0) == (1.0, 0.0)
+    assert throttle._take(0.5, 5, 2.0) == (0.5, 0.25)
+
+
+def test_refill_is_capped_at_burst():
+    assert throttle._refill(0.0, 100.0, 101.0, 5, 2.0) == 2.0
+    assert throttle._refill(4.0, 100.0, 200.0, 5, 2.0) == 5
+
+
+@pytest.mark.parametrize("make", [lambda tmp: throttle.MemoryBuckets(),
+                                  lambda tmp: throttle.SqliteBuckets(str(tmp / "t.sqlite"))])
+def test_buckets_allow_burst_then_refill(tmp_path, make):
+    b = make(tmp_path)
+    assert [b.take("k", 2, 1.0, 100.0) for _ in range(3)] == [0.0, 0.0, 1.0]
+    assert b.take("other", 2, 1.0, 100.0) == 0.0
+    assert b.take("k", 2, 1.0, 101.0) == 0.0
+
+
+def test_sqlite_buckets_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "t.sqlite")
+    a, b = throttle.SqliteBuckets(path), throttle.SqliteBuckets(path)
+    a.take("k", 1, 1.0, 100.0)
+    assert b.take("k", 1, 1.0, 100.0) > 0
+
+
+def test_memory_buckets_forget_oldest_keys():
+    b = throttle.MemoryBuckets(max_keys=2)
+    for key in "abc":
+        b.take(key, 1, 1.0, 100.0)
+    assert b.take("a", 1, 1.0, 100.0) == 0.0  # evicted, starts full again
+
+
+@pytest.mark.parametrize("make", [
+    lambda tmp: throttle.MemorySlots(2),
+    pytest.param(lambda tmp: throttle.FileSlots(str(tmp / "t"), 2),
+                 marks=pytest.mark.skipif(throttle.fcntl is None, reason="no flock on this platform")),
+])
+def test_slots_cap_concurrency(tmp_path, make):
+    s = make(tmp_path)
+    first, second = s.try_acquire(), s.try_acquire()
+    assert first is not None and second is not None
+    assert s.try_acquire() is None and s.held() == 2
+    s.release(first)
+    assert s.try_acquire() is not None
+
+
+def test_check_signin_rejects_after_email_burst(memory):
+    before = throttle.rejections_total.value("email")
+    throttle.check_signin(request(), "Ada@Example.com")
+    throttle.check_signin(request(ip="10.0.0.2"), " ada@example.com ")
+    with pytest.raises(HTTPException) as exc:
+        throttle.check_signin(request(ip="10.0.0.3"), "ada@example.com")
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "1"
+    assert throttle.rejections_total.value("email") == before + 1
+
+
+def test_check_signin_rejects_after_ip_burst(memory, monkeypatch):
+    monkeypatch.setattr(throttle, "IP_BURST", 1.0)
+    throttle.check_signin(request(), "a@example.com")
+    with pytest.raises(HTTPException) as exc:
+        throttle.check_signin(request(), "b@example.com")
+    assert exc.value.status_code == 429
+
+
+def test_check_signin_fails_open_on_store_errors(monkeypatch):
+    def broken(*args):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(throttle, "buckets", SimpleNamespace(take=broken))
+    before = throttle.store_errors_total.value()
+    throttle.check_signin(request(), "a@example.com")
+    assert throttle.store_errors_total.value() == before + 1
+
+
+def test_auth_slot_is_503_when_busy(monkeypatch):
+    monkeypatch.setattr(throttle, "slots", throttle.MemorySlots(1))
+    monkeypatch.setattr(throttle, "AUTH_WAIT_S", 0.02)
+    with throttle.auth_slot():
+        with pytest.raises(HTTPException) as exc:
+            with throttle.auth_slot():
+                pass
+    assert exc.value.status_code == 503 and exc.value.headers["Retry-After"] == "1"
+    assert throttle.slots.held() == 0
+
+
+def test_auth_slot_is_released_on_error(monkeypatch):
+    monkeypatch.setattr(throttle, "slots", throttle.MemorySlots(1))
+    with pytest.raises(RuntimeError):
+        with throttle.auth_slot():
+            raise RuntimeError("auth failed")
+    assert throttle.slots.held() == 0
+
+
+def test_client_ip_ignores_forwarded_for_without_proxy(monkeypatch):
+    monkeypatch.setattr(throttle, "PROXY_HOPS", 0)
+    assert throttle.client_ip(request(ip="10.0.0.9", forwarded="1.2.3.4")) == "10.0.0.9"
+
+
+def test_client_ip_counts_trusted_hops_from_the_right(monkeypatch):
+    monkeypatch.setattr(throttle, "PROXY_HOPS", 1)
+    # the client can prepend anything; only the entry our proxy appended is trusted
+    assert throttle.client_ip(request(forwarded="6.6.6.6, 1.2.3.4")) == "1.2.3.4"
+    assert throttle.client_ip(request(ip="10.0.0.9")) == "10.0.0.9"
@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import worker_pool
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(worker_pool, "stats", worker_pool.PoolStats())
+
+
+def fake_limiter(monkeypatch, waiting: int, threads: int):
+    limiter = SimpleNamespace(total_tokens=threads, borrowed_tokens=threads,
+                              statistics=lambda: SimpleNamespace(tasks_waiting=waiting))
+    monkeypatch.setattr(worker_pool, "_limiter", lambda: limiter)
+
+
+def test_no_queue_means_no_wait(monkeypatch):
+    fake_limiter(monkeypatch, waiting=0, threads=4)
+    worker_pool.stats.wait_ewma = 3.0
+    assert worker_pool.estimated_wait() == 0.0
+
+
+def test_wait_is_queue_drained_by_pool(monkeypatch):
+    fake_limiter(monkeypatch, waiting=8, threads=4)
+    worker_pool.stats.service_ewma = 0.5
+    assert worker_pool.estimated_wait() == pytest.approx(1.0)
+
+
+def test_observed_wait_wins_when_worse(monkeypatch):
+    fake_limiter(monkeypatch, waiting=1, threads=4)
+    worker_pool.stats.service_ewma = 0.1
+    worker_pool.stats.wait_ewma = 2.0
+    assert worker_pool.estimated_wait() == 2.0
+
+
+def test_ewma_tracks_observations():
+    stats = worker_pool.PoolStats()
+    for _ in range(50):
+        stats.observe_wait(1.0)
+    assert stats.wait_ewma == pytest.approx(1.0, abs=1e-3)
+    assert stats.started == 50 and stats.wait_max == 1.0
+
+
+def pooled_app() -> FastAPI:
+    app = FastAPI()
+    app.router.route_class = worker_pool.PooledRoute
+    worker_pool.install(app)
+
+    @app.get("/")
+    def root():
+        return {"ok": True}
+
+    @app.get("/work")
+    def work():
+        return {"ok": True}
+
+    return app
+
+
+def test_sheds_with_retry_after_when_wait_too_long(monkeypatch):
+    monkeypatch.setattr(worker_pool, "SHED_QUEUE_WAIT_S", 1.0)
+    monkeypatch.setattr(worker_pool, "estimated_wait", lambda: 2.5)
+    client = TestClient(pooled_app())
+    res = client.get("/work")
+    assert res.status_code == 503
+    assert res.headers["retry-after"] == "3"
+    assert worker_pool.stats.shed == 1
+
+
+def test_exempt_paths_are_never_shed(monkeypatch):
+    monkeypatch.setattr(worker_pool, "SHED_QUEUE_WAIT_S", 1.0)
+    monkeypatch.setattr(worker_pool, "estimated_wait", lambda: 10.0)
+    client = TestClient(pooled_app())
+    assert client.get("/").status_code == 200
+    assert worker_pool.stats.shed == 0
+
+
+def test_admitted_requests_record_wait_and_service(monkeypatch):
+    monkeypatch.setattr(worker_pool, "estimated_wait", lambda: 0.0)
+    client = TestClient(pooled_app())
+    assert client.get("/work").status_code == 200
+    assert worker_pool.stats.started == 1 and worker_pool.stats.completed == 1
+
+
+def test_shedding_disabled_at_zero(monkeypatch):
+    monkeypatch.setattr(worker_pool, "SHED_QUEUE_WAIT_S", 0.0)
+    monkeypatch.setattr(worker_pool, "estimated_wait", lambda: 10.0)
+    client = TestClient(pooled_app())
+    assert client.get("/work").status_code == 200
@@ -0,0 +1,259 @@
+"""
+Admission control for /api/py/signin, checked before any Supabase Auth call.
+
+  - a token bucket per account email: THROTTLE_EMAIL_BURST attempts (default 5),
+    refilled at THROTTLE_EMAIL_PER_MIN per minute (default 5)
+  - a token bucket per client IP: THROTTLE_IP_BURST (default 30) refilled at
+    THROTTLE_IP_PER_MIN (default 60)
+  - at most THROTTLE_AUTH_CONCURRENCY sign-ins talking to Auth at once
+    (default 16, 0 = no cap); a request waits up to THROTTLE_AUTH_WAIT_MS for a slot
+
+An empty bucket answers 429 and a full Auth cap 503, both with Retry-After, so
+credential stuffing or a client stuck in a retry loop costs neither Auth rate
+limit nor a worker blocked on the network.
+
+With THROTTLE_BACKEND=local (default) the limits hold across every uvicorn
+worker on the host: buckets live in a SQLite file (THROTTLE_DB, default
+<tmpdir>/edunexus-throttle.sqlite; keys are hashed, no email is written to
+disk) and the Auth slots are flock()ed files next to it, which the kernel frees
+if a worker dies holding one. THROTTLE_BACKEND=memory keeps everything per
+process, as does any platform without fcntl. If the store fails, requests are
+let through rather than locked out.
+
+The client IP is the socket peer; behind THROTTLE_PROXY_HOPS trusted proxies
+(Render: 1) it is taken from X-Forwarded-For that many entries from the right.
+"""
+
+import hashlib
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+import logs
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, fall back to per-process limits
+    fcntl = None
+
+log = logs.get_logger("throttle")
+
+BACKEND = os.environ.get("THROTTLE_BACKEND", "local").lower()
+DB_PATH = os.environ.get("THROTTLE_DB") or os.path.join(tempfile.gettempdir(), "edunexus-throttle.sqlite")
+EMAIL_BURST = float(os.environ.get("THROTTLE_EMAIL_BURST", "5"))
+EMAIL_PER_MIN = float(os.environ.get("THROTTLE_EMAIL_PER_MIN", "5"))
+IP_BURST = float(os.environ.get("THROTTLE_IP_BURST", "30"))
+IP_PER_MIN = float(os.environ.get("THROTTLE_IP_PER_MIN", "60"))
+AUTH_CONCURRENCY = int(os.environ.get("THROTTLE_AUTH_CONCURRENCY", "16"))
+AUTH_WAIT_S = float(os.environ.get("THROTTLE_AUTH_WAIT_MS", "2000")) / 1000.0
+PROXY_HOPS = int(os.environ.get("THROTTLE_PROXY_HOPS", "0"))
+
+MEMORY_KEYS = 100_000
+# rows idle this long have refilled completely and can be forgotten
+IDLE_S = 3600
+
+rejections_total = metrics.counter("edunexus_throttle_rejections_total",
+                                   "Sign-in attempts rejected before reaching Auth, by limit.", ("limit",))
+store_errors_total = metrics.counter("edunexus_throttle_store_errors_total",
+                                     "Throttle store failures (requests were let through).")
+
+
+def _refill(tokens: float, updated: float, now: float, burst: float, per_s: float) -> float:
+    return min(burst, tokens + (now - updated) * per_s)
+
+
+def _take(tokens: float, burst: float, per_s: float) -> Tuple[float, float]:
+    """(tokens left, seconds until the next token if none could be taken)."""
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / per_s if per_s > 0 else float(IDLE_S)
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys: int = MEMORY_KEYS):
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._max_keys = max_keys
+
+    def take(self, key: str, burst: float, per_s: float, now: float) -> float:
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens, wait = _take(_refill(tokens, updated, now, burst, per_s), burst, per_s)
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SqliteBuckets:
+    """Buckets shared by every process that opens the same file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conn()  # create the table up front
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=0.2, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, burst: float, per_s: float, now: float) -> float:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, wait = _take(_refill(*row, now, burst, per_s) if row else burst, burst, per_s)
+            conn.execute("INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                         "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                         (key, tokens, now))
+            if random.random() < 0.001:
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - IDLE_S,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class FileSlots:
+    """Counting semaphore across processes: slot i is held while its file is flock()ed."""
+
+    def __init__(self, path: str, size: int):
+        self._fds = [os.open(f"{path}.slot{i}", os.O_RDWR | os.O_CREAT, 0o600) for i in range(size)]
+        # flock() does not exclude threads sharing one descriptor, so each slot also has a thread lock
+        self._locks = [threading.Lock() for _ in range(size)]
+
+    def try_acquire(self) -> Optional[int]:
+        start = random.randrange(len(self._fds))
+        for n in range(len(self._fds)):
+            i = (start + n) % len(self._fds)
+            if not self._locks[i].acquire(blocking=False):
+                continue
+            try:
+                fcntl.flock(self._fds[i], fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._locks[i].release()
+                continue
+            return i
+        return None
+
+    def release(self, slot: int) -> None:
+        fcntl.flock(self._fds[slot], fcntl.LOCK_UN)
+        self._locks[slot].release()
+
+    def held(self) -> int:
+        return sum(lock.locked() for lock in self._locks)
+
+
+class MemorySlots:
+    def __init__(self, size: int):
+        self._lock = threading.Lock()
+        self._size = size
+        self._held = 0
+
+    def try_acquire(self) -> Optional[int]:
+        with self._lock:
+            if self._held >= self._size:
+                return None
+            self._held += 1
+            return 0
+
+    def release(self, slot: int) -> None:
+        with self._lock:
+            self._held -= 1
+
+    def held(self) -> int:
+        return self._held
+
+
+def _open_store():
+    if BACKEND == "local" and fcntl is not None:
+        try:
+            slots = FileSlots(DB_PATH, AUTH_CONCURRENCY) if AUTH_CONCURRENCY > 0 else None
+            return SqliteBuckets(DB_PATH), slots
+        except (OSError, sqlite3.Error) as e:
+            log.warning("throttle store unavailable, limits are per process", extra={"path": DB_PATH, "error": str(e)})
+    return MemoryBuckets(), MemorySlots(AUTH_CONCURRENCY) if AUTH_CONCURRENCY > 0 else None
+
+
+buckets, slots = _open_store()
+
+
+def client_ip(request) -> str:
+    if PROXY_HOPS > 0:
+        hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        if len(hops) >= PROXY_HOPS:
+            return hops[-PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+def _key(kind: str, value: str) -> str:
+    return kind + ":" + hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def _reject(limit: str, status: int, retry_after: float, detail: str) -> HTTPException:
+    rejections_total.inc(limit)
+    return HTTPException(status_code=status, detail=detail,
+                         headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+def check_signin(request, email: str) -> None:
+    """Spend one token from the email and IP buckets; raises 429 when either is empty."""
+    now = time.time()
+    checks = [("email", _key("email", email.strip().lower()), EMAIL_BURST, EMAIL_PER_MIN / 60.0),
+              ("ip", _key("ip", client_ip(request)), IP_BURST, IP_PER_MIN / 60.0)]
+    for limit, key, burst, per_s in checks:
+        if burst <= 0:
+            continue
+        try:
+            wait = buckets.take(key, burst, per_s, now)
+        except sqlite3.Error as e:
+            store_errors_total.inc()
+            log.warning("throttle store error, request let through", extra={"error": str(e)})
+            return
+        if wait > 0:
+            raise _reject(limit, 429, wait, "Too many sign-in attempts, please retry later")
+
+
+@contextmanager
+def auth_slot() -> Iterator[None]:
+    """Hold one of the AUTH_CONCURRENCY Auth slots; 503 if none frees up within AUTH_WAIT_S."""
+    if slots is None:
+        yield
+        return
+    deadline = time.monotonic() + AUTH_WAIT_S
+    slot = slots.try_acquire()
+    while slot is None:
+        if time.monotonic() >= deadline:
+            raise _reject("auth_concurrency", 503, 1, "Sign-in is busy, please retry")
+        time.sleep(0.01)
+        slot = slots.try_acquire()
+    try:
+        yield
+    finally:
+        slots.release(slot)
+
+
+def _gauges() -> List[str]:
+    return metrics.gauge_lines("edunexus_throttle_auth_slots_in_use",
+                               "Auth slots held by this process.", {"": slots.held() if slots else 0})
+
+
+def install(app) -> None:
+    metrics.register_gauges(_gauges)
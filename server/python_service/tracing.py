@@ -0,0 +1,299 @@
+"""
+Lightweight request tracing.
+
+Each HTTP request gets a trace (id taken from an incoming `traceparent` /
+`X-Trace-Id` header, or generated) and a root span; handlers open child spans
+per pipeline step with `tracing.span("signup.profile_insert")`, and every
+outbound Supabase call gets its own span from resilience.call(). The trace id
+is returned in the `X-Trace-Id` response header.
+
+Finished traces are
+  - written by a background thread to TRACE_EXPORT_FILE (JSON lines) and/or
+    POSTed as OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT (a collector or stand-in),
+  - dumped as an indented span tree when the request took longer than
+    TRACE_SLOW_MS.
+
+Outside a request `span()` is a no-op, so helpers can be traced unconditionally.
+"""
+
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+import logs
+
+log = logs.get_logger("tracing")
+
+SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", "1000"))
+EXPORT_FILE = os.environ.get("TRACE_EXPORT_FILE")
+OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT")
+SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "edunexus-python-service")
+
+_TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_TRACE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "start_ns", "end_ns", "_t0", "duration",
+                 "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: str = "internal", **attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._t0 = time.perf_counter()
+        self.duration = 0.0
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._t0
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        # spans finish on worker threads as well as on the event loop
+        with self._lock:
+            self.spans.append(span)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes):
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    s = Span(name, trace.trace_id, parent.span_id if parent else None, kind, **attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        status = getattr(e, "status_code", None)
+        s.error = f"{type(e).__name__}: {status}" if status else type(e).__name__
+        raise
+    finally:
+        s.finish()
+        _current_span.reset(token)
+        trace.add(s)
+
+
+# --- Export ---
+
+def _otlp_attributes(attrs: Dict) -> list:
+    out = []
+    for key, value in attrs.items():
+        if isinstance(value, bool):
+            out.append({"key": key, "value": {"boolValue": value}})
+        elif isinstance(value, int):
+            out.append({"key": key, "value": {"intValue": str(value)}})
+        elif isinstance(value, float):
+            out.append({"key": key, "value": {"doubleValue": value}})
+        else:
+            out.append({"key": key, "value": {"stringValue": str(value)}})
+    return out
+
+
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+def to_otlp(traces: List[Trace]) -> dict:
+    spans = []
+    for trace in traces:
+        for s in trace.spans:
+            item = {
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": _OTLP_KINDS.get(s.kind, 1),
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                "attributes": _otlp_attributes(s.attributes),
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            }
+            if s.parent_id:
+                item["parentSpanId"] = s.parent_id
+            spans.append(item)
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+        "scopeSpans": [{"scope": {"name": "edunexus.tracing"}, "spans": spans}],
+    }]}
+
+
+class Exporter:
+    """Background exporter; request threads only enqueue, never do export I/O."""
+
+    def __init__(self, path: Optional[str], otlp_endpoint: Optional[str], max_queue: int = 2000):
+        self.path = path
+        self.otlp_url = otlp_endpoint.rstrip("/") + "/v1/traces" if otlp_endpoint else None
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, trace: Trace) -> None:
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self, first: Trace, limit: int = 200) -> List[Trace]:
+        batch = [first]
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._drain(self._queue.get())
+            if self.path:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        for trace in batch:
+                            f.write(json.dumps({"trace_id": trace.trace_id,
+                                                "spans": [s.to_dict() for s in trace.spans]}) + "\n")
+                except Exception as e:
+                    log.warning("trace export to file failed", extra={"error": str(e)})
+            if self.otlp_url:
+                try:
+                    req = urllib.request.Request(
+                        self.otlp_url,
+                        data=json.dumps(to_otlp(batch)).encode("utf-8"),
+                        headers={"Content-Type": "application/json"},
+                        method="POST",
+                    )
+                    urllib.request.urlopen(req, timeout=5).close()
+                except Exception as e:
+                    log.warning("trace export to OTLP endpoint failed", extra={"error": str(e)})
+
+
+exporter: Optional[Exporter] = Exporter(EXPORT_FILE, OTLP_ENDPOINT) if (EXPORT_FILE or OTLP_ENDPOINT) else None
+
+
+def format_tree(trace: Trace) -> str:
+    ids = {s.span_id for s in trace.spans}
+    children: Dict[Optional[str], List[Span]] = {}
+    for s in trace.spans:
+        # a parent we don't hold (remote caller) makes the span a local root
+        children.setdefault(s.parent_id if s.parent_id in ids else None, []).append(s)
+    lines: List[str] = []
+
+    def walk(parent_id: Optional[str], depth: int) -> None:
+        for s in sorted(children.get(parent_id, []), key=lambda x: x.start_ns):
+            err = f"  [{s.error}]" if s.error else ""
+            lines.append(f"{'  ' * depth}{s.name}  {s.duration * 1000:.1f}ms{err}")
+            walk(s.span_id, depth + 1)
+
+    walk(None, 1)
+    return "\n".join(lines)
+
+
+def _incoming_context(headers: Dict[bytes, bytes]) -> Tuple[Optional[str], Optional[str]]:
+    """(trace_id, remote parent span id) from W3C traceparent or a bare X-Trace-Id."""
+    traceparent = headers.get(b"traceparent")
+    if traceparent:
+        m = _TRACEPARENT_RE.match(traceparent.decode("latin-1").strip().lower())
+        if m:
+            return m.group(1), m.group(2)
+    trace_id = headers.get(b"x-trace-id")
+    if trace_id:
+        value = trace_id.decode("latin-1").strip().lower()
+        if _TRACE_ID_RE.match(value):
+            return value, None
+    return None, None
+
+
+class TracingMiddleware:
+    """Plain ASGI middleware: opens the trace + root span and returns X-Trace-Id."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, remote_parent = _incoming_context(dict(scope.get("headers") or []))
+        trace = Trace(trace_id or secrets.token_hex(16))
+        root = Span(f"{scope.get('method', '')} {scope.get('path', '')}", trace.trace_id, remote_parent, "server",
+                    **{"http.method": scope.get("method", ""), "http.target": scope.get("path", "")})
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("http.status_code", message["status"])
+                headers = list(message.get("headers") or [])
+                headers.append((b"x-trace-id", trace.trace_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.error = type(e).__name__
+            raise
+        finally:
+            route = scope.get("route")
+            if getattr(route, "path", None):
+                root.set("http.route", route.path)
+            root.finish()
+            trace.add(root)
+            if exporter:
+                exporter.submit(trace)
+            if root.duration * 1000 >= SLOW_MS:
+                log.warning("slow request %s %.1fms\n%s", root.name, root.duration * 1000, format_tree(trace),
+                            extra={"duration_ms": round(root.duration * 1000, 1)})
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+
+
+def install(app) -> None:
+    app.add_middleware(TracingMiddleware)
@@ -0,0 +1,177 @@
+"""
+Start-up warm-up and the /ready readiness check.
+
+Right after a deploy the first requests would pay for new connections and an
+empty lookup cache. After the start-up hooks, a background thread
+  - opens WARMUP_CONNECTIONS (default 4) keep-alive connections in the admin
+    client's PostgREST pool with that many concurrent one-row selects, then
+  - preloads active org codes and institute / school names into the lookup
+    cache (cache.py), at most WARMUP_MAX_ROWS (default 5000) per table.
+
+GET /ready answers 503 until that is done and 200 afterwards; point the load
+balancer's health check at it. GET / stays the cheap liveness check. While
+Supabase is unreachable a step is retried until WARMUP_TIMEOUT_S (default 30);
+after that, or when a step fails for any other reason (a table that does not
+exist), the worker reports ready anyway, cold and with the error listed,
+rather than never taking traffic. WARMUP=0 skips the phase.
+
+Sign-in and signup create a fresh Auth client per request, so there is no Auth
+pool to warm.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+
+import cache
+import logs
+import metrics
+import resilience
+
+log = logs.get_logger("warmup")
+
+ENABLED = os.environ.get("WARMUP", "1") != "0"
+CONNECTIONS = int(os.environ.get("WARMUP_CONNECTIONS", "4"))
+MAX_ROWS = int(os.environ.get("WARMUP_MAX_ROWS", "5000"))
+TIMEOUT_S = float(os.environ.get("WARMUP_TIMEOUT_S", "30"))
+
+PAGE = 1000
+# org_names keys are "<table>:<id>", as looked up by python_signin
+ORG_NAME_TABLES = ("institutes", "schools")
+
+
+class State:
+    def __init__(self):
+        self.phase = "starting"
+        self.started = time.monotonic()
+        self.duration_s: Optional[float] = None
+        self.loaded: Dict[str, int] = {}
+        self.errors: List[str] = []
+
+    @property
+    def ready(self) -> bool:
+        return self.phase == "ready"
+
+    def finish(self) -> None:
+        self.duration_s = time.monotonic() - self.started
+        self.phase = "ready"
+
+    def as_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"ready": self.ready, "phase": self.phase}
+        if self.duration_s is not None:
+            out["warmup_ms"] = int(self.duration_s * 1000)
+        if self.loaded:
+            out["loaded"] = self.loaded
+        if self.errors:
+            out["errors"] = self.errors
+        return out
+
+
+state = State()
+
+
+def _rows(client, table: str, columns: str, active_only: bool = False) -> List[dict]:
+    """Up to MAX_ROWS rows of `table` in id order, a keyset page at a time."""
+    out: List[dict] = []
+    after = None
+    while len(out) < MAX_ROWS:
+        q = client.table(table).select(columns)
+        if active_only:
+            q = q.eq("is_active", True)
+        if after is not None:
+            q = q.gt("id", after)
+        page = resilience.call(f"{table}.select", q.order("id").limit(min(PAGE, MAX_ROWS - len(out))).execute,
+                               idempotent=True).data or []
+        out.extend(page)
+        if len(page) < PAGE:
+            break
+        after = page[-1]["id"]
+    return out
+
+
+def _open_connections(client) -> int:
+    def ping(_):
+        resilience.call("org_codes.select", client.table("org_codes").select("id").limit(1).execute, idempotent=True)
+
+    with ThreadPoolExecutor(max_workers=CONNECTIONS, thread_name_prefix="warmup") as pool:
+        list(pool.map(ping, range(CONNECTIONS)))
+    return CONNECTIONS
+
+
+def _org_codes(client) -> int:
+    return cache.namespace("org_codes").preload(
+        lambda: {r["code"]: r for r in _rows(client, "org_codes", "*", active_only=True)})
+
+
+def _org_names(client) -> int:
+    def load_all():
+        return {f"{table}:{r['id']}": r["name"] for table in ORG_NAME_TABLES
+                for r in _rows(client, table, "id, name")}
+    return cache.namespace("org_names").preload(load_all)
+
+
+STEPS: List[tuple] = [("connections", _open_connections), ("org_codes", _org_codes), ("org_names", _org_names)]
+
+
+def _run_step(name: str, fn: Callable[[Any], int], client, deadline: float) -> None:
+    delay = 0.5
+    while True:
+        try:
+            state.loaded[name] = fn(client)
+            return
+        except resilience.UpstreamUnavailable as e:
+            if time.monotonic() + delay >= deadline:
+                state.errors.append(f"{name}: {e}")
+                return
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+        except Exception as e:
+            state.errors.append(f"{name}: {e}")
+            return
+
+
+def run(client_getter: Callable[[], object]) -> None:
+    state.phase = "warming"
+    client = client_getter()
+    if client is None:
+        state.errors.append("Supabase not configured")
+    else:
+        deadline = state.started + TIMEOUT_S
+        for name, fn in STEPS:
+            _run_step(name, fn, client, deadline)
+    state.finish()
+    if state.errors:
+        log.warning("warm-up incomplete, serving cold", extra={"errors": state.errors, "loaded": state.loaded,
+                                                               "duration_ms": int(state.duration_s * 1000)})
+    else:
+        log.info("warm-up complete", extra={"loaded": state.loaded, "duration_ms": int(state.duration_s * 1000)})
+
+
+def start(client_getter: Callable[[], object]) -> None:
+    """Begin warming in the background; /ready turns 200 when it is done."""
+    state.started = time.monotonic()
+    if not ENABLED:
+        state.finish()
+        return
+    threading.Thread(target=run, args=(client_getter,), name="warmup", daemon=True).start()
+
+
+def _gauges() -> List[str]:
+    lines = metrics.gauge_lines("edunexus_ready", "1 once start-up warm-up has finished.", {"": int(state.ready)})
+    if state.duration_s is not None:
+        lines += metrics.gauge_lines("edunexus_warmup_seconds", "Duration of the start-up warm-up.",
+                                     {"": round(state.duration_s, 3)})
+    return lines
+
+
+def install(app) -> None:
+    metrics.register_gauges(_gauges)
+
+    # async on purpose: answers from the event loop even when every worker thread is busy
+    @app.get("/ready")
+    async def ready():
+        return JSONResponse(state.as_dict(), status_code=200 if state.ready else 503)
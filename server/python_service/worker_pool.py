@@ -0,0 +1,184 @@
+"""
+Thread-pool sizing, saturation gauges and admission control for sync endpoints.
+
+FastAPI runs plain `def` handlers on AnyIO's default thread limiter. This module
+  - sizes that limiter from PY_WORKER_THREADS at startup,
+  - measures how long requests wait for a worker thread and how long they hold it,
+  - sheds load with 503 + Retry-After when the estimated queue wait is above
+    PY_SHED_QUEUE_WAIT_MS, so bursts fail fast instead of timing out.
+
+Usage in main.py:
+    app.router.route_class = worker_pool.PooledRoute   # before any route is declared
+    worker_pool.install(app)
+"""
+
+import asyncio
+import functools
+import math
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+import anyio.to_thread
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+import logs
+import metrics
+import profiling
+
+log = logs.get_logger("worker_pool")
+
+POOL_THREADS = int(os.environ.get("PY_WORKER_THREADS", "40"))
+SHED_QUEUE_WAIT_S = float(os.environ.get("PY_SHED_QUEUE_WAIT_MS", "2000")) / 1000.0  # 0 disables shedding
+
+# Never shed these: liveness and monitoring must keep answering under load
+EXEMPT_PATHS = {"/", "/ready", "/api/py/pool-stats", "/metrics"}
+EXEMPT_PREFIXES = ("/api/py/admin/profile/",)  # profiling an overloaded worker is the point
+
+_EWMA_ALPHA = 0.2
+
+_arrived_at: ContextVar[Optional[float]] = ContextVar("pool_arrived_at", default=None)
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.completed = 0
+        self.shed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_ewma = 0.0
+        self.service_ewma = 0.0
+
+    def observe_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.started += 1
+            self.wait_total += seconds
+            if seconds > self.wait_max:
+                self.wait_max = seconds
+            self.wait_ewma += _EWMA_ALPHA * (seconds - self.wait_ewma)
+
+    def observe_service(self, seconds: float) -> None:
+        with self._lock:
+            self.completed += 1
+            self.service_ewma += _EWMA_ALPHA * (seconds - self.service_ewma)
+
+    def observe_shed(self) -> None:
+        with self._lock:
+            self.shed += 1
+
+
+stats = PoolStats()
+
+
+def _limiter():
+    return anyio.to_thread.current_default_thread_limiter()
+
+
+def tracked(fn):
+    """Wrap a sync endpoint so its queue wait and service time are recorded."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.monotonic()
+        arrived = _arrived_at.get()
+        if arrived is not None:
+            stats.observe_wait(started - arrived)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stats.observe_service(time.monotonic() - started)
+
+    return wrapper
+
+
+class PooledRoute(APIRoute):
+    """APIRoute that instruments every sync endpoint (they run on the thread pool)."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        if not asyncio.iscoroutinefunction(endpoint):
+            # profiling hooks in here so a per-request profile runs on the handler thread
+            endpoint = tracked(profiling.profiled(endpoint))
+        super().__init__(path, endpoint, **kwargs)
+
+
+def estimated_wait() -> float:
+    """Expected wait for a new arrival while jobs are queued.
+
+    Queue length drained at pool_size / service time, or the recently observed
+    wait if that is worse (it reacts before the service-time average warms up).
+    """
+    limiter = _limiter()
+    waiting = limiter.statistics().tasks_waiting
+    if not waiting:
+        return 0.0
+    drain = waiting * stats.service_ewma / max(1, limiter.total_tokens)
+    return max(drain, stats.wait_ewma)
+
+
+def snapshot() -> dict:
+    """Point-in-time gauges; call from the event loop (async endpoint or middleware)."""
+    limiter = _limiter()
+    with stats._lock:
+        started, completed, shed = stats.started, stats.completed, stats.shed
+        wait_total, wait_max = stats.wait_total, stats.wait_max
+        wait_ewma, service_ewma = stats.wait_ewma, stats.service_ewma
+    return {
+        "pool_size": limiter.total_tokens,
+        "active": limiter.borrowed_tokens,
+        "queued": limiter.statistics().tasks_waiting,
+        "started": started,
+        "completed": completed,
+        "shed": shed,
+        "queue_wait_avg_ms": round(wait_total / started * 1000, 3) if started else 0.0,
+        "queue_wait_ewma_ms": round(wait_ewma * 1000, 3),
+        "queue_wait_max_ms": round(wait_max * 1000, 3),
+        "service_time_ewma_ms": round(service_ewma * 1000, 3),
+        "estimated_wait_ms": round(estimated_wait() * 1000, 3),
+    }
+
+
+def _gauges() -> list:
+    snap = snapshot()
+    return (
+        metrics.gauge_lines("edunexus_pool_threads", "Configured worker threads for sync endpoints.", {"": snap["pool_size"]})
+        + metrics.gauge_lines("edunexus_pool_active", "Worker threads currently running a request.", {"": snap["active"]})
+        + metrics.gauge_lines("edunexus_pool_queued", "Requests waiting for a worker thread.", {"": snap["queued"]})
+        + metrics.gauge_lines("edunexus_pool_queue_wait_seconds", "Queue wait for a worker thread (EWMA and max).", {
+            '{stat="ewma"}': snap["queue_wait_ewma_ms"] / 1000,
+            '{stat="max"}': snap["queue_wait_max_ms"] / 1000,
+        })
+        + metrics.gauge_lines("edunexus_pool_shed_total", "Requests rejected by admission control.", {"": snap["shed"]}, kind="counter")
+    )
+
+
+def install(app) -> None:
+    metrics.register_gauges(_gauges)
+
+    @app.on_event("startup")
+    async def configure_thread_pool():
+        _limiter().total_tokens = POOL_THREADS
+        log.info("worker pool configured", extra={"threads": POOL_THREADS, "shed_queue_wait_ms": SHED_QUEUE_WAIT_S * 1000})
+
+    @app.middleware("http")
+    async def admission_control(request, call_next):
+        if SHED_QUEUE_WAIT_S > 0 and request.url.path not in EXEMPT_PATHS \
+                and not request.url.path.startswith(EXEMPT_PREFIXES):
+            wait = estimated_wait()
+            if wait > SHED_QUEUE_WAIT_S:
+                stats.observe_shed()
+                return JSONResponse(
+                    status_code=503,
+                    content={"detail": "Server busy, please retry"},
+                    headers={"Retry-After": str(max(1, math.ceil(wait)))},
+                )
+        _arrived_at.set(time.monotonic())
+        return await call_next(request)
+
+    @app.get("/api/py/pool-stats")
+    async def pool_stats():
+        return snapshot()
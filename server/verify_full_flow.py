@@ -3,6 +3,9 @@ import os
 import argparse
 import json
 import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
@@ -95,6 +98,125 @@ def verify_user(email: str, role: str):
         
     return results
 
+# --- Batch mode: a handful of IN (...) queries for thousands of accounts ---
+
+ROLE_TABLES = {"Management": "management_managers", "Teacher": "teachers", "Student": "students", "Parent": "parents"}
+STATUSES = {"pending", "approved", "rejected"}
+IN_CHUNK = 200  # values per IN (...) filter, keeps the PostgREST URL short
+PAGE = 1000
+WORKERS = 8
+
+def _chunks(values, size=IN_CHUNK):
+    values = sorted(set(v for v in values if v))
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+def fetch_in(table, column, values, columns="*"):
+    """Rows of `table` whose `column` is in `values`, one query per chunk, chunks in parallel."""
+    def one(chunk):
+        return supabase.table(table).select(columns).in_(column, chunk).execute().data or []
+    with ThreadPoolExecutor(WORKERS) as pool:
+        return [row for part in pool.map(one, _chunks(values)) for row in part]
+
+def fetch_eq(table, column, value, key, columns="*"):
+    """All rows of `table` with `column` = value, keyset-paginated on `key`."""
+    rows, after = [], None
+    while True:
+        q = supabase.table(table).select(columns).eq(column, value).order(key).limit(PAGE)
+        if after is not None:
+            q = q.gt(key, after)
+        page = q.execute().data or []
+        rows.extend(page)
+        if len(page) < PAGE:
+            return rows
+        after = page[-1][key]
+
+def institute_users(institute_id):
+    """Users whose profile or role row belongs to the institute."""
+    users = {u["id"]: u for u in fetch_eq("users", "institute_id", institute_id, "id")}
+    with ThreadPoolExecutor(WORKERS) as pool:
+        linked = pool.map(lambda t: fetch_eq(t, "institute_id", institute_id, "user_id", "user_id"),
+                          ["teachers", "students", "parents"])
+        extra_ids = {r["user_id"] for rows in linked for r in rows} - users.keys()
+    for u in fetch_in("users", "id", extra_ids):
+        users[u["id"]] = u
+    return list(users.values())
+
+def _institute(user):
+    return user.get("institute_id") or (user.get("extra") or {}).get("institute_id")
+
+def verify_batch(users, emails=None, max_details=50):
+    """Check every user against its role rows and org codes in memory; returns a summary report."""
+    ids = [u["id"] for u in users]
+    with ThreadPoolExecutor(len(ROLE_TABLES)) as pool:
+        fetched = pool.map(lambda t: (t, fetch_in(t, "user_id", ids)), ROLE_TABLES.values())
+        role_rows = {table: {r["user_id"]: r for r in rows} for table, rows in fetched}
+
+    institutes = {_institute(u) for u in users}
+    institutes |= {r.get("institute_id") for rows in role_rows.values() for r in rows.values()}
+    known = {r["institute_id"] for r in fetch_in("org_codes", "institute_id", institutes, "institute_id")}
+
+    report = {"checked": len(users), "ok": 0, "issues": {}, "warnings": {}, "by_role": {}, "status": {}, "failures": []}
+
+    def count(bucket, name):
+        report[bucket][name] = report[bucket].get(name, 0) + 1
+
+    if emails is not None:
+        found = {u.get("email") for u in users}
+        missing = [e for e in emails if e not in found]
+        report["not_found"] = len(missing)
+        report["failures"].extend({"email": e, "issues": ["not_found"]} for e in missing[:max_details])
+
+    for u in users:
+        issues = []
+        role = u.get("role")
+        table = ROLE_TABLES.get(role)
+        row = role_rows[table].get(u["id"]) if table else None
+        if table is None:
+            issues.append("unknown_role")
+        elif row is None:
+            issues.append("missing_role_row")
+        issues.extend(f"extra_role_row:{t}" for t in ROLE_TABLES.values() if t != table and u["id"] in role_rows[t])
+
+        user_inst = _institute(u)
+        row_inst = row.get("institute_id") if row else None
+        if user_inst and row_inst and user_inst != row_inst:
+            issues.append("institute_mismatch")
+        for inst in {user_inst, row_inst} - {None, ""}:
+            if inst not in known:
+                issues.append("unknown_institute")
+                break
+
+        if row is not None and "status" in row:
+            status = row.get("status") or "pending"
+            count("status", f"{role}:{status}")
+            if status not in STATUSES:
+                issues.append("invalid_status")
+            elif role == "Teacher" and bool(row.get("is_verified")) != (status == "approved"):
+                issues.append("verified_mismatch")
+        if not u.get("password_hash"):
+            count("warnings", "password_hash_missing")
+
+        by_role = report["by_role"].setdefault(role or "?", {"checked": 0, "ok": 0})
+        by_role["checked"] += 1
+        if issues:
+            for name in issues:
+                count("issues", name.split(":")[0])
+            if len(report["failures"]) < max_details:
+                report["failures"].append({"email": u.get("email"), "user_id": u["id"], "role": role, "issues": issues})
+        else:
+            report["ok"] += 1
+            by_role["ok"] += 1
+
+    return report
+
+def read_emails(path):
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        return list(dict.fromkeys(line.strip() for line in f if line.strip() and not line.startswith("#")))
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
 def verify_org_codes():
     output = {}
     try:
@@ -110,6 +232,9 @@ if __name__ == "__main__":
     parser.add_argument("--email", help="User email to verify")
     parser.add_argument("--role", help="User role to verify")
     parser.add_argument("--check-codes", action="store_true", help="Check for org codes")
+    parser.add_argument("--emails-file", help="Batch mode: verify every email in this file (one per line, - for stdin)")
+    parser.add_argument("--institute", help="Batch mode: verify every account of this institute_id")
+    parser.add_argument("--max-details", type=int, default=50, help="Failing accounts listed in the batch report")
     
     args = parser.parse_args()
     
@@ -118,6 +243,19 @@ if __name__ == "__main__":
     if args.email and args.role:
         output["user_verification"] = verify_user(args.email, args.role)
         
+    if args.emails_file:
+        started = time.monotonic()
+        emails = read_emails(args.emails_file)
+        users = fetch_in("users", "email", emails)
+        output["batch_verification"] = verify_batch(users, emails, args.max_details)
+        output["batch_verification"]["elapsed_s"] = round(time.monotonic() - started, 2)
+
+    if args.institute:
+        started = time.monotonic()
+        output["institute_verification"] = verify_batch(institute_users(args.institute), None, args.max_details)
+        output["institute_verification"]["institute_id"] = args.institute
+        output["institute_verification"]["elapsed_s"] = round(time.monotonic() - started, 2)
+
     if args.check_codes:
         output["org_codes"] = verify_org_codes()
         